@@ -0,0 +1,233 @@
+"""
+Process-local queue of customers waiting for a live agent.
+
+Mirrors get_agent_queue()'s SQL definition - an agent request within the last
+hour, on an open session, from a customer with status 'new' or 'in_progress'
+who has sent at least one message - but is maintained by the database.py
+write paths instead of being re-queried on every poll. Entries live in a
+priority heap and an expiry heap, both with lazy invalidation.
+
+The queue belongs to one process: with several server workers each keeps its
+own copy, so only enable it (AGENT_QUEUE_IN_MEMORY) for a single worker.
+
+on_change(customer_id, entered, customer) is called whenever a customer
+enters (entered=True) or leaves the waiting list, including through expiry.
+It runs after the queue lock is released, in the order the changes happened,
+on the thread of the call that made them.
+"""
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+
+QUEUE_STATUSES = ('new', 'in_progress')
+
+class AgentQueue:
+    def __init__(self, ttl_seconds=3600, on_change=None):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.on_change = on_change
+        self.loaded = False
+
+        # customer_id -> entry dict
+        self._entries = {}
+        # (-priority_score, -requested_at timestamp, version, customer_id)
+        self._priority_heap = []
+        # (requested_at, version, customer_id)
+        self._expiry_heap = []
+        self._versions = itertools.count()
+        self._lock = threading.RLock()
+        # on_change calls waiting to be made outside the lock
+        self._changes = []
+        self._emit_lock = threading.Lock()
+
+    def _push(self, customer_id):
+        """(Re)index an entry; older heap items for it become stale"""
+        entry = self._entries[customer_id]
+        entry['version'] = next(self._versions)
+        customer = entry['customer']
+        heapq.heappush(self._priority_heap, (
+            -customer['priority_score'],
+            -entry['requested_at'].timestamp(),
+            entry['version'],
+            customer_id
+        ))
+        heapq.heappush(self._expiry_heap, (entry['requested_at'], entry['version'], customer_id))
+
+        # Drop stale heap items once they outnumber live ones
+        if len(self._priority_heap) > 2 * len(self._entries) + 64:
+            self._compact()
+
+    def _compact(self):
+        live = {customer_id: entry['version'] for customer_id, entry in self._entries.items()}
+        self._priority_heap = [item for item in self._priority_heap if live.get(item[3]) == item[2]]
+        self._expiry_heap = [item for item in self._expiry_heap if live.get(item[2]) == item[1]]
+        heapq.heapify(self._priority_heap)
+        heapq.heapify(self._expiry_heap)
+
+    def _expire(self, now):
+        cutoff = now - self.ttl
+        while self._expiry_heap and self._expiry_heap[0][0] < cutoff:
+            _, version, customer_id = heapq.heappop(self._expiry_heap)
+            entry = self._entries.get(customer_id)
+            if entry and entry['version'] == version:
+                del self._entries[customer_id]
+                self._notify(customer_id, self._is_waiting(entry), False, entry)
+
+    def _notify(self, customer_id, was_waiting, is_waiting, entry):
+        # Recorded under the lock, reported by _emit once it is released
+        if self.on_change and was_waiting != is_waiting:
+            self._changes.append((customer_id, is_waiting, dict(entry['customer'])))
+
+    def _emit(self):
+        """Call on_change for the recorded changes; never call with the lock held"""
+        with self._emit_lock:
+            while True:
+                with self._lock:
+                    changes, self._changes = self._changes, []
+                if not changes:
+                    return
+                for change in changes:
+                    self.on_change(*change)
+
+    def _waiting(self, customer_id):
+        self._expire(datetime.now())
+        entry = self._entries.get(customer_id)
+        return bool(entry) and self._is_waiting(entry)
+
+    @staticmethod
+    def _is_waiting(entry):
+        return entry['has_messages'] and entry['customer']['status'] in QUEUE_STATUSES
+
+    def load(self, rows):
+        """
+        Replace the queue contents
+        rows: (customer dict, session_id, requested_at datetime, has_messages)
+        """
+        with self._lock:
+            self._entries = {}
+            self._priority_heap = []
+            self._expiry_heap = []
+            for customer, session_id, requested_at, has_messages in rows:
+                self._entries[customer['id']] = {
+                    'customer': dict(customer),
+                    'session_id': session_id,
+                    'requested_at': requested_at,
+                    'has_messages': has_messages,
+                }
+                self._push(customer['id'])
+            self.loaded = True
+
+    def request(self, customer, session_id, requested_at, has_messages):
+        """
+        Record an agent request
+        Returns True if the customer just entered the waiting list
+        """
+        with self._lock:
+            was_waiting = self._waiting(customer['id'])
+            entry = self._entries[customer['id']] = {
+                'customer': dict(customer),
+                'session_id': session_id,
+                'requested_at': requested_at,
+                'has_messages': has_messages,
+            }
+            self._push(customer['id'])
+            is_waiting = self._waiting(customer['id'])
+            self._notify(customer['id'], was_waiting, is_waiting, entry)
+        self._emit()
+        return not was_waiting and is_waiting
+
+    def message_saved(self, customer_id):
+        """Note that a customer has chatted (only chatting customers are queued)"""
+        is_waiting = False
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry and not entry['has_messages']:
+                entry['has_messages'] = True
+                is_waiting = self._waiting(customer_id)
+                self._notify(customer_id, False, is_waiting, entry)
+        self._emit()
+        return is_waiting
+
+    def update_customer(self, customer_id, **fields):
+        """
+        Apply changed customer fields (status, admin_notes, time spent, ...)
+        Returns (was_waiting, is_waiting)
+        """
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if not entry:
+                return False, False
+            # No expiry here: heartbeats update queued customers from the
+            # event loop, and an expiry would call on_change
+            was_waiting = self._is_waiting(entry)
+            old_score = entry['customer']['priority_score']
+            entry['customer'].update(fields)
+            if entry['customer']['priority_score'] != old_score:
+                self._push(customer_id)
+            is_waiting = self._is_waiting(entry)
+            self._notify(customer_id, was_waiting, is_waiting, entry)
+        # Only when this call changed the waiting list: a heartbeat on the
+        # event loop must not wait to report other threads' changes
+        if was_waiting != is_waiting:
+            self._emit()
+        return was_waiting, is_waiting
+
+    def session_ended(self, session_id):
+        """Drop the request attached to a session that has ended"""
+        ended = None
+        with self._lock:
+            for customer_id, entry in list(self._entries.items()):
+                if entry['session_id'] == session_id:
+                    was_waiting = self._waiting(customer_id)
+                    self._entries.pop(customer_id, None)
+                    self._notify(customer_id, was_waiting, False, entry)
+                    ended = customer_id
+                    break
+        self._emit()
+        return ended
+
+    def remove(self, customer_id):
+        """Drop a customer from the queue; returns True if they were waiting"""
+        with self._lock:
+            was_waiting = self._waiting(customer_id)
+            entry = self._entries.pop(customer_id, None)
+            if entry:
+                self._notify(customer_id, was_waiting, False, entry)
+        self._emit()
+        return was_waiting
+
+    def get_customer(self, customer_id):
+        """Return a copy of a queued customer's fields, or None"""
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            return dict(entry['customer']) if entry else None
+
+    def expire(self):
+        """Drop requests older than the TTL now (they are otherwise dropped lazily)"""
+        with self._lock:
+            self._expire(datetime.now())
+        self._emit()
+
+    def is_waiting(self, customer_id):
+        with self._lock:
+            waiting = self._waiting(customer_id)
+        self._emit()
+        return waiting
+
+    def snapshot(self):
+        """Waiting customers, highest priority first (newest request breaks ties)"""
+        with self._lock:
+            self._expire(datetime.now())
+            queue = []
+            for _, _, version, customer_id in sorted(self._priority_heap):
+                entry = self._entries.get(customer_id)
+                if entry and entry['version'] == version and self._is_waiting(entry):
+                    customer = dict(entry['customer'])
+                    customer['agent_requested'] = True
+                    queue.append(customer)
+        self._emit()
+        return queue
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
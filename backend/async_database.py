@@ -0,0 +1,86 @@
+"""
+Awaitable versions of the database.py operations.
+
+sqlite3 is blocking, so every call is handed to a small dedicated thread pool
+instead of running on the event loop. The pool is bounded (DB_EXECUTOR_WORKERS),
+which also bounds the number of pooled SQLite connections, one per worker.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', '8'))
+
+_executor = ThreadPoolExecutor(
+    max_workers=DB_EXECUTOR_WORKERS,
+    thread_name_prefix='db'
+)
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database function on the database executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def _awaitable(func):
+    """Build an async wrapper around a blocking database.py function"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+async def save_chat_message(customer_id, session_id, message_text, sender):
+    """Save a chat message (see database.MESSAGE_WRITE_MODE)"""
+    if database.message_buffer is None:
+        return await run_db(database.save_chat_message, customer_id, session_id, message_text, sender)
+
+    # Queueing never blocks, so skip the executor; in group mode wait for
+    # the batch commit without tying up a database thread
+    future = database.queue_chat_message(customer_id, session_id, message_text, sender)
+    if database.MESSAGE_WRITE_MODE == 'group':
+        await asyncio.wrap_future(future)
+
+async def update_time_spent(customer_id, time_spent_seconds):
+    """Update time spent on site for a customer (see database.HEARTBEAT_FLUSH_SECONDS)"""
+    if database.heartbeats is None:
+        return await run_db(database.update_time_spent, customer_id, time_spent_seconds)
+
+    # Recording a heartbeat is an in-memory update, no need for the executor
+    database.update_time_spent(customer_id, time_spent_seconds)
+
+async def iterate_batches(batches):
+    """
+    Consume a blocking batch generator (e.g. database.iter_customers_for_export)
+    one batch at a time on the database executor
+    """
+    while True:
+        batch = await run_db(next, batches, None)
+        if batch is None:
+            return
+        yield batch
+
+def shutdown():
+    """Wait for queued database work, then close the executor's connections"""
+    _executor.shutdown(wait=True)
+    database.close_connections()
+
+init_database = _awaitable(database.init_database)
+save_customer_info = _awaitable(database.save_customer_info)
+start_chat_session = _awaitable(database.start_chat_session)
+end_chat_session = _awaitable(database.end_chat_session)
+get_customer_by_id = _awaitable(database.get_customer_by_id)
+get_all_customers = _awaitable(database.get_all_customers)
+get_priority_queue = _awaitable(database.get_priority_queue)
+get_customer_stats = _awaitable(database.get_customer_stats)
+get_admin_dashboard = _awaitable(database.get_admin_dashboard)
+update_customer_status = _awaitable(database.update_customer_status)
+update_customer_notes = _awaitable(database.update_customer_notes)
+get_customer_notes = _awaitable(database.get_customer_notes)
+delete_customer = _awaitable(database.delete_customer)
+get_customer_chat_messages = _awaitable(database.get_customer_chat_messages)
+get_latest_session = _awaitable(database.get_latest_session)
+mark_agent_requested = _awaitable(database.mark_agent_requested)
+get_agent_queue = _awaitable(database.get_agent_queue)
+expire_agent_requests = _awaitable(database.expire_agent_requests)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Vector Database Backend Benchmark
+Loads knowledge_base.txt into the ChromaDB and NumPy backends (in temporary
+directories), checks that both return the same results and compares search
+latency, one query at a time and in batches
+
+Queries are embedded once up front, so the timings cover the index alone
+"""
+import argparse
+import contextlib
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+from vector_db import VectorDatabase
+
+QUERIES = [
+    "What services does DASA Hospitality provide?",
+    "How much does it cost to work with DASA?",
+    "What is the contact information?",
+    "Tell me about RevenueMax",
+    "What is the property audit process?",
+    "Do you manage holiday homes?",
+    "How do you improve online reviews?",
+    "Can you run our email marketing?",
+]
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def time_single(db, queries, embeddings, k, rounds):
+    """Seconds per search, one query per call"""
+    samples = []
+    for _ in range(rounds):
+        for query, embedding in zip(queries, embeddings):
+            started = time.perf_counter()
+            db.search(query, n_results=k, query_embedding=embedding)
+            samples.append(time.perf_counter() - started)
+    return samples
+
+def time_batched(db, queries, embeddings, k, rounds, batch_size):
+    """Queries per second, batch_size queries per call"""
+    batch_queries = (queries * (batch_size // len(queries) + 1))[:batch_size]
+    batch_embeddings = (embeddings * (batch_size // len(embeddings) + 1))[:batch_size]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        db.search_batch(batch_queries, k, batch_embeddings)
+    return rounds * batch_size / (time.perf_counter() - started)
+
+def compare_results(chroma_db, numpy_db, queries, embeddings, k):
+    """(queries whose top-k content matches in order, largest distance difference)"""
+    chroma_results = chroma_db.search_batch(queries, k, embeddings)
+    numpy_results = numpy_db.search_batch(queries, k, embeddings)
+    matching = 0
+    max_difference = 0.0
+    for expected, actual in zip(chroma_results, numpy_results):
+        if [r['content'] for r in expected] == [r['content'] for r in actual]:
+            matching += 1
+        for a, b in zip(expected, actual):
+            max_difference = max(max_difference, abs(a['distance'] - b['distance']))
+    return matching, max_difference
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ChromaDB and NumPy vector database backends")
+    parser.add_argument('--rounds', type=int, default=200, help="times each query set is searched")
+    parser.add_argument('-k', type=int, default=3, help="results per query")
+    parser.add_argument('--batch-size', type=int, default=32, help="queries per batched search")
+    parser.add_argument('--knowledge-base', default=str(backend_dir / 'knowledge_base.txt'))
+    args = parser.parse_args()
+
+    databases = {}
+    with tempfile.TemporaryDirectory() as chroma_dir, tempfile.TemporaryDirectory() as numpy_dir:
+        # Keep the loaders' progress output out of the report
+        with contextlib.redirect_stdout(sys.stderr):
+            for backend, directory in (('chroma', chroma_dir), ('numpy', numpy_dir)):
+                db = VectorDatabase(persist_directory=directory, backend=backend)
+                if not db.load_knowledge_base(args.knowledge_base):
+                    print(f"❌ Failed to load the knowledge base into {backend}")
+                    sys.exit(1)
+                databases[backend] = db
+
+        chunks = databases['numpy'].collection.count()
+        embeddings = databases['numpy'].embed(QUERIES)
+        print(f"📊 {chunks} chunks, {len(QUERIES)} queries, k={args.k}, {args.rounds} rounds")
+
+        matching, max_difference = compare_results(databases['chroma'], databases['numpy'], QUERIES, embeddings, args.k)
+        print(f"🔍 Identical top-{args.k}: {matching}/{len(QUERIES)} queries, "
+              f"largest distance difference {max_difference:.2e}")
+
+        print(f"\n{'backend':<8} {'mean µs':>10} {'p50 µs':>10} {'p95 µs':>10} {'batched q/s':>12}")
+        for backend, db in databases.items():
+            samples = time_single(db, QUERIES, embeddings, args.k, args.rounds)
+            throughput = time_batched(db, QUERIES, embeddings, args.k, args.rounds, args.batch_size)
+            print(f"{backend:<8} {statistics.mean(samples) * 1e6:>10.1f} "
+                  f"{percentile(samples, 0.5) * 1e6:>10.1f} {percentile(samples, 0.95) * 1e6:>10.1f} "
+                  f"{throughput:>12.0f}")
+
+        # Release Chroma's handles before the temporary directories are removed
+        databases.clear()
+
+if __name__ == '__main__':
+    main()
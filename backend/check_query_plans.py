@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Query Plan Check
+Fails (exit code 1) if any hot-path query in database.py does a full table scan
+"""
+import re
+import sys
+
+from database import get_connection, init_database, HOT_QUERIES
+
+# "SCAN customers" is a full table scan; "SCAN customers USING INDEX ..." walks
+# an index (a partial index only holds the rows the query needs)
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+def explain(conn, sql, params):
+    """Return the detail column of EXPLAIN QUERY PLAN for a query"""
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    return [row[-1] for row in rows]
+
+def find_full_scans(conn):
+    """Return {query name: [plan lines]} for every hot query that scans a table"""
+    failures = {}
+    for name, (sql, params) in HOT_QUERIES.items():
+        plan = explain(conn, sql, params)
+        if any(FULL_SCAN.match(line.strip()) for line in plan):
+            failures[name] = plan
+    return failures
+
+def main():
+    init_database()
+    conn = get_connection()
+
+    failures = find_full_scans(conn)
+
+    for name, (sql, params) in HOT_QUERIES.items():
+        status = "FAIL" if name in failures else "OK"
+        print(f"[{status}] {name}")
+        for line in explain(conn, sql, params):
+            print(f"       {line}")
+
+    if failures:
+        print(f"\nERROR: {len(failures)} hot queries do a full table scan: {', '.join(failures)}")
+        sys.exit(1)
+
+    print("\nAll hot queries are index-backed")
+
+if __name__ == '__main__':
+    main()
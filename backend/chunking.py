@@ -0,0 +1,82 @@
+"""
+Knowledge base parsing and chunking.
+
+Kept free of database and model imports so ingestion worker processes can
+use it cheaply. Sources are plain text: "Page: <title>" lines start a page,
+and text before the first one is a header that is skipped. A file without any
+"Page:" line is a single page named after the file (FAQs, policy documents).
+"""
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+PAGE_PREFIX = 'Page: '
+CHUNK_SIZE = 600
+CHUNK_OVERLAP = 100
+
+def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+    """Split text into overlapping chunks"""
+    # Split by double newlines (paragraphs) first
+    paragraphs = text.split('\n\n')
+
+    chunks = []
+    current_chunk = ""
+
+    for para in paragraphs:
+        para = para.strip()
+        if not para:
+            continue
+
+        # If adding this paragraph exceeds chunk size and current_chunk is not empty
+        if len(current_chunk) + len(para) > chunk_size and current_chunk:
+            chunks.append(current_chunk.strip())
+            # Start new chunk with overlap (last few words of previous chunk)
+            words = current_chunk.split()
+            overlap_text = ' '.join(words[-overlap:]) if len(words) > overlap else current_chunk
+            current_chunk = overlap_text + ' ' + para
+        else:
+            current_chunk += ('\n\n' if current_chunk else '') + para
+
+    # Add the last chunk
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+
+    return chunks
+
+def chunk_id(page_title: str, chunk: str, seen: Dict[str, int]) -> str:
+    """Stable id for a chunk: a hash of its page and content (repeats get a suffix)"""
+    digest = hashlib.sha256(f"{page_title}\x00{chunk}".encode('utf-8')).hexdigest()[:24]
+    seen[digest] = seen.get(digest, 0) + 1
+    return digest if seen[digest] == 1 else f"{digest}-{seen[digest]}"
+
+def iter_pages(lines: Iterable[str], default_title: str) -> Iterator[Tuple[str, str]]:
+    """(title, content) for each page, reading lines one at a time"""
+    title = None
+    buffer = []
+    for line in lines:
+        if line.startswith(PAGE_PREFIX):
+            if title is not None:
+                yield title, ''.join(buffer).strip()
+            title = line[len(PAGE_PREFIX):].strip()
+            buffer = []
+        else:
+            buffer.append(line)
+
+    if title is not None:
+        yield title, ''.join(buffer).strip()
+    elif buffer:
+        yield default_title, ''.join(buffer).strip()
+
+def page_chunks(lines: Iterable[str], source: str) -> Iterator[Tuple[str, str, Dict]]:
+    """(id, document, metadata) for every chunk of a source"""
+    seen = {}
+    for page_title, page_content in iter_pages(lines, source):
+        if not page_content:
+            continue
+        chunks = chunk_text(page_content, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+        for chunk_idx, chunk in enumerate(chunks):
+            yield chunk_id(page_title, chunk, seen), chunk, {
+                "page": page_title,
+                "chunk_id": chunk_idx,
+                "total_chunks": len(chunks),
+                "source": source
+            }
@@ -4,10 +4,13 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# LLM providers in failover order (openai, bedrock, fake) - see llm_providers.py
+LLM_PROVIDERS = [name.strip().lower() for name in os.getenv('LLM_PROVIDERS', 'openai').split(',') if name.strip()]
+
 # OpenAI Configuration
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 
-# AWS Configuration (Backup - not currently used)
+# AWS Configuration (used by the bedrock provider)
 # AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID', '')
 # AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY', '')
 # AWS_DEFAULT_REGION = os.getenv('AWS_DEFAULT_REGION', 'us-east-1')
@@ -15,6 +18,9 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 
 # Validate required environment variables
 def validate_config():
+    if 'openai' not in LLM_PROVIDERS:
+        return True
+    
     required_vars = ['OPENAI_API_KEY']
     missing_vars = [var for var in required_vars if not os.getenv(var)]
     
@@ -0,0 +1,170 @@
+"""
+Incrementally maintained customer statistics.
+
+The dashboard aggregates (total, average time on site, source/device/status
+breakdowns) are kept in the small customer_stats table. Triggers on customers
+update it in the same transaction as every INSERT, UPDATE and DELETE, so
+reading the stats never touches the customers table.
+"""
+
+# Breakdown dimension -> key in the stats dictionary
+BREAKDOWNS = {
+    'source': 'source_breakdown',
+    'device_type': 'device_breakdown',
+    'status': 'status_breakdown',
+}
+
+# Triggers created by create_stats_schema
+STATS_TRIGGERS = (
+    'customer_stats_insert',
+    'customer_stats_delete',
+    'customer_stats_update_time_spent',
+) + tuple(f'customer_stats_update_{column}' for column in BREAKDOWNS)
+
+def _bump(dimension, column, amount):
+    return f'''
+        INSERT INTO customer_stats (dimension, value, is_null, amount)
+        VALUES ('{dimension}', IFNULL({column}, ''), {column} IS NULL, {amount})
+        ON CONFLICT (dimension, value, is_null) DO UPDATE SET amount = amount + excluded.amount;
+    '''
+
+def _drop_empty(dimension, column):
+    return f'''
+        DELETE FROM customer_stats
+        WHERE dimension = '{dimension}' AND value = IFNULL({column}, '')
+          AND is_null = ({column} IS NULL) AND amount <= 0;
+    '''
+
+def create_stats_schema(cursor):
+    """Create the counters table and the triggers that maintain it"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS customer_stats (
+            dimension TEXT NOT NULL,
+            -- NULL breakdown values are stored as '' with is_null = 1
+            -- (key columns cannot be NULL), so they stay apart from real ''
+            value TEXT NOT NULL,
+            is_null INTEGER NOT NULL,
+            amount INTEGER NOT NULL,
+            PRIMARY KEY (dimension, value, is_null)
+        ) WITHOUT ROWID
+    ''')
+
+    new_counts = ''.join(
+        _bump(column, f"NEW.{column}", 1) for column in BREAKDOWNS
+    )
+    old_counts = ''.join(
+        _bump(column, f"OLD.{column}", -1) + _drop_empty(column, f"OLD.{column}")
+        for column in BREAKDOWNS
+    )
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS customer_stats_insert
+        AFTER INSERT ON customers
+        BEGIN
+            {_bump('total', "''", 1)}
+            {_bump('time_spent', "''", 'IFNULL(NEW.time_spent_seconds, 0)')}
+            {new_counts}
+        END
+    ''')
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS customer_stats_delete
+        AFTER DELETE ON customers
+        BEGIN
+            {_bump('total', "''", -1)}
+            {_bump('time_spent', "''", '-IFNULL(OLD.time_spent_seconds, 0)')}
+            {old_counts}
+        END
+    ''')
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS customer_stats_update_time_spent
+        AFTER UPDATE OF time_spent_seconds ON customers
+        WHEN OLD.time_spent_seconds IS NOT NEW.time_spent_seconds
+        BEGIN
+            {_bump('time_spent', "''", 'IFNULL(NEW.time_spent_seconds, 0) - IFNULL(OLD.time_spent_seconds, 0)')}
+        END
+    ''')
+
+    for column in BREAKDOWNS:
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS customer_stats_update_{column}
+            AFTER UPDATE OF {column} ON customers
+            WHEN OLD.{column} IS NOT NEW.{column}
+            BEGIN
+                {_bump(column, f"OLD.{column}", -1)}
+                {_drop_empty(column, f"OLD.{column}")}
+                {_bump(column, f"NEW.{column}", 1)}
+            END
+        ''')
+
+def drop_stats_schema(cursor):
+    """Drop the counters table and its triggers"""
+    for trigger in STATS_TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    cursor.execute('DROP TABLE IF EXISTS customer_stats')
+
+def rebuild_stats(cursor):
+    """Recompute every counter from the customers table"""
+    cursor.execute('DELETE FROM customer_stats')
+    cursor.execute('''
+        INSERT INTO customer_stats (dimension, value, is_null, amount)
+        SELECT 'total', '', 0, COUNT(*) FROM customers
+        UNION ALL
+        SELECT 'time_spent', '', 0, IFNULL(SUM(time_spent_seconds), 0) FROM customers
+    ''')
+    for column in BREAKDOWNS:
+        cursor.execute(f'''
+            INSERT INTO customer_stats (dimension, value, is_null, amount)
+            SELECT '{column}', IFNULL({column}, ''), {column} IS NULL, COUNT(*)
+            FROM customers
+            GROUP BY {column}
+        ''')
+
+def read_stats(cursor):
+    """Build the stats dictionary from the counters table"""
+    cursor.execute('SELECT dimension, value, is_null, amount FROM customer_stats')
+
+    totals = {'total': 0, 'time_spent': 0}
+    breakdowns = {key: {} for key in BREAKDOWNS.values()}
+    for dimension, value, is_null, amount in cursor.fetchall():
+        if dimension in totals:
+            totals[dimension] = amount
+        elif dimension in BREAKDOWNS:
+            breakdowns[BREAKDOWNS[dimension]][None if is_null else value] = amount
+
+    total = totals['total']
+    return {
+        'total_customers': total,
+        'source_breakdown': breakdowns['source_breakdown'],
+        # None like AVG() when there are no customers
+        'avg_time_spent': totals['time_spent'] / total if total > 0 else None,
+        'device_breakdown': breakdowns['device_breakdown'],
+        'status_breakdown': breakdowns['status_breakdown'],
+    }
+
+def compute_stats(cursor):
+    """Compute the stats with full-table aggregates (the reference for verification)"""
+    stats = {}
+
+    # Total customers
+    cursor.execute('SELECT COUNT(*) FROM customers')
+    stats['total_customers'] = cursor.fetchone()[0]
+
+    # Source breakdown
+    cursor.execute('SELECT source, COUNT(*) FROM customers GROUP BY source')
+    stats['source_breakdown'] = dict(cursor.fetchall())
+
+    # Average time spent
+    cursor.execute('SELECT AVG(time_spent_seconds) FROM customers')
+    stats['avg_time_spent'] = cursor.fetchone()[0]
+
+    # Device type breakdown
+    cursor.execute('SELECT device_type, COUNT(*) FROM customers GROUP BY device_type')
+    stats['device_breakdown'] = dict(cursor.fetchall())
+
+    # Status breakdown
+    cursor.execute('SELECT status, COUNT(*) FROM customers GROUP BY status')
+    stats['status_breakdown'] = dict(cursor.fetchall())
+
+    return stats
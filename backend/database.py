@@ -1,197 +1,584 @@
-import sqlite3
 from datetime import datetime
 import os
+from db_pool import ConnectionPool
+from migrations import run_migrations, get_schema_version
+from customer_stats import read_stats, rebuild_stats, compute_stats
+from write_buffers import MessageWriteBuffer, HeartbeatAggregator
+from agent_queue import AgentQueue
+from event_hub import event_hub, customer_channel, admin_events
+from revisions import RevisionTracker, CUSTOMERS, STATS, AGENT_QUEUE, customer_messages, customer_notes
+from collections import Counter
+from datetime import timedelta, timezone
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'customer_data.db')
 
-def init_database():
-    """Initialize the SQLite database and create tables if they don't exist"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Create customers table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS customers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            contact TEXT NOT NULL,
-            source TEXT NOT NULL,
-            ip_address TEXT,
-            device_type TEXT,
-            browser TEXT,
-            operating_system TEXT,
-            time_spent_seconds INTEGER DEFAULT 0,
-            status TEXT DEFAULT 'new',
-            admin_notes TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create chat_sessions table to track interactions
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_id INTEGER,
-            session_start TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            session_end TIMESTAMP,
-            total_messages INTEGER DEFAULT 0,
-            agent_requested BOOLEAN DEFAULT 0,
-            agent_requested_at TIMESTAMP,
-            FOREIGN KEY (customer_id) REFERENCES customers (id)
-        )
-    ''')
-    
-    # Add agent_requested_at column if it doesn't exist (for existing databases)
-    try:
-        cursor.execute("PRAGMA table_info(chat_sessions)")
-        columns = [column[1] for column in cursor.fetchall()]
-        if 'agent_requested_at' not in columns:
+def _register_functions(conn):
+    """Expose Python helpers to SQL on every pooled connection"""
+    conn.create_function(
+        'calc_priority_score', 2,
+        lambda time_spent, source: calculate_priority_score(time_spent or 0, source or ''),
+        deterministic=True
+    )
+
+# Long-lived WAL connections, one per thread (see db_pool.py)
+pool = ConnectionPool(DB_PATH, on_connect=_register_functions)
+
+def get_connection():
+    """Get the pooled connection for the current thread"""
+    return pool.connection()
+
+# ETag revisions, stored in SQLite and shared by every process (see revisions.py)
+revisions = RevisionTracker(get_connection)
+
+# Queries on request hot paths. Each must be served by an index;
+# check_query_plans.py fails if any of them falls back to a full table scan.
+# Listings page on the id (rowid) instead of OFFSET, so a page costs the same
+# no matter how deep it is. Ids are assigned in insertion order, so id order
+# is chronological order. A LIMIT of -1 means no limit.
+CUSTOMER_MESSAGES_QUERY = '''
+    SELECT id, customer_id, session_id, message_text, sender, timestamp
+    FROM chat_messages
+    WHERE customer_id = ? AND id > ?
+    ORDER BY id ASC
+    LIMIT ?
+'''
+
+CUSTOMER_MESSAGES_BEFORE_QUERY = '''
+    SELECT id, customer_id, session_id, message_text, sender, timestamp
+    FROM chat_messages
+    WHERE customer_id = ? AND id < ?
+    ORDER BY id DESC
+    LIMIT ?
+'''
+
+CUSTOMERS_BEFORE_QUERY = '''
+    SELECT id, name, contact, source, ip_address, device_type,
+           time_spent_seconds, created_at, last_active, status, admin_notes
+    FROM customers
+    WHERE id < ?
+    ORDER BY id DESC
+    LIMIT ?
+'''
+
+CUSTOMERS_AFTER_QUERY = '''
+    SELECT id, name, contact, source, ip_address, device_type,
+           time_spent_seconds, created_at, last_active, status, admin_notes
+    FROM customers
+    WHERE id > ?
+    ORDER BY id ASC
+    LIMIT ?
+'''
+
+LATEST_SESSION_QUERY = '''
+    SELECT id FROM chat_sessions
+    WHERE customer_id = ? AND session_end IS NULL
+    ORDER BY session_start DESC
+    LIMIT 1
+'''
+
+# Top K straight off idx_customers_open_priority (LIMIT -1 means no limit)
+PRIORITY_QUEUE_QUERY = '''
+    SELECT id, name, contact, source, ip_address, device_type,
+           time_spent_seconds, created_at, last_active, status, admin_notes,
+           priority_score
+    FROM customers
+    WHERE status != 'closed'
+    ORDER BY priority_score DESC, created_at DESC
+    LIMIT ? OFFSET ?
+'''
+
+# agent_requested_at is stored as local 'YYYY-MM-DD HH:MM:SS', so it is compared
+# as plain text against a local cutoff; wrapping the column in datetime() would
+# defeat the index
+AGENT_QUEUE_QUERY = '''
+    SELECT DISTINCT c.id, c.name, c.contact, c.source, c.ip_address, c.device_type,
+           c.time_spent_seconds, c.created_at, c.last_active, c.status, c.admin_notes,
+           c.priority_score, cs.agent_requested_at
+    FROM customers c
+    INNER JOIN chat_sessions cs ON c.id = cs.customer_id
+    WHERE c.status IN ('new', 'in_progress')
+      AND cs.agent_requested = 1
+      AND cs.session_end IS NULL
+      AND cs.agent_requested_at IS NOT NULL
+      AND cs.agent_requested_at >= ?
+      AND EXISTS (
+        SELECT 1 FROM chat_messages cm
+        WHERE cm.customer_id = c.id
+      )
+    ORDER BY cs.agent_requested_at DESC
+'''
+
+# Every recent open agent request, used to rebuild the in-memory agent queue.
+# Status and message filters are applied in memory since both can change.
+AGENT_REQUESTS_QUERY = '''
+    SELECT c.id, c.name, c.contact, c.source, c.ip_address, c.device_type,
+           c.time_spent_seconds, c.created_at, c.last_active, c.status, c.admin_notes,
+           c.priority_score, cs.id, cs.agent_requested_at,
+           EXISTS (
+             SELECT 1 FROM chat_messages cm
+             WHERE cm.customer_id = c.id
+           )
+    FROM chat_sessions cs
+    INNER JOIN customers c ON c.id = cs.customer_id
+    WHERE cs.agent_requested = 1
+      AND cs.session_end IS NULL
+      AND cs.agent_requested_at IS NOT NULL
+      AND cs.agent_requested_at >= ?
+    ORDER BY cs.agent_requested_at ASC
+'''
+
+QUEUE_CUSTOMER_QUERY = '''
+    SELECT c.id, c.name, c.contact, c.source, c.ip_address, c.device_type,
+           c.time_spent_seconds, c.created_at, c.last_active, c.status, c.admin_notes,
+           c.priority_score,
+           EXISTS (
+             SELECT 1 FROM chat_messages cm
+             WHERE cm.customer_id = c.id
+           )
+    FROM customers c
+    WHERE c.id = ?
+'''
+
+QUEUE_CUSTOMER_COLUMNS = (
+    'id', 'name', 'contact', 'source', 'ip_address', 'device_type',
+    'time_spent_seconds', 'created_at', 'last_active', 'status', 'admin_notes',
+    'priority_score'
+)
+
+# name -> (sql, sample parameters) for the query plan check
+HOT_QUERIES = {
+    'customer_messages': (CUSTOMER_MESSAGES_QUERY, (1, 0, 50)),
+    'customer_messages_before': (CUSTOMER_MESSAGES_BEFORE_QUERY, (1, 1000, 50)),
+    'customers_before': (CUSTOMERS_BEFORE_QUERY, (1000, 50)),
+    'customers_after': (CUSTOMERS_AFTER_QUERY, (1000, 50)),
+    'latest_session': (LATEST_SESSION_QUERY, (1,)),
+    'priority_queue': (PRIORITY_QUEUE_QUERY, (50, 0)),
+    'agent_queue': (AGENT_QUEUE_QUERY, ('2000-01-01 00:00:00',)),
+    'agent_requests': (AGENT_REQUESTS_QUERY, ('2000-01-01 00:00:00',)),
+}
+
+# Upper bound for "no cursor" in id < ? comparisons
+MAX_ID = 2 ** 63 - 1
+
+# Chat message write mode:
+# - direct: one transaction per message (default)
+# - group: messages are batched, callers wait until their batch commits
+# - async: messages are batched, callers return once queued; a crash can lose
+#          up to MESSAGE_BUFFER_FLUSH_MS worth of messages
+MESSAGE_WRITE_MODE = os.getenv('MESSAGE_WRITE_MODE', 'direct')
+MESSAGE_BUFFER_MAX_BATCH = int(os.getenv('MESSAGE_BUFFER_MAX_BATCH', '200'))
+MESSAGE_BUFFER_FLUSH_MS = int(os.getenv('MESSAGE_BUFFER_FLUSH_MS', '50'))
+
+if MESSAGE_WRITE_MODE not in ('direct', 'group', 'async'):
+    raise ValueError(f"Invalid MESSAGE_WRITE_MODE: {MESSAGE_WRITE_MODE}")
+
+def _utc_timestamp():
+    """Current time in the format of CURRENT_TIMESTAMP (UTC)"""
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+def _publish_message(message_id, customer_id, session_id, message_text, sender, timestamp):
+    """Push a saved message to the customer's live subscribers (same shape as get_customer_chat_messages)"""
+    event_hub.publish(customer_channel(customer_id), {
+        'id': message_id,
+        'customer_id': customer_id,
+        'session_id': session_id,
+        'text': message_text,
+        'sender': sender,
+        'timestamp': timestamp
+    })
+
+def _write_message_batch(messages):
+    """
+    Insert a batch of (customer_id, session_id, message_text, sender, timestamp)
+    chat messages in one transaction; returns their ids
+    """
+    conn = get_connection()
+    message_ids = []
+
+    with conn:
+        cursor = conn.cursor()
+        for customer_id, session_id, message_text, sender, timestamp in messages:
             cursor.execute('''
-                ALTER TABLE chat_sessions 
-                ADD COLUMN agent_requested_at TIMESTAMP
-            ''')
-            print("Added agent_requested_at column to chat_sessions")
-    except Exception as e:
-        print(f"Note: Could not add agent_requested_at column (may already exist): {e}")
-    
-    # Create chat_messages table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_id INTEGER,
-            session_id INTEGER,
-            message_text TEXT,
-            sender TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (customer_id) REFERENCES customers (id),
-            FOREIGN KEY (session_id) REFERENCES chat_sessions (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-    print(f"Database initialized at: {DB_PATH}")
+                INSERT INTO chat_messages (customer_id, session_id, message_text, sender, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (customer_id, session_id, message_text, sender, timestamp))
+            message_ids.append(cursor.lastrowid)
+
+        # One counter update per session instead of one per message
+        session_counts = Counter(message[1] for message in messages)
+        cursor.executemany('''
+            UPDATE chat_sessions
+            SET total_messages = total_messages + ?
+            WHERE id = ?
+        ''', [(count, session_id) for session_id, count in session_counts.items()])
+
+        revisions.bump(*set(customer_messages(message[0]) for message in messages), conn=conn)
+
+    for customer_id in set(message[0] for message in messages):
+        agent_queue.message_saved(customer_id)
+    for message_id, message in zip(message_ids, messages):
+        _publish_message(message_id, *message)
+
+    return message_ids
+
+message_buffer = None
+if MESSAGE_WRITE_MODE != 'direct':
+    message_buffer = MessageWriteBuffer(
+        _write_message_batch,
+        max_batch=MESSAGE_BUFFER_MAX_BATCH,
+        flush_interval=MESSAGE_BUFFER_FLUSH_MS / 1000,
+        name='chat-message-buffer'
+    )
+
+# Time-on-site heartbeats are coalesced in memory (latest value per customer)
+# and written in bulk every HEARTBEAT_FLUSH_SECONDS; 0 writes each one directly
+HEARTBEAT_FLUSH_SECONDS = float(os.getenv('HEARTBEAT_FLUSH_SECONDS', '5'))
+# Listings show time on site in whole minutes: a heartbeat only changes the
+# customers/stats/queue revisions (and so their ETags) when it crosses one.
+# Coalesced heartbeats bump them when they are flushed, so an ETag can lag
+# the in-memory value by up to HEARTBEAT_FLUSH_SECONDS.
+HEARTBEAT_REVISION_SECONDS = int(os.getenv('HEARTBEAT_REVISION_SECONDS', '60'))
+
+def _stored_times_spent(conn, customer_ids):
+    """{customer_id: time_spent_seconds} for the customers that exist"""
+    stored = {}
+    # Stay under SQLite's bound parameter limit
+    for start in range(0, len(customer_ids), 500):
+        chunk = customer_ids[start:start + 500]
+        placeholders = ', '.join('?' for _ in chunk)
+        stored.update(conn.execute(
+            f'SELECT id, time_spent_seconds FROM customers WHERE id IN ({placeholders})', chunk
+        ).fetchall())
+    return stored
+
+def _write_heartbeat_batch(heartbeats):
+    """Write coalesced (customer_id, time_spent_seconds, last_active) heartbeats"""
+    conn = get_connection()
+
+    with conn:
+        stored = _stored_times_spent(conn, [customer_id for customer_id, _, _ in heartbeats])
+        changed = [
+            customer_id for customer_id, time_spent, _ in heartbeats
+            if customer_id in stored and _time_spent_visibly_changed(stored[customer_id], time_spent)
+        ]
+
+        conn.executemany('''
+            UPDATE customers
+            SET time_spent_seconds = ?,
+                priority_score = calc_priority_score(?, source),
+                last_active = ?
+            WHERE id = ?
+        ''', [
+            (time_spent, time_spent, last_active, customer_id)
+            for customer_id, time_spent, last_active in heartbeats
+        ])
+
+        if changed:
+            keys = [CUSTOMERS, STATS]
+            if any(agent_queue.get_customer(customer_id) for customer_id in changed):
+                keys.append(AGENT_QUEUE)
+            revisions.bump(*keys, conn=conn)
+
+heartbeats = None
+if HEARTBEAT_FLUSH_SECONDS > 0:
+    heartbeats = HeartbeatAggregator(
+        _write_heartbeat_batch,
+        flush_interval=HEARTBEAT_FLUSH_SECONDS,
+        name='heartbeat-aggregator'
+    )
+
+def flush_heartbeats():
+    """Write out any coalesced time-on-site heartbeats"""
+    if heartbeats is not None:
+        heartbeats.flush()
+
+def _pending_messages(customer_id=None):
+    """
+    Chat messages still in the write buffer (all customers' when customer_id
+    is None), oldest first; read them before querying chat_messages, so a
+    message committed in between shows up in the query instead of in neither
+    """
+    if message_buffer is None:
+        return []
+    if customer_id is None:
+        return message_buffer.pending()
+    return message_buffer.pending(lambda message: message[0] == customer_id)
+
+def _apply_pending_heartbeat(customer):
+    """Overlay an unflushed heartbeat onto a customer dict (in place)"""
+    if heartbeats is None:
+        return customer
+
+    pending = heartbeats.get(customer['id'])
+    if pending:
+        time_spent, last_active = pending
+        customer['time_spent_seconds'] = time_spent
+        customer['last_active'] = last_active
+        if 'priority_score' in customer:
+            customer['priority_score'] = calculate_priority_score(time_spent, customer['source'])
+    return customer
+
+def _apply_pending_heartbeat_row(row, columns):
+    """Overlay an unflushed heartbeat onto a customer row tuple"""
+    if heartbeats is None or row is None:
+        return row
+    pending = heartbeats.get(row[0])
+    if not pending:
+        return row
+    customer = _apply_pending_heartbeat(dict(zip(columns, row)))
+    return tuple(customer[column] for column in columns)
+
+# Agent requests stay in the queue this long
+AGENT_REQUEST_TTL_SECONDS = 3600
+
+# Serve /api/agent/queue from a process-local structure maintained by the write
+# paths below (single server process only); false re-queries SQLite each time
+AGENT_QUEUE_IN_MEMORY = os.getenv('AGENT_QUEUE_IN_MEMORY', 'true').lower() == 'true'
+
+def _publish_queue_change(customer_id, entered, customer):
+    """Tell the consoles a customer joined or left the agent queue"""
+    revisions.bump(AGENT_QUEUE)
+    if entered:
+        admin_events.append('queue_entered', dict(customer, agent_requested=True))
+    else:
+        admin_events.append('queue_left', {'customer_id': customer_id})
+
+agent_queue = AgentQueue(ttl_seconds=AGENT_REQUEST_TTL_SECONDS, on_change=_publish_queue_change)
+
+def _update_queued_customer(customer_id, bump=True, **fields):
+    """Apply changed fields to a customer in the agent queue (if queued)"""
+    was_waiting, is_waiting = agent_queue.update_customer(customer_id, **fields)
+    if bump and (was_waiting or is_waiting):
+        revisions.bump(AGENT_QUEUE)
+
+def expire_agent_requests():
+    """Drop agent requests older than the TTL (emitting queue_left events)"""
+    agent_queue.expire()
+
+def _agent_request_cutoff():
+    return (datetime.now() - timedelta(seconds=AGENT_REQUEST_TTL_SECONDS)).strftime('%Y-%m-%d %H:%M:%S')
+
+def rebuild_agent_queue():
+    """Reload the in-memory agent queue from SQLite (run at startup)"""
+    # Customers whose first message is still buffered have chatted too
+    buffered = set(message[0] for message in _pending_messages())
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(AGENT_REQUESTS_QUERY, (_agent_request_cutoff(),))
+
+    rows = []
+    for row in cursor.fetchall():
+        customer = dict(zip(QUEUE_CUSTOMER_COLUMNS, row[:12]))
+        requested_at = datetime.strptime(row[13], '%Y-%m-%d %H:%M:%S')
+        rows.append((_apply_pending_heartbeat(customer), row[12], requested_at, bool(row[14]) or row[0] in buffered))
+
+    agent_queue.load(rows)
+    return len(agent_queue)
+
+def close_connections():
+    """Flush write buffers and close all pooled connections (call on application shutdown)"""
+    if message_buffer is not None:
+        message_buffer.close()
+    if heartbeats is not None:
+        heartbeats.close()
+    pool.close_all()
+
+def init_database():
+    """Bring the database schema up to date by applying pending migrations"""
+    conn = get_connection()
+    if run_migrations(conn):
+        # Migrations may rewrite rows every listing shows
+        revisions.bump(CUSTOMERS, STATS, AGENT_QUEUE)
+    print(f"Database initialized at: {DB_PATH} (schema version {get_schema_version(conn)})")
 
 def save_customer_info(name, contact, source, ip_address, device_info, time_spent=0):
     """Save customer information to database"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO customers (name, contact, source, ip_address, device_type, browser, operating_system, time_spent_seconds)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        name,
-        contact,
-        source,
-        ip_address,
-        device_info.get('device_type', 'Unknown'),
-        device_info.get('browser', 'Unknown'),
-        device_info.get('os', 'Unknown'),
-        time_spent
-    ))
-    
-    customer_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    
+    conn = get_connection()
+
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO customers (name, contact, source, ip_address, device_type, browser, operating_system, time_spent_seconds, priority_score)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            name,
+            contact,
+            source,
+            ip_address,
+            device_info.get('device_type', 'Unknown'),
+            device_info.get('browser', 'Unknown'),
+            device_info.get('os', 'Unknown'),
+            time_spent,
+            calculate_priority_score(time_spent, source)
+        ))
+
+        customer_id = cursor.lastrowid
+        revisions.bump(CUSTOMERS, STATS, conn=conn)
+
+    admin_events.append('lead_created', _get_customer_dict(customer_id))
     return customer_id
 
 def start_chat_session(customer_id):
     """Start a new chat session for a customer"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO chat_sessions (customer_id)
-        VALUES (?)
-    ''', (customer_id,))
-    
-    session_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    
+    conn = get_connection()
+
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO chat_sessions (customer_id)
+            VALUES (?)
+        ''', (customer_id,))
+
+        session_id = cursor.lastrowid
+
     return session_id
 
+def queue_chat_message(customer_id, session_id, message_text, sender):
+    """
+    Queue a chat message on the write-behind buffer (non-blocking)
+    Returns a Future that resolves to the message id once its batch commits
+    """
+    # Timestamped now, not when the batch is written
+    return message_buffer.submit((customer_id, session_id, message_text, sender, _utc_timestamp()))
+
 def save_chat_message(customer_id, session_id, message_text, sender):
     """Save a chat message"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO chat_messages (customer_id, session_id, message_text, sender)
-        VALUES (?, ?, ?, ?)
-    ''', (customer_id, session_id, message_text, sender))
-    
-    # Update message count in session
-    cursor.execute('''
-        UPDATE chat_sessions 
-        SET total_messages = total_messages + 1
-        WHERE id = ?
-    ''', (session_id,))
-    
-    conn.commit()
-    conn.close()
+    if message_buffer is not None:
+        future = queue_chat_message(customer_id, session_id, message_text, sender)
+        if MESSAGE_WRITE_MODE == 'group':
+            future.result()
+        return
+
+    conn = get_connection()
+    timestamp = _utc_timestamp()
+
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO chat_messages (customer_id, session_id, message_text, sender, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (customer_id, session_id, message_text, sender, timestamp))
+        message_id = cursor.lastrowid
+
+        # Update message count in session
+        cursor.execute('''
+            UPDATE chat_sessions
+            SET total_messages = total_messages + 1
+            WHERE id = ?
+        ''', (session_id,))
+
+        revisions.bump(customer_messages(customer_id), conn=conn)
+
+    agent_queue.message_saved(customer_id)
+    _publish_message(message_id, customer_id, session_id, message_text, sender, timestamp)
+
+def _stored_time_spent(cursor, customer_id):
+    cursor.execute('SELECT time_spent_seconds FROM customers WHERE id = ?', (customer_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def _time_spent_visibly_changed(previous, current):
+    """Whether a new time on site shows up in listings (see HEARTBEAT_REVISION_SECONDS)"""
+    if previous is None:
+        return True
+    return int(previous) // HEARTBEAT_REVISION_SECONDS != int(current or 0) // HEARTBEAT_REVISION_SECONDS
 
 def update_time_spent(customer_id, time_spent_seconds):
     """Update time spent on site for a customer"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        UPDATE customers 
-        SET time_spent_seconds = ?, last_active = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (time_spent_seconds, customer_id))
-    
-    conn.commit()
-    conn.close()
+    if heartbeats is not None:
+        # Called on the event loop (async_database.py), so memory only: the
+        # flush writes the row and bumps the revisions
+        # Matches CURRENT_TIMESTAMP (UTC) used by the direct write
+        last_active = _utc_timestamp()
+        heartbeats.record(customer_id, time_spent_seconds, last_active)
+        _update_queued_time_spent(customer_id, time_spent_seconds, last_active, changed=False)
+        return
+
+    conn = get_connection()
+
+    with conn:
+        cursor = conn.cursor()
+        changed = _time_spent_visibly_changed(_stored_time_spent(cursor, customer_id), time_spent_seconds)
+        cursor.execute('''
+            UPDATE customers
+            SET time_spent_seconds = ?,
+                priority_score = calc_priority_score(?, source),
+                last_active = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (time_spent_seconds, time_spent_seconds, customer_id))
+        if changed:
+            revisions.bump(CUSTOMERS, STATS, conn=conn)
+
+    _update_queued_time_spent(customer_id, time_spent_seconds, _utc_timestamp(), changed)
+
+def _update_queued_time_spent(customer_id, time_spent_seconds, last_active, changed=True):
+    """Keep a queued customer's time on site and priority score current"""
+    entry = agent_queue.get_customer(customer_id)
+    if entry:
+        _update_queued_customer(
+            customer_id,
+            bump=changed,
+            time_spent_seconds=time_spent_seconds,
+            last_active=last_active,
+            priority_score=calculate_priority_score(time_spent_seconds, entry['source'])
+        )
 
 def end_chat_session(session_id):
     """End a chat session"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        UPDATE chat_sessions 
-        SET session_end = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (session_id,))
-    
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+
+    with conn:
+        conn.execute('''
+            UPDATE chat_sessions
+            SET session_end = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (session_id,))
+
+    agent_queue.session_ended(session_id)
 
 def get_customer_by_id(customer_id):
     """Retrieve customer information by ID"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
-    
+
     cursor.execute('''
         SELECT * FROM customers WHERE id = ?
     ''', (customer_id,))
-    
-    customer = cursor.fetchone()
-    conn.close()
-    
-    return customer
 
-def get_all_customers():
-    """Retrieve all customers"""
-    conn = sqlite3.connect(DB_PATH)
+    columns = [column[0] for column in cursor.description]
+    return _apply_pending_heartbeat_row(cursor.fetchone(), columns)
+
+def _get_customer_dict(customer_id):
+    """A customer row as a column -> value dictionary (None if missing)"""
+    cursor = get_connection().cursor()
+    cursor.execute('SELECT * FROM customers WHERE id = ?', (customer_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return _apply_pending_heartbeat(dict(zip([column[0] for column in cursor.description], row)))
+
+def get_all_customers(limit=None, before_id=None, after_id=None):
+    """
+    Retrieve customers, newest first
+    - before_id: page backwards through older customers (keyset cursor)
+    - after_id: only customers created after this id (incremental refresh)
+    - limit: page size (None for no limit)
+    """
+    conn = get_connection()
     cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT id, name, contact, source, ip_address, device_type, 
-               time_spent_seconds, created_at, last_active, status, admin_notes
-        FROM customers
-        ORDER BY created_at DESC
-    ''')
-    
-    customers = cursor.fetchall()
-    conn.close()
-    
-    return customers
+    sql_limit = -1 if limit is None else limit
+
+    if after_id is not None:
+        # Walk forward from the cursor so a full page never skips rows,
+        # then flip to the usual newest-first order
+        cursor.execute(CUSTOMERS_AFTER_QUERY, (after_id, sql_limit))
+        customers = cursor.fetchall()[::-1]
+    else:
+        cursor.execute(CUSTOMERS_BEFORE_QUERY, (MAX_ID if before_id is None else before_id, sql_limit))
+        customers = cursor.fetchall()
+
+    columns = [column[0] for column in cursor.description]
+    return [_apply_pending_heartbeat_row(customer, columns) for customer in customers]
 
 def calculate_priority_score(time_spent_seconds, source):
     """
@@ -202,11 +589,11 @@ def calculate_priority_score(time_spent_seconds, source):
     """
     # Base score: 1 point per minute spent on site
     base_score = time_spent_seconds / 60
-    
+
     # Referral bonus points
     referral_bonus = 0
     source_lower = source.lower()
-    
+
     if 'referral' in source_lower:
         referral_bonus = 50  # High priority for referrals
     elif 'advertisement' in source_lower:
@@ -215,32 +602,31 @@ def calculate_priority_score(time_spent_seconds, source):
         referral_bonus = 20  # Some priority for social
     elif 'google search' in source_lower:
         referral_bonus = 10  # Small bonus for organic search
-    
+
     # Total priority score
     priority_score = base_score + referral_bonus
-    
+
     return round(priority_score, 2)
 
-def get_priority_queue():
-    """Get customers sorted by priority score (high to low)"""
-    conn = sqlite3.connect(DB_PATH)
+def get_priority_queue(limit=None, offset=0):
+    """
+    Get non-closed customers sorted by priority score (high to low)
+    - Scores are persisted in customers.priority_score, so this reads the
+      top `limit` rows (all rows if None) directly from the index
+    """
+    # Ordering depends on time on site, so write pending heartbeats first
+    flush_heartbeats()
+
+    conn = get_connection()
     cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT id, name, contact, source, ip_address, device_type, 
-               time_spent_seconds, created_at, last_active, status, admin_notes
-        FROM customers
-        WHERE status != 'closed'
-        ORDER BY created_at DESC
-    ''')
-    
+
+    cursor.execute(PRIORITY_QUEUE_QUERY, (-1 if limit is None else limit, offset))
+
     customers = cursor.fetchall()
-    conn.close()
-    
-    # Calculate priority scores and sort
+
     priority_list = []
     for customer in customers:
-        customer_dict = {
+        priority_list.append({
             'id': customer[0],
             'name': customer[1],
             'contact': customer[2],
@@ -250,132 +636,209 @@ def get_priority_queue():
             'time_spent_seconds': customer[6],
             'created_at': customer[7],
             'last_active': customer[8],
-            'status': customer[9] if len(customer) > 9 else 'new',
-            'admin_notes': customer[10] if len(customer) > 10 else ''
-        }
-        
-        # Calculate priority score
-        priority_score = calculate_priority_score(
-            customer_dict['time_spent_seconds'],
-            customer_dict['source']
-        )
-        customer_dict['priority_score'] = priority_score
-        
-        priority_list.append(customer_dict)
-    
-    # Sort by priority score (highest first)
-    priority_list.sort(key=lambda x: x['priority_score'], reverse=True)
-    
+            'status': customer[9],
+            'admin_notes': customer[10],
+            'priority_score': customer[11]
+        })
+
     return priority_list
 
 def get_customer_stats():
-    """Get statistics about customers"""
-    conn = sqlite3.connect(DB_PATH)
+    """
+    Get statistics about customers
+    - Read from the customer_stats counters, which triggers keep current on
+      every customers write, instead of aggregating the whole table
+    """
+    # The average time on site includes pending heartbeats
+    flush_heartbeats()
+
+    conn = get_connection()
+    return read_stats(conn.cursor())
+
+# Lead columns the admin dashboard may ask for (?fields=)
+DASHBOARD_LEAD_FIELDS = (
+    'id', 'name', 'contact', 'source', 'ip_address', 'device_type', 'browser',
+    'operating_system', 'time_spent_seconds', 'created_at', 'last_active',
+    'status', 'admin_notes', 'priority_score'
+)
+
+def get_admin_dashboard(lead_limit=None, before_id=None, priority_limit=100, fields=None):
+    """
+    Everything the admin dashboard shows, read from one consistent snapshot
+    - stats from the customer_stats counters
+    - a keyset page of leads, newest first (lead_limit None for all)
+    - the top `priority_limit` open leads, straight from the priority index
+    - fields: lead columns to return (id is always included); None for all
+    """
+    if fields is None:
+        fields = DASHBOARD_LEAD_FIELDS
+    unknown = [field for field in fields if field not in DASHBOARD_LEAD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    columns = ['id'] + [field for field in DASHBOARD_LEAD_FIELDS if field in fields and field != 'id']
+    select = ', '.join(columns)
+
+    # Stats and priority order include time on site, so write pending heartbeats first
+    flush_heartbeats()
+
+    conn = get_connection()
     cursor = conn.cursor()
-    
-    stats = {}
-    
-    # Total customers
-    cursor.execute('SELECT COUNT(*) FROM customers')
-    stats['total_customers'] = cursor.fetchone()[0]
-    
-    # Source breakdown
-    cursor.execute('SELECT source, COUNT(*) FROM customers GROUP BY source')
-    stats['source_breakdown'] = dict(cursor.fetchall())
-    
-    # Average time spent
-    cursor.execute('SELECT AVG(time_spent_seconds) FROM customers')
-    stats['avg_time_spent'] = cursor.fetchone()[0] or 0
-    
-    # Device type breakdown
-    cursor.execute('SELECT device_type, COUNT(*) FROM customers GROUP BY device_type')
-    stats['device_breakdown'] = dict(cursor.fetchall())
-    
-    # Status breakdown
-    cursor.execute('SELECT status, COUNT(*) FROM customers GROUP BY status')
-    stats['status_breakdown'] = dict(cursor.fetchall())
-    
-    conn.close()
-    return stats
+
+    # One read transaction: stats, leads and priority list see the same data
+    conn.execute('BEGIN')
+    try:
+        stats = read_stats(cursor)
+
+        cursor.execute(f'''
+            SELECT {select} FROM customers
+            WHERE id < ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (MAX_ID if before_id is None else before_id, -1 if lead_limit is None else lead_limit))
+        leads = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        cursor.execute(f'''
+            SELECT {select} FROM customers
+            WHERE status != 'closed'
+            ORDER BY priority_score DESC, created_at DESC
+            LIMIT ?
+        ''', (priority_limit,))
+        priority_leads = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        conn.rollback()
+
+    next_cursor = None
+    if lead_limit is not None and len(leads) == lead_limit:
+        next_cursor = leads[-1]['id']
+
+    return {
+        'stats': stats,
+        'leads': leads,
+        'next_cursor': next_cursor,
+        'priority_leads': priority_leads
+    }
+
+def rebuild_customer_stats():
+    """
+    Recompute the stats counters from scratch
+    Returns (counters before the rebuild, freshly computed stats)
+    """
+    flush_heartbeats()
+    conn = get_connection()
+
+    with conn:
+        # Take the write lock first so no customer write lands in between
+        conn.execute('BEGIN IMMEDIATE')
+        cursor = conn.cursor()
+        before = read_stats(cursor)
+        expected = compute_stats(cursor)
+        rebuild_stats(cursor)
+        revisions.bump(STATS, conn=conn)
+
+    return before, expected
 
 def update_customer_status(customer_id, status):
     """Update customer status (new, contacted, in_progress, closed)"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        UPDATE customers 
-        SET status = ?, last_active = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (status, customer_id))
-    
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+
+    with conn:
+        conn.execute('''
+            UPDATE customers
+            SET status = ?, last_active = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (status, customer_id))
+        revisions.bump(CUSTOMERS, STATS, conn=conn)
+
+    admin_events.append('status_changed', {'customer_id': customer_id, 'status': status})
+    _update_queued_customer(customer_id, status=status, last_active=_utc_timestamp())
 
 def update_customer_notes(customer_id, notes):
     """Update admin notes for a customer"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        UPDATE customers 
-        SET admin_notes = ?, last_active = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (notes, customer_id))
-    
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+
+    with conn:
+        conn.execute('''
+            UPDATE customers
+            SET admin_notes = ?, last_active = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (notes, customer_id))
+        revisions.bump(CUSTOMERS, customer_notes(customer_id), conn=conn)
+
+    admin_events.append('notes_changed', {'customer_id': customer_id, 'admin_notes': notes})
+    _update_queued_customer(customer_id, admin_notes=notes, last_active=_utc_timestamp())
 
 def get_customer_notes(customer_id):
     """Get admin notes for a customer"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
-    
+
     cursor.execute('SELECT admin_notes FROM customers WHERE id = ?', (customer_id,))
     result = cursor.fetchone()
-    conn.close()
-    
+
     return result[0] if result and result[0] else ""
 
 def delete_customer(customer_id):
     """Delete a customer and all associated data"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
+    # Buffered messages would otherwise be written after their rows are deleted
+    if message_buffer is not None:
+        message_buffer.discard(lambda message: message[0] == customer_id)
+    if heartbeats is not None:
+        heartbeats.discard(customer_id)
+
+    conn = get_connection()
+
     try:
-        # Delete associated chat messages
-        cursor.execute('DELETE FROM chat_messages WHERE customer_id = ?', (customer_id,))
-        
-        # Delete associated chat sessions
-        cursor.execute('DELETE FROM chat_sessions WHERE customer_id = ?', (customer_id,))
-        
-        # Delete the customer
-        cursor.execute('DELETE FROM customers WHERE id = ?', (customer_id,))
-        
-        conn.commit()
+        with conn:
+            cursor = conn.cursor()
+
+            # Delete associated chat messages
+            cursor.execute('DELETE FROM chat_messages WHERE customer_id = ?', (customer_id,))
+
+            # Delete associated chat sessions
+            cursor.execute('DELETE FROM chat_sessions WHERE customer_id = ?', (customer_id,))
+
+            # Delete the customer
+            cursor.execute('DELETE FROM customers WHERE id = ?', (customer_id,))
+
+            revisions.bump(CUSTOMERS, STATS, conn=conn)
+            revisions.forget(customer_messages(customer_id), customer_notes(customer_id), conn=conn)
+
+        agent_queue.remove(customer_id)
+        admin_events.append('lead_deleted', {'customer_id': customer_id})
         return True
     except Exception as e:
-        conn.rollback()
         print(f"Error deleting customer: {e}")
         return False
-    finally:
-        conn.close()
 
-def get_customer_chat_messages(customer_id):
-    """Get all chat messages for a specific customer"""
-    conn = sqlite3.connect(DB_PATH)
+def get_customer_chat_messages(customer_id, since_id=None, before_id=None, limit=None, include_pending=True):
+    """
+    Get chat messages for a specific customer in chronological order
+    - since_id: only messages newer than this id (incremental polling)
+    - before_id: the `limit` messages immediately before this id (scrollback)
+    - limit only: the latest `limit` messages
+    - no arguments: the full transcript
+    - include_pending: append messages still in the write buffer (except for
+      scrollback); they have no id yet ('id' is None) and are returned again,
+      with their id, once written
+    """
+    pending = _pending_messages(customer_id) if include_pending and before_id is None else []
+
+    conn = get_connection()
     cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT id, customer_id, session_id, message_text, sender, timestamp
-        FROM chat_messages
-        WHERE customer_id = ?
-        ORDER BY timestamp ASC
-    ''', (customer_id,))
-    
-    messages = cursor.fetchall()
-    conn.close()
-    
+    sql_limit = -1 if limit is None else limit
+
+    if since_id is None and (before_id is not None or limit is not None):
+        # Tail of the transcript: read backwards from the cursor, then reverse
+        cursor.execute(CUSTOMER_MESSAGES_BEFORE_QUERY, (
+            customer_id,
+            MAX_ID if before_id is None else before_id,
+            sql_limit
+        ))
+        messages = cursor.fetchall()[::-1]
+    else:
+        cursor.execute(CUSTOMER_MESSAGES_QUERY, (customer_id, since_id or 0, sql_limit))
+        messages = cursor.fetchall()
+
     # Convert to list of dictionaries
     message_list = []
     for msg in messages:
@@ -387,116 +850,147 @@ def get_customer_chat_messages(customer_id):
             'sender': msg[4],
             'timestamp': msg[5]
         })
-    
+
+    if pending:
+        # Drop buffered messages written since they were read (same fields)
+        written = Counter((m['session_id'], m['sender'], m['text'], m['timestamp']) for m in message_list)
+        unwritten = []
+        for _, session_id, message_text, sender, timestamp in pending:
+            key = (session_id, sender, message_text, timestamp)
+            if written[key]:
+                written[key] -= 1
+                continue
+            unwritten.append({
+                'id': None,
+                'customer_id': customer_id,
+                'session_id': session_id,
+                'text': message_text,
+                'sender': sender,
+                'timestamp': timestamp
+            })
+
+        if since_id is not None or limit is None:
+            # Forward read: buffered messages follow, if the page has room
+            room = len(unwritten) if limit is None else max(limit - len(messages), 0)
+            message_list.extend(unwritten[:room])
+        else:
+            # Latest `limit` messages
+            message_list = (message_list + unwritten)[-limit:]
+
     return message_list
 
 def get_latest_session(customer_id):
     """Get the latest active session for a customer, or create one if none exists"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
-    
+
     # Get the latest session that hasn't ended
-    cursor.execute('''
-        SELECT id FROM chat_sessions 
-        WHERE customer_id = ? AND session_end IS NULL
-        ORDER BY session_start DESC
-        LIMIT 1
-    ''', (customer_id,))
-    
+    cursor.execute(LATEST_SESSION_QUERY, (customer_id,))
+
     result = cursor.fetchone()
-    conn.close()
-    
+
     if result:
         session_id = result[0]
     else:
         # Create a new session if none exists
         session_id = start_chat_session(customer_id)
-    
+
     return session_id
 
 def mark_agent_requested(customer_id, session_id=None):
     """Mark that a customer has requested an agent with current timestamp"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
+    conn = get_connection()
+
     try:
         # Get current timestamp
         current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
+
         # If no session_id provided, get the latest session
         if not session_id:
             session_id = get_latest_session(customer_id)
-        
-        # Update the session to mark agent as requested with timestamp
-        cursor.execute('''
-            UPDATE chat_sessions 
-            SET agent_requested = 1, agent_requested_at = ?
-            WHERE id = ? AND customer_id = ?
-        ''', (current_time, session_id, customer_id))
-        
-        rows_updated = cursor.rowcount
-        
-        # If no rows were updated, create a new session with agent_requested = 1 and timestamp
-        if rows_updated == 0:
+
+        with conn:
+            cursor = conn.cursor()
+
+            # Update the session to mark agent as requested with timestamp
             cursor.execute('''
-                INSERT INTO chat_sessions (customer_id, agent_requested, agent_requested_at)
-                VALUES (?, 1, ?)
-            ''', (customer_id, current_time))
-            session_id = cursor.lastrowid
-        
-        conn.commit()
-        
+                UPDATE chat_sessions
+                SET agent_requested = 1, agent_requested_at = ?
+                WHERE id = ? AND customer_id = ?
+            ''', (current_time, session_id, customer_id))
+
+            rows_updated = cursor.rowcount
+
+            # If no rows were updated, create a new session with agent_requested = 1 and timestamp
+            if rows_updated == 0:
+                cursor.execute('''
+                    INSERT INTO chat_sessions (customer_id, agent_requested, agent_requested_at)
+                    VALUES (?, 1, ?)
+                ''', (customer_id, current_time))
+                session_id = cursor.lastrowid
+
+            revisions.bump(AGENT_QUEUE, conn=conn)
+
         # Verify the update
+        cursor = conn.cursor()
         cursor.execute('''
-            SELECT agent_requested FROM chat_sessions 
+            SELECT agent_requested FROM chat_sessions
             WHERE id = ? AND customer_id = ?
         ''', (session_id, customer_id))
         result = cursor.fetchone()
-        
+
         if result and result[0] == 1:
+            admin_events.append('agent_requested', {
+                'customer_id': customer_id,
+                'session_id': session_id,
+                'requested_at': current_time
+            })
+            _queue_agent_request(customer_id, session_id, current_time)
             return True
         else:
             print(f"Warning: agent_requested not set for customer {customer_id}, session {session_id}")
             return False
-            
+
     except Exception as e:
         print(f"Error marking agent requested: {e}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
+
+def _queue_agent_request(customer_id, session_id, requested_at):
+    """Add a fresh agent request to the in-memory agent queue"""
+    buffered = bool(_pending_messages(customer_id))
+    cursor = get_connection().cursor()
+    cursor.execute(QUEUE_CUSTOMER_QUERY, (customer_id,))
+    row = cursor.fetchone()
+    if row:
+        customer = _apply_pending_heartbeat(dict(zip(QUEUE_CUSTOMER_COLUMNS, row[:12])))
+        agent_queue.request(
+            customer,
+            session_id,
+            datetime.strptime(requested_at, '%Y-%m-%d %H:%M:%S'),
+            bool(row[12]) or buffered
+        )
 
 def get_agent_queue():
     """Get customers who have JUST requested to connect to an agent (within the last hour)"""
-    conn = sqlite3.connect(DB_PATH)
+    if AGENT_QUEUE_IN_MEMORY:
+        if not agent_queue.loaded:
+            rebuild_agent_queue()
+        return agent_queue.snapshot()
+
+    conn = get_connection()
     cursor = conn.cursor()
-    
+
     # Get ONLY customers who:
     # 1. Have requested an agent (agent_requested = 1) WITHIN THE LAST HOUR
     # 2. Have an active session (session_end IS NULL) - meaning they're currently chatting
     # 3. Have at least one chat message (they've actually chatted)
     # 4. Have status 'new' or 'in_progress' (not 'contacted' or 'closed')
     # 5. The agent_requested_at timestamp is within the last hour (recent requests only)
-    cursor.execute('''
-        SELECT DISTINCT c.id, c.name, c.contact, c.source, c.ip_address, c.device_type, 
-               c.time_spent_seconds, c.created_at, c.last_active, c.status, c.admin_notes,
-               cs.agent_requested_at
-        FROM customers c
-        INNER JOIN chat_sessions cs ON c.id = cs.customer_id
-        WHERE c.status IN ('new', 'in_progress')
-          AND cs.agent_requested = 1
-          AND cs.session_end IS NULL
-          AND cs.agent_requested_at IS NOT NULL
-          AND datetime(cs.agent_requested_at) >= datetime('now', '-1 hour')
-          AND EXISTS (
-            SELECT 1 FROM chat_messages cm 
-            WHERE cm.customer_id = c.id
-          )
-        ORDER BY cs.agent_requested_at DESC
-    ''')
-    
+    # A customer whose first message is still buffered appears once it is written
+    cursor.execute(AGENT_QUEUE_QUERY, (_agent_request_cutoff(),))
+
     customers = cursor.fetchall()
-    
+
     # Convert to list of dictionaries with priority scores
     queue_list = []
     for customer in customers:
@@ -511,30 +1005,126 @@ def get_agent_queue():
             'created_at': customer[7],
             'last_active': customer[8],
             'status': customer[9] if len(customer) > 9 else 'new',
-            'admin_notes': customer[10] if len(customer) > 10 else ''
+            'admin_notes': customer[10] if len(customer) > 10 else '',
+            'priority_score': customer[11]
         }
-        
-        # Calculate priority score
-        priority_score = calculate_priority_score(
-            customer_dict['time_spent_seconds'],
-            customer_dict['source']
-        )
-        customer_dict['priority_score'] = priority_score
-        
+
         # All customers in queue have already requested agent (filtered by query)
         customer_dict['agent_requested'] = True
-        
-        queue_list.append(customer_dict)
-    
+
+        queue_list.append(_apply_pending_heartbeat(customer_dict))
+
     # Sort by: priority score (highest first), then by creation time (newest first)
     queue_list.sort(key=lambda x: (
         -x['priority_score'],  # Higher priority score first
     ))
-    
-    conn.close()
-    
+
     return queue_list
 
+# Rows fetched per query by the bulk export iterators
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+EXPORT_CUSTOMER_COLUMNS = (
+    'id', 'name', 'contact', 'source', 'ip_address', 'device_type', 'browser',
+    'operating_system', 'time_spent_seconds', 'status', 'admin_notes',
+    'priority_score', 'created_at', 'last_active'
+)
+
+EXPORT_MESSAGE_COLUMNS = (
+    'id', 'customer_id', 'customer_name', 'customer_contact', 'session_id',
+    'sender', 'message_text', 'timestamp'
+)
+
+def parse_export_time(value):
+    """
+    Normalize an ISO 8601 date or date-time filter to the stored timestamp
+    format ('YYYY-MM-DD HH:MM:SS', UTC), so it compares correctly as text
+    Values without an offset are taken as UTC; raises ValueError if unparseable
+    """
+    try:
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    except (OverflowError, ValueError):
+        raise ValueError(f"Invalid date or date-time: {value}")
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def _export_filters(date_column, start, end, status, source):
+    """Build the WHERE clauses and parameters shared by the export iterators"""
+    clauses, params = [], []
+    if start:
+        clauses.append(f'{date_column} >= ?')
+        params.append(parse_export_time(start))
+    if end:
+        clauses.append(f'{date_column} < ?')
+        params.append(parse_export_time(end))
+    if status:
+        clauses.append('c.status = ?')
+        params.append(status)
+    if source:
+        clauses.append('c.source = ?')
+        params.append(source)
+    return clauses, params
+
+def _iter_keyset_batches(sql, params, batch_size):
+    """
+    Yield lists of rows from a query ordered by id, one short query per batch
+    - sql must filter on "id > ?" (first placeholder) and end with LIMIT ?
+    - No read transaction stays open between batches, so an export never
+      pins a WAL snapshot or blocks checkpoints for its whole duration
+    """
+    last_id = 0
+    while True:
+        cursor = get_connection().cursor()
+        cursor.execute(sql, (last_id, *params, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+def iter_customers_for_export(start=None, end=None, status=None, source=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield batches of customer dicts for bulk export, in id order
+    - start/end filter on created_at (end is exclusive)
+    """
+    flush_heartbeats()
+
+    clauses, params = _export_filters('c.created_at', start, end, status, source)
+    where = ''.join(f' AND {clause}' for clause in clauses)
+    sql = f'''
+        SELECT {', '.join('c.' + column for column in EXPORT_CUSTOMER_COLUMNS)}
+        FROM customers c
+        WHERE c.id > ?{where}
+        ORDER BY c.id
+        LIMIT ?
+    '''
+
+    for rows in _iter_keyset_batches(sql, params, batch_size):
+        yield [dict(zip(EXPORT_CUSTOMER_COLUMNS, row)) for row in rows]
+
+def iter_messages_for_export(start=None, end=None, status=None, source=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield batches of chat message dicts (with customer name/contact) for bulk export, in id order
+    - start/end filter on the message timestamp (end is exclusive)
+    - status/source filter on the customer
+    - messages still in the write buffer are not exported yet
+    """
+    clauses, params = _export_filters('m.timestamp', start, end, status, source)
+    where = ''.join(f' AND {clause}' for clause in clauses)
+    sql = f'''
+        SELECT m.id, m.customer_id, c.name, c.contact, m.session_id,
+               m.sender, m.message_text, m.timestamp
+        FROM chat_messages m
+        INNER JOIN customers c ON c.id = m.customer_id
+        WHERE m.id > ?{where}
+        ORDER BY m.id
+        LIMIT ?
+    '''
+
+    for rows in _iter_keyset_batches(sql, params, batch_size):
+        yield [dict(zip(EXPORT_MESSAGE_COLUMNS, row)) for row in rows]
+
 # Initialize database when module is imported
 if __name__ == '__main__':
     init_database()
@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import threading
+
+# Pragma defaults, overridable from the environment
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '16384'))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(64 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+class ConnectionPool:
+    """
+    Long-lived SQLite connections, one per thread.
+
+    sqlite3 connections must not be shared between threads, so instead of a
+    checkout/checkin pool each thread lazily opens its own connection and keeps
+    it for the life of the thread. Every connection runs in WAL journal mode so
+    readers never block the single writer (and vice versa).
+    """
+
+    def __init__(self, db_path, on_connect=None):
+        self.db_path = db_path
+        self.on_connect = on_connect
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _configure(self, conn):
+        """Apply journal mode and performance pragmas to a new connection"""
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+        # Negative cache_size is measured in KiB rather than pages
+        conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+        conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+
+        if self.on_connect:
+            self.on_connect(conn)
+
+    def connection(self):
+        """Return the calling thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # check_same_thread is off only so close_all() can run from the
+            # shutdown thread; in normal use a connection never leaves its thread
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                check_same_thread=False
+            )
+            self._configure(conn)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close_all(self):
+        """Close every connection opened by the pool (used on shutdown)"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+
+        for conn in connections:
+            conn.close()
+
+        self._local = threading.local()
+
+    def stats(self):
+        """Return pool statistics"""
+        with self._lock:
+            return {
+                "db_path": self.db_path,
+                "open_connections": len(self._connections)
+            }
@@ -0,0 +1,100 @@
+"""
+LRU cache of query embeddings.
+
+Visitor questions repeat heavily, and embedding one is a model run. Vectors
+are kept as compact NumPy arrays (float32, or float16 at half the memory) keyed
+on the embedding model id and the normalized query text, and the least
+recently used ones are evicted once the cache holds more than its memory cap.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true'
+EMBEDDING_CACHE_MAX_MB = float(os.getenv('EMBEDDING_CACHE_MAX_MB', '16'))
+# float32 keeps vectors exact; float16 halves memory at ~3 significant digits
+EMBEDDING_CACHE_DTYPE = os.getenv('EMBEDDING_CACHE_DTYPE', 'float32')
+
+# Rough per-entry cost of the dict slot, key tuple and array header
+ENTRY_OVERHEAD_BYTES = 200
+
+def normalize_text(text):
+    """
+    Case- and whitespace-insensitive form of a query
+    The default model (all-MiniLM-L6-v2) lowercases its input and splits on
+    whitespace, so this never changes the embedding
+    """
+    return re.sub(r'\s+', ' ', text.strip().lower())
+
+class EmbeddingCache:
+    def __init__(self, max_bytes=int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024), dtype=EMBEDDING_CACHE_DTYPE):
+        if dtype not in ('float32', 'float16'):
+            raise ValueError(f"Unsupported embedding cache dtype: {dtype}")
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+
+        # (model id, normalized text) -> vector, least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _entry_bytes(key, vector):
+        return vector.nbytes + len(key[1]) + ENTRY_OVERHEAD_BYTES
+
+    def get(self, model_id, text):
+        """Cached embedding as a list of floats, or None"""
+        key = (model_id, normalize_text(text))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return vector.astype(np.float32).tolist()
+
+    def set(self, model_id, text, embedding):
+        key = (model_id, normalize_text(text))
+        vector = np.asarray(embedding, dtype=self.dtype)
+        size = self._entry_bytes(key, vector)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= self._entry_bytes(key, previous)
+            self._entries[key] = vector
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                old_key, old_vector = self._entries.popitem(last=False)
+                self._bytes -= self._entry_bytes(old_key, old_vector)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return cache statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "dtype": self.dtype.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+                "evictions": self.evictions
+            }
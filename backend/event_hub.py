@@ -0,0 +1,181 @@
+"""
+In-process publish/subscribe hub for server-push endpoints.
+
+Write paths publish events to a channel (e.g. one per customer) from any
+thread; each subscriber is an asyncio.Queue on the server's event loop that an
+SSE endpoint drains. Publishing to a channel nobody listens to costs a dict
+lookup, so idle visitors generate no work at all.
+
+Like the agent queue, the hub belongs to one process: with several server
+workers a subscriber only sees events published by its own worker.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+
+class Subscription:
+    """
+    Events for one subscriber
+    A subscriber that falls max_pending events behind is dropped: it keeps the
+    events already queued, then `closed` turns True and it should reconnect
+    """
+
+    def __init__(self, channel, max_pending):
+        self.channel = channel
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.dropped = False
+
+    @property
+    def closed(self):
+        return self.dropped and self.queue.empty()
+
+    async def get(self, timeout=None):
+        """Next event, or None if none arrived within timeout seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class EventHub:
+    def __init__(self, max_pending=256):
+        self.max_pending = max_pending
+        self._loop = None
+        self._channels = {}
+        self._lock = threading.Lock()
+
+        self.events_published = 0
+        self.events_delivered = 0
+        self.subscribers_dropped = 0
+
+    def bind(self, loop):
+        """Attach the event loop that subscribers run on (call at startup)"""
+        self._loop = loop
+
+    def subscribe(self, channel):
+        """Start receiving a channel's events (call from the event loop)"""
+        subscription = Subscription(channel, self.max_pending)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def has_subscribers(self, channel):
+        with self._lock:
+            return channel in self._channels
+
+    def publish(self, channel, event):
+        """Send an event to a channel's subscribers; safe to call from any thread"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        if not subscribers:
+            return
+
+        self.events_published += 1
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, subscribers, event)
+        except RuntimeError:
+            # Loop shut down between the check and the call
+            pass
+
+    def _deliver(self, subscribers, event):
+        for subscription in subscribers:
+            if subscription.dropped:
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+                self.events_delivered += 1
+            except asyncio.QueueFull:
+                # A stalled client: cut it loose, it resumes from its last id
+                subscription.dropped = True
+                self.subscribers_dropped += 1
+                self.unsubscribe(subscription)
+
+    def stats(self):
+        """Return hub statistics"""
+        with self._lock:
+            channels = len(self._channels)
+            subscribers = sum(len(subscribers) for subscribers in self._channels.values())
+        return {
+            "channels": channels,
+            "subscribers": subscribers,
+            "events_published": self.events_published,
+            "events_delivered": self.events_delivered,
+            "subscribers_dropped": self.subscribers_dropped
+        }
+
+class EventLog:
+    """
+    Numbered event stream with a replay buffer, published on one hub channel
+
+    Event ids look like "<epoch>-<sequence>": the epoch changes every time the
+    process starts, so a client resuming with an id from an earlier run (or one
+    that has scrolled out of the last `size` events) is told to reload instead
+    of silently missing events.
+    """
+
+    def __init__(self, hub, channel, size=1000):
+        self.hub = hub
+        self.channel = channel
+        self.epoch = str(int(time.time() * 1000))
+        self._sequence = 0
+        self._events = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def append(self, event_type, data):
+        """Record an event and publish it; safe to call from any thread"""
+        with self._lock:
+            self._sequence += 1
+            event = {
+                'id': f"{self.epoch}-{self._sequence}",
+                'sequence': self._sequence,
+                'type': event_type,
+                'data': data
+            }
+            self._events.append(event)
+            # Publish under the lock so subscribers see events in id order
+            self.hub.publish(self.channel, event)
+        return event
+
+    def last_id(self):
+        with self._lock:
+            return f"{self.epoch}-{self._sequence}"
+
+    def since(self, event_id):
+        """
+        Events after event_id, oldest first
+        Returns None when they can no longer be replayed (unknown epoch or too old)
+        """
+        epoch, _, sequence = (event_id or '').partition('-')
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+
+        with self._lock:
+            if sequence > self._sequence:
+                return None
+            if sequence == self._sequence:
+                return []
+            if not self._events or self._events[0]['sequence'] > sequence + 1:
+                return None
+            return [event for event in self._events if event['sequence'] > sequence]
+
+# Global hub instance
+event_hub = EventHub()
+
+def customer_channel(customer_id):
+    """Channel carrying a customer's chat messages"""
+    return f"customer:{customer_id}"
+
+# Lead and agent queue changes for the admin and agent consoles
+ADMIN_CHANNEL = "admin"
+admin_events = EventLog(event_hub, ADMIN_CHANNEL)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Bulk Export
+Streams leads or chat transcripts as NDJSON or CSV, batch by batch, so memory
+use stays flat regardless of table size
+
+Usage:
+    python export_data.py leads --format csv --status new --output leads.csv
+    python export_data.py transcripts --start 2024-01-01 --end 2024-02-01
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import sys
+
+from database import (
+    init_database,
+    parse_export_time,
+    iter_customers_for_export,
+    iter_messages_for_export,
+    EXPORT_CUSTOMER_COLUMNS,
+    EXPORT_MESSAGE_COLUMNS
+)
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Export kind -> (batch iterator, CSV columns)
+EXPORTS = {
+    'leads': (iter_customers_for_export, EXPORT_CUSTOMER_COLUMNS),
+    'transcripts': (iter_messages_for_export, EXPORT_MESSAGE_COLUMNS),
+}
+
+def format_ndjson(rows):
+    """One JSON object per line"""
+    return ''.join(json.dumps(row, default=str) + '\n' for row in rows)
+
+def format_csv(rows, columns, header=False):
+    """CSV lines for a batch of rows, optionally preceded by the header"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+class ExportFormatter:
+    """Turns successive batches of rows into chunks of NDJSON or CSV text"""
+
+    def __init__(self, export_format, columns):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {export_format}")
+        self.export_format = export_format
+        self.columns = columns
+        self._header_written = False
+
+    def header(self):
+        """Leading chunk (the CSV header row), written even for an empty export"""
+        if self.export_format == 'csv' and not self._header_written:
+            self._header_written = True
+            return format_csv([], self.columns, header=True)
+        return ''
+
+    def format(self, rows):
+        if self.export_format == 'csv':
+            return self.header() + format_csv(rows, self.columns)
+        return format_ndjson(rows)
+
+def export(kind, export_format, output, **filters):
+    """Write a full export to a text stream; returns the number of rows written"""
+    iterate, columns = EXPORTS[kind]
+    formatter = ExportFormatter(export_format, columns)
+
+    output.write(formatter.header())
+    count = 0
+    for rows in iterate(**filters):
+        output.write(formatter.format(rows))
+        count += len(rows)
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Export leads or chat transcripts")
+    parser.add_argument('kind', choices=sorted(EXPORTS))
+    parser.add_argument('--format', dest='export_format', choices=EXPORT_FORMATS, default='ndjson')
+    parser.add_argument('--start', type=parse_export_time,
+                        help="Only rows on or after this date/time (ISO 8601; UTC unless it has an offset)")
+    parser.add_argument('--end', type=parse_export_time, help="Only rows before this date/time")
+    parser.add_argument('--status', help="Only customers with this status")
+    parser.add_argument('--source', help="Only customers from this source")
+    parser.add_argument('--output', help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    # Keep migration messages out of an export written to stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        init_database()
+
+    filters = dict(start=args.start, end=args.end, status=args.status, source=args.source)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as output:
+            count = export(args.kind, args.export_format, output, **filters)
+    else:
+        count = export(args.kind, args.export_format, sys.stdout, **filters)
+
+    print(f"Exported {count} {args.kind} rows", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
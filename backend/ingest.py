@@ -0,0 +1,105 @@
+"""
+Streaming knowledge base ingestion from a directory of documents.
+
+Source files (.txt and .md, searched recursively) are listed lazily and
+parsed and chunked in a process pool, a bounded number of files ahead of the
+writer, so memory stays flat however large the directory grows. Chunks are
+then embedded and written to the collection in large batches by
+VectorDatabase.reindex, which only embeds new or changed chunks and resumes
+an interrupted build from its staging collection.
+
+Imports nothing heavy at module level: worker processes load only chunking.
+"""
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from chunking import page_chunks
+
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', str(min(os.cpu_count() or 1, 8))))
+SOURCE_EXTENSIONS = ('.txt', '.md')
+# Seconds between progress lines
+PROGRESS_INTERVAL = 2.0
+
+def iter_source_files(directory):
+    """(path, source name relative to directory) for each source file, in a stable order"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(SOURCE_EXTENSIONS):
+                path = os.path.join(root, name)
+                yield path, os.path.relpath(path, directory).replace(os.sep, '/')
+
+def parse_source(path, source):
+    """(source, bytes read, chunks) for one file; runs in a worker process"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        chunks = list(page_chunks(f, source))
+    return source, os.path.getsize(path), chunks
+
+def parse_sources(files, workers=INGEST_WORKERS):
+    """parse_source for each file in a process pool, results in file order"""
+    if workers <= 1:
+        for path, source in files:
+            yield parse_source(path, source)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Only a few files per worker are in flight, so the listing stays lazy
+        in_flight = deque()
+        for path, source in files:
+            in_flight.append(executor.submit(parse_source, path, source))
+            if len(in_flight) >= workers * 2:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+class IngestProgress:
+    """Prints files, chunks and throughput while an ingestion runs"""
+
+    def __init__(self, interval=PROGRESS_INTERVAL, stream=sys.stdout):
+        self.interval = interval
+        self.stream = stream
+        self.started = time.perf_counter()
+        self.printed = self.started
+        self.files = 0
+        self.bytes = 0
+        self.stats = {"chunks": 0, "embedded": 0, "reused": 0}
+
+    def file_done(self, size):
+        self.files += 1
+        self.bytes += size
+
+    def batch_done(self, stats):
+        self.stats = stats
+        now = time.perf_counter()
+        if now - self.printed >= self.interval:
+            self.printed = now
+            self.report()
+
+    def report(self, label="⏳"):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        print(f"{label} {self.files} files, {self.bytes / 1e6:.1f} MB, {self.stats['chunks']} chunks "
+              f"({self.stats['embedded']} embedded, {self.stats['reused']} reused) | "
+              f"{self.stats['chunks'] / elapsed:.0f} chunks/s, {self.bytes / 1e6 / elapsed:.2f} MB/s, "
+              f"{elapsed:.1f}s", file=self.stream, flush=True)
+
+def ingest_directory(vector_db, directory, workers=INGEST_WORKERS, batch_size=None, dry_run=False):
+    """Make the knowledge base hold exactly the chunks of the files under directory"""
+    print(f"\n📂 Ingesting knowledge base sources from: {directory} ({workers} workers)")
+    if not os.path.isdir(directory):
+        print(f"❌ Error: Directory not found at {directory}")
+        return False
+
+    progress = IngestProgress()
+
+    def chunks():
+        for source, size, file_chunks in parse_sources(iter_source_files(directory), workers):
+            progress.file_done(size)
+            yield from file_chunks
+
+    options = {"batch_size": batch_size} if batch_size else {}
+    success = vector_db.reindex(chunks(), dry_run, progress=progress.batch_done, **options)
+    progress.report("📈")
+    return success
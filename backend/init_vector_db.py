@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
 """
 Initialize ChromaDB Vector Database with DASA Hospitality Knowledge Base
+
+Only chunks that are new or changed since the last run are embedded;
+--dry-run reports what would change without touching the database.
+--source may name a directory of .txt/.md documents, which is parsed in a
+process pool and streamed into the database (see ingest.py); an interrupted
+run resumes where it stopped
 """
+import argparse
 import sys
 from pathlib import Path
 
@@ -9,16 +16,27 @@ from pathlib import Path
 backend_dir = Path(__file__).parent
 sys.path.insert(0, str(backend_dir))
 
+from ingest import INGEST_WORKERS, ingest_directory
 from vector_db import vector_db
 
 def main():
     """Initialize the vector database"""
+    parser = argparse.ArgumentParser(description="Load the knowledge base into the vector database")
+    parser.add_argument('--source', default=str(backend_dir / "knowledge_base.txt"),
+                        help="knowledge base file, or a directory of .txt/.md files")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="report how many chunks would be added, updated and removed")
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS,
+                        help="processes parsing a source directory")
+    parser.add_argument('--batch-size', type=int, help="chunks embedded and written per call")
+    args = parser.parse_args()
+    
     print("=" * 70)
     print("DASA Hospitality - Vector Database Initialization")
     print("=" * 70)
     
-    # Path to knowledge base file
-    kb_file = backend_dir / "knowledge_base.txt"
+    # Path to knowledge base file or directory
+    kb_file = Path(args.source)
     
     if not kb_file.exists():
         print(f"\n❌ Error: Knowledge base file not found at {kb_file}")
@@ -27,7 +45,22 @@ def main():
     
     # Load knowledge base into vector database
     print(f"\n🚀 Starting vector database initialization...")
-    success = vector_db.load_knowledge_base(str(kb_file))
+    version = vector_db.version
+    if kb_file.is_dir():
+        success = ingest_directory(vector_db, str(kb_file), args.workers, args.batch_size, args.dry_run)
+    else:
+        success = vector_db.load_knowledge_base(str(kb_file), dry_run=args.dry_run)
+    
+    if success and args.dry_run:
+        print("\n🔎 Dry run: the vector database was not changed")
+        return
+    
+    if success and vector_db.version != version:
+        # Cached chatbot answers were generated from the old knowledge base
+        from response_cache import response_cache
+        if response_cache is not None:
+            response_cache.clear()
+            print("🧹 Cleared cached chatbot responses")
     
     if success:
         # Get and display stats
@@ -67,7 +100,7 @@ if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
-        print("\n\n⚠️  Initialization cancelled by user")
+        print("\n\n⚠️  Initialization cancelled by user (run again to resume)")
         sys.exit(1)
     except Exception as e:
         print(f"\n❌ Unexpected error: {e}")
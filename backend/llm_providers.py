@@ -0,0 +1,486 @@
+"""
+Pluggable LLM providers for the chatbot.
+
+Every provider takes OpenAI-style chat messages and returns generated text
+(`complete`) or streams it (`stream`); the retrieve-then-generate flow in
+openai_config.py stays the same whichever one answers. Providers are chosen
+with LLM_PROVIDERS, a comma-separated list in failover order:
+
+    LLM_PROVIDERS=openai            OpenAI only (default)
+    LLM_PROVIDERS=openai,bedrock    OpenAI, falling back to AWS Bedrock
+    LLM_PROVIDERS=fake              local fake provider for offline load tests
+
+ProviderRouter calls them in order and moves on to the next provider when one
+times out, is rate limited or is unavailable. Each provider has a circuit
+breaker: after repeated failures it is skipped for a while instead of making
+every visitor wait for it to fail again. With LLM_HEDGE_AFTER_SECONDS set, a
+request still unanswered after that long is also sent to the next provider
+and whichever answers first wins (list a provider twice to hedge against
+itself).
+"""
+import asyncio
+import os
+import random
+import time
+
+import openai
+
+from openai_client import AsyncOpenAIClient
+
+LLM_PROVIDERS = os.getenv('LLM_PROVIDERS', 'openai')
+# Time a provider gets to answer (to send each chunk, when streaming) before failing over
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '20'))
+# Send a second request to the next provider after this long (0 disables hedging)
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv('LLM_HEDGE_AFTER_SECONDS', '0'))
+# Consecutive failures that open a provider's circuit, and how long it stays open
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30'))
+
+# Fake provider: latency (base plus random jitter), failure rates and seed
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv('FAKE_LLM_LATENCY_SECONDS', '0.5'))
+FAKE_LLM_JITTER_SECONDS = float(os.getenv('FAKE_LLM_JITTER_SECONDS', '0'))
+FAKE_LLM_ERROR_RATE = float(os.getenv('FAKE_LLM_ERROR_RATE', '0'))
+FAKE_LLM_RATE_LIMIT_RATE = float(os.getenv('FAKE_LLM_RATE_LIMIT_RATE', '0'))
+FAKE_LLM_SEED = int(os.getenv('FAKE_LLM_SEED', '0'))
+
+class ProviderError(Exception):
+    """Generation failed; errors with failover=True make the router try the next provider"""
+    failover = False
+
+class ProviderTimeout(ProviderError):
+    failover = True
+
+class ProviderRateLimited(ProviderError):
+    failover = True
+
+class ProviderUnavailable(ProviderError):
+    failover = True
+
+class ProviderAuthError(ProviderError):
+    # A misconfigured provider: another one may still be able to answer
+    failover = True
+
+class LLMProvider:
+    """Interface implemented by every provider"""
+    name = 'provider'
+
+    async def complete(self, messages, max_tokens, temperature, timeout=None):
+        """Generate a reply; returns {"text": ..., "model": ...}"""
+        raise NotImplementedError
+
+    async def stream(self, messages, max_tokens, temperature, timeout=None):
+        """
+        Stream a reply; yields {"text": ..., "model": ...} chunks
+        Providers without streaming send the whole reply as one chunk
+        """
+        yield await self.complete(messages, max_tokens, temperature, timeout)
+
+    async def close(self):
+        pass
+
+def _provider_error(error):
+    """The ProviderError matching an openai.error exception"""
+    if isinstance(error, openai.error.Timeout):
+        return ProviderTimeout(str(error))
+    if isinstance(error, openai.error.RateLimitError):
+        return ProviderRateLimited(str(error))
+    if isinstance(error, (openai.error.AuthenticationError, openai.error.PermissionError)):
+        return ProviderAuthError(str(error))
+    if isinstance(error, openai.error.InvalidRequestError):
+        return ProviderError(str(error))
+    # Connection errors, 5xx, TryAgain
+    return ProviderUnavailable(str(error))
+
+class OpenAIProvider(LLMProvider):
+    name = 'openai'
+
+    def __init__(self, api_key, model):
+        if not api_key or api_key == 'your_openai_api_key_here':
+            print("Warning: OpenAI API key not found or not set in environment variables")
+            print("Please set OPENAI_API_KEY in the .env file")
+        self.model = model
+        # Shared keep-alive pool with a cap on concurrent upstream requests
+        self.client = AsyncOpenAIClient(api_key)
+
+    async def complete(self, messages, max_tokens, temperature, timeout=None):
+        try:
+            response = await self.client.chat_completion(
+                messages, model=self.model, timeout=timeout,
+                max_tokens=max_tokens, temperature=temperature
+            )
+        except openai.error.OpenAIError as e:
+            raise _provider_error(e) from e
+        try:
+            return {
+                "text": response["choices"][0]["message"]["content"].strip(),
+                "model": response["model"]
+            }
+        except (KeyError, IndexError, TypeError, AttributeError) as e:
+            raise ProviderUnavailable(f"Unexpected response from OpenAI: {e!r}") from e
+
+    async def stream(self, messages, max_tokens, temperature, timeout=None):
+        try:
+            async for chunk in self.client.stream_chat_completion(
+                messages, model=self.model, timeout=timeout,
+                max_tokens=max_tokens, temperature=temperature
+            ):
+                choices = chunk.get("choices") or [{}]
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    yield {"text": text, "model": chunk.get("model", self.model)}
+        except openai.error.OpenAIError as e:
+            raise _provider_error(e) from e
+
+    async def close(self):
+        await self.client.close()
+
+class FakeProvider(LLMProvider):
+    """
+    Deterministic stand-in for load-testing the chat path offline
+    Latency and failures are drawn from a seeded generator, so a run is repeatable
+    """
+    name = 'fake'
+
+    def __init__(self, latency=FAKE_LLM_LATENCY_SECONDS, jitter=FAKE_LLM_JITTER_SECONDS,
+                 error_rate=FAKE_LLM_ERROR_RATE, rate_limit_rate=FAKE_LLM_RATE_LIMIT_RATE,
+                 seed=FAKE_LLM_SEED, model='fake-model'):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.model = model
+        self._random = random.Random(seed)
+
+    def _draw(self):
+        """(latency, error to raise or None) for the next request"""
+        latency = self.latency + self._random.uniform(0, self.jitter)
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return latency, ProviderRateLimited("Fake provider rate limit")
+        if roll < self.rate_limit_rate + self.error_rate:
+            return latency, ProviderUnavailable("Fake provider error")
+        return latency, None
+
+    def _reply(self, messages):
+        question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        question = question.rsplit("User Question:", 1)[-1].split("\n")[0].strip()
+        return f"This is a test answer from the fake provider to: {question[:80]}"
+
+    async def complete(self, messages, max_tokens, temperature, timeout=None):
+        latency, error = self._draw()
+        await asyncio.sleep(latency)
+        if error:
+            raise error
+        return {"text": self._reply(messages), "model": self.model}
+
+    async def stream(self, messages, max_tokens, temperature, timeout=None):
+        latency, error = self._draw()
+        words = self._reply(messages).split(' ')
+        # Half the latency before the first token, the rest spread over the others
+        await asyncio.sleep(latency / 2)
+        if error:
+            raise error
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(latency / 2 / len(words))
+            yield {"text": word if i == 0 else ' ' + word, "model": self.model}
+
+class CircuitBreaker:
+    """
+    Closed: requests flow. Open (after `failures` consecutive failures): the
+    provider is skipped for reset_seconds. Half-open: one trial request decides
+    whether it closes again or stays open
+    """
+
+    def __init__(self, failures=LLM_BREAKER_FAILURES, reset_seconds=LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return 'open'
+        return 'half_open'
+
+    def allow(self):
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half_open' and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.trial_in_flight or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None or self.trial_in_flight:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+    def release(self):
+        """A request ended without an outcome (cancelled): free the half-open trial"""
+        self.trial_in_flight = False
+
+class _Route:
+    """A provider with its circuit breaker and counters"""
+
+    def __init__(self, provider, breaker):
+        self.provider = provider
+        self.breaker = breaker
+        self.requests = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+
+class ProviderRouter:
+    def __init__(self, providers, timeout=LLM_TIMEOUT_SECONDS, hedge_after=LLM_HEDGE_AFTER_SECONDS,
+                 breaker_failures=LLM_BREAKER_FAILURES, breaker_reset_seconds=LLM_BREAKER_RESET_SECONDS):
+        if not providers:
+            raise ValueError("At least one LLM provider is required")
+        self.routes = [_Route(provider, CircuitBreaker(breaker_failures, breaker_reset_seconds))
+                       for provider in providers]
+        self.timeout = timeout
+        self.hedge_after = hedge_after or None
+
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.short_circuits = 0
+
+    def _record(self, route, started, error=None):
+        route.requests += 1
+        route.total_seconds += time.monotonic() - started
+        if error is None:
+            route.breaker.record_success()
+        elif error.failover:
+            route.failures += 1
+            route.breaker.record_failure()
+        else:
+            # The request was at fault, not the provider
+            route.breaker.release()
+
+    async def _complete(self, route, messages, max_tokens, temperature, timeout):
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(
+                route.provider.complete(messages, max_tokens, temperature, timeout), timeout
+            )
+        except asyncio.TimeoutError as e:
+            error = ProviderTimeout(f"{route.provider.name} timed out")
+            self._record(route, started, error)
+            raise error from e
+        except ProviderError as e:
+            self._record(route, started, e)
+            raise
+        except asyncio.CancelledError:
+            route.breaker.release()
+            raise
+        except Exception as e:
+            # A provider bug or malformed response still counts against the
+            # provider (and frees a half-open trial)
+            error = ProviderUnavailable(f"{route.provider.name} failed: {e!r}")
+            self._record(route, started, error)
+            raise error from e
+        self._record(route, started)
+        return dict(result, provider=route.provider.name)
+
+    async def _stream(self, route, messages, max_tokens, temperature, timeout):
+        """A provider's stream with timeouts translated and outcomes recorded at the first chunk"""
+        started = time.monotonic()
+        chunks = route.provider.stream(messages, max_tokens, temperature, timeout)
+        first = True
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                except StopAsyncIteration:
+                    if first:
+                        self._record(route, started)
+                    return
+                if first:
+                    first = False
+                    self._record(route, started)
+                yield dict(chunk, provider=route.provider.name)
+        except asyncio.TimeoutError as e:
+            error = ProviderTimeout(f"{route.provider.name} timed out")
+            if first:
+                self._record(route, started, error)
+            raise error from e
+        except ProviderError as e:
+            if first:
+                self._record(route, started, e)
+            raise
+        except Exception as e:
+            error = ProviderUnavailable(f"{route.provider.name} failed: {e!r}")
+            if first:
+                self._record(route, started, error)
+            raise error from e
+        except (asyncio.CancelledError, GeneratorExit):
+            if first:
+                route.breaker.release()
+            raise
+        finally:
+            await chunks.aclose()
+
+    async def _race(self, start, discard=None):
+        """
+        Run start(route) on the providers in order until one succeeds: the next
+        one starts when the current one fails over, or (hedging) when it has not
+        finished within hedge_after. Providers whose circuit is open are
+        skipped. Returns the winner's result and cancels the rest; discard is
+        called with results that lost the race
+        """
+        remaining = list(self.routes)
+        pending = {}
+        hedged = False
+        last_error = None
+
+        def launch():
+            while remaining:
+                route = remaining.pop(0)
+                if route.breaker.allow():
+                    pending[asyncio.ensure_future(start(route))] = route
+                    return route
+                self.short_circuits += 1
+            return None
+
+        first_route = launch()
+        if first_route is None:
+            raise ProviderUnavailable("All LLM providers are unavailable")
+        winner = None
+        try:
+            while pending and winner is None:
+                hedge = self.hedge_after if remaining else None
+                done, _ = await asyncio.wait(pending, timeout=hedge, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if launch():
+                        self.hedges += 1
+                        hedged = True
+                    continue
+                for task in done:
+                    route = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except ProviderError as e:
+                        if not e.failover:
+                            raise
+                        last_error = e
+                        print(f"⚠️  LLM provider {route.provider.name} failed ({type(e).__name__}: {e})")
+                        if launch():
+                            self.failovers += 1
+                        continue
+                    if winner is None:
+                        winner = (route, result)
+                    elif discard:
+                        discard(result)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if winner is None:
+            raise last_error or ProviderUnavailable("All LLM providers are unavailable")
+        route, result = winner
+        if hedged and route is not first_route:
+            self.hedge_wins += 1
+        return result
+
+    async def complete(self, messages, max_tokens, temperature, timeout=None):
+        """Generate a reply with the first provider that manages to; returns {"text", "model", "provider"}"""
+        timeout = timeout or self.timeout
+        return await self._race(
+            lambda route: self._complete(route, messages, max_tokens, temperature, timeout)
+        )
+
+    async def stream(self, messages, max_tokens, temperature, timeout=None):
+        """
+        Stream a reply; yields {"text", "model", "provider"} chunks
+        Failover and hedging apply until the first chunk arrives; after that
+        the reply is committed to the provider that sent it
+        """
+        timeout = timeout or self.timeout
+
+        async def first_chunk(route):
+            chunks = self._stream(route, messages, max_tokens, temperature, timeout)
+            try:
+                return chunks, await chunks.__anext__()
+            except StopAsyncIteration:
+                return chunks, None
+            except BaseException:
+                await chunks.aclose()
+                raise
+
+        chunks, first = await self._race(
+            first_chunk, discard=lambda result: asyncio.ensure_future(result[0].aclose())
+        )
+        try:
+            if first is None:
+                return
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    async def close(self):
+        for route in self.routes:
+            await route.provider.close()
+
+    def stats(self):
+        """Return router and per-provider statistics"""
+        return {
+            "providers": [
+                {
+                    "name": route.provider.name,
+                    "circuit": route.breaker.state,
+                    "requests": route.requests,
+                    "failures": route.failures,
+                    "times_opened": route.breaker.times_opened,
+                    "avg_latency_seconds": round(route.total_seconds / route.requests, 3) if route.requests else 0
+                }
+                for route in self.routes
+            ],
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "short_circuits": self.short_circuits
+        }
+
+def create_provider(name, model):
+    """Instantiate a provider by name ('openai', 'bedrock' or 'fake')"""
+    if name == 'openai':
+        return OpenAIProvider(os.getenv('OPENAI_API_KEY'), model)
+    if name == 'bedrock':
+        # boto3 is only needed when Bedrock is configured
+        from aws_config import bedrock_service
+        return bedrock_service
+    if name == 'fake':
+        return FakeProvider()
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+def create_router(names=LLM_PROVIDERS, model='gpt-3.5-turbo'):
+    """Router over the providers listed in names (comma-separated, failover order)"""
+    providers = []
+    for name in (name.strip().lower() for name in names.split(',')):
+        if not name:
+            continue
+        try:
+            providers.append(create_provider(name, model))
+        except Exception as e:
+            print(f"Warning: LLM provider '{name}' not available: {e}")
+    if not providers:
+        print("Warning: No LLM provider available, falling back to OpenAI")
+        providers.append(OpenAIProvider(os.getenv('OPENAI_API_KEY'), model))
+    print(f"🤖 LLM providers: {', '.join(provider.name for provider in providers)}")
+    return ProviderRouter(providers)
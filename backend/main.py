@@ -1,19 +1,28 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Dict
+from datetime import datetime
+import asyncio
+import json
 import uvicorn
-# from aws_config import bedrock_service  # Commented out - using OpenAI instead
-from openai_config import openai_service
+from openai_config import openai_service, retrieval, retrieval_flights, generation_flights
+from response_cache import response_cache
+from semantic_cache import semantic_cache
 from config import validate_config
-from database import (
-    init_database, 
+from database import init_database, rebuild_agent_queue, revisions, parse_export_time
+from event_hub import event_hub, customer_channel, admin_events, ADMIN_CHANNEL
+from revisions import CUSTOMERS, STATS, AGENT_QUEUE, customer_messages, customer_notes
+from export_data import EXPORTS, EXPORT_FORMATS, MEDIA_TYPES, ExportFormatter
+from async_database import (
     save_customer_info, 
     start_chat_session, 
     save_chat_message,
     update_time_spent,
     get_all_customers,
     get_customer_stats,
+    get_admin_dashboard,
     update_customer_status,
     update_customer_notes,
     get_customer_notes,
@@ -21,13 +30,20 @@ from database import (
     delete_customer,
     get_customer_chat_messages,
     get_agent_queue,
+    expire_agent_requests,
     get_latest_session,
-    mark_agent_requested
+    mark_agent_requested,
+    iterate_batches,
+    run_db,
+    shutdown as shutdown_database_executor
 )
 
 # Initialize database on startup
 init_database()
 
+# Load pending agent requests into the in-memory agent queue
+rebuild_agent_queue()
+
 app = FastAPI(title="DASA Hospitality AI Chatbot API", version="1.0.0")
 
 # Add CORS middleware to allow frontend to connect
@@ -37,8 +53,73 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
 )
 
+@app.on_event("startup")
+async def bind_event_hub():
+    """Deliver events published by database threads on the server's event loop"""
+    event_hub.bind(asyncio.get_running_loop())
+
+@app.on_event("shutdown")
+def shutdown_database():
+    """Drain the database executor and close pooled connections on shutdown"""
+    shutdown_database_executor()
+
+@app.on_event("shutdown")
+async def close_openai_client():
+    """Close the LLM providers' pooled connections and the response cache"""
+    await openai_service.close()
+    if response_cache is not None:
+        response_cache.close()
+
+# Largest page any listing endpoint will return
+MAX_PAGE_SIZE = 500
+
+def validate_page_size(limit):
+    """Reject page sizes outside 1..MAX_PAGE_SIZE (None means unpaged)"""
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag.removeprefix("W/")
+               for candidate in if_none_match.split(","))
+
+async def conditional_get(request, response, *keys):
+    """
+    Set ETag/Last-Modified for a response built from the given revision keys
+    Returns a 304 response when the client's copy is current, otherwise None.
+    The validators are taken before the query runs, so a concurrent write can
+    only make them older than the data (the next request refetches), never newer.
+    """
+    etag, last_modified = await run_db(revisions.validators, *keys, variant=request.url.query)
+    headers = {"ETag": etag, "Last-Modified": last_modified, "Cache-Control": "no-cache"}
+    response.headers.update(headers)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return None
+
+# Seconds between SSE keep-alive comments (also how often a gone client is noticed)
+SSE_KEEPALIVE_SECONDS = 15
+
+def sse_event(data, event_id=None):
+    """Format one Server-Sent Event"""
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+def sse_response(stream):
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Pydantic models
 class ChatMessage(BaseModel):
     message: str
@@ -132,6 +213,48 @@ async def send_chat_message(chat_message: ChatMessage):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/api/chatbot/message/stream")
+async def stream_chat_message(chat_message: ChatMessage):
+    """
+    Send a message to the chatbot and stream the AI response as Server-Sent Events
+    - {"type": "token", "text": ...} for each piece of the response as it is generated
+    - a final {"type": "done", ...} with response, success, context_used,
+      knowledge_base_results and model_used (as returned by /api/chatbot/message)
+    """
+    if not chat_message.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+
+    async def stream():
+        async for event in openai_service.stream_chatbot_response(chat_message.message):
+            yield sse_event(event)
+
+    return sse_response(stream())
+
+@app.get("/api/chatbot/cache")
+async def get_response_cache_stats():
+    """Response cache, semantic cache, request coalescing and retrieval batching metrics"""
+    semantic = {"enabled": semantic_cache is not None}
+    if semantic_cache is not None:
+        semantic["stats"] = semantic_cache.stats()
+    coalescing = {
+        "retrieval": retrieval_flights.stats(),
+        "generation": generation_flights.stats()
+    }
+    pipeline = {
+        "semantic": semantic,
+        "coalescing": coalescing,
+        "retrieval_batching": retrieval.stats() if retrieval is not None else None
+    }
+    if response_cache is None:
+        return {"success": True, "enabled": False, **pipeline}
+    stats = await asyncio.to_thread(response_cache.stats)
+    return {"success": True, "enabled": True, "stats": stats, **pipeline}
+
+@app.get("/api/chatbot/providers")
+async def get_llm_provider_stats():
+    """LLM provider circuit states, failovers and hedged requests"""
+    return {"success": True, "stats": openai_service.router.stats()}
+
 @app.get("/api/chatbot/test")
 async def test_chatbot():
     """Test the chatbot with a sample message"""
@@ -161,7 +284,7 @@ async def save_customer(customer_info: CustomerInfo, request: Request):
             ip_address = request.headers.get("X-Forwarded-For").split(",")[0]
         
         # Save to database
-        customer_id = save_customer_info(
+        customer_id = await save_customer_info(
             name=customer_info.name,
             contact=customer_info.contact,
             source=customer_info.source,
@@ -171,7 +294,7 @@ async def save_customer(customer_info: CustomerInfo, request: Request):
         )
         
         # Start a chat session
-        session_id = start_chat_session(customer_id)
+        session_id = await start_chat_session(customer_id)
         
         return {
             "success": True,
@@ -187,7 +310,7 @@ async def save_customer(customer_info: CustomerInfo, request: Request):
 async def update_customer_time(customer_id: int, time_spent: int):
     """Update time spent on site for a customer"""
     try:
-        update_time_spent(customer_id, time_spent)
+        await update_time_spent(customer_id, time_spent)
         return {
             "success": True,
             "message": "Time spent updated successfully"
@@ -199,7 +322,7 @@ async def update_customer_time(customer_id: int, time_spent: int):
 async def save_message(customer_id: int, session_id: int, message: str, sender: str):
     """Save a chat message"""
     try:
-        save_chat_message(customer_id, session_id, message, sender)
+        await save_chat_message(customer_id, session_id, message, sender)
         return {
             "success": True,
             "message": "Message saved successfully"
@@ -208,10 +331,26 @@ async def save_message(customer_id: int, session_id: int, message: str, sender:
         raise HTTPException(status_code=500, detail=f"Failed to save message: {str(e)}")
 
 @app.get("/api/customers/all")
-async def get_customers():
-    """Get all customers from database"""
+async def get_customers(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = None,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None
+):
+    """
+    Get customers, newest first
+    - limit + before_id: keyset pages (pass back next_cursor as before_id)
+    - after_id: only customers added since the last fetch
+    - no parameters: every customer
+    """
     try:
-        customers = get_all_customers()
+        validate_page_size(limit)
+        not_modified = await conditional_get(request, response, CUSTOMERS)
+        if not_modified:
+            return not_modified
+
+        customers = await get_all_customers(limit=limit, before_id=before_id, after_id=after_id)
         customers_list = []
         
         for customer in customers:
@@ -229,19 +368,31 @@ async def get_customers():
                 "admin_notes": customer[10] if len(customer) > 10 else ""
             })
         
+        # A full page means there may be older customers to fetch
+        next_cursor = None
+        if limit is not None and after_id is None and len(customers_list) == limit:
+            next_cursor = customers_list[-1]["id"]
+        
         return {
             "success": True,
             "count": len(customers_list),
-            "customers": customers_list
+            "customers": customers_list,
+            "next_cursor": next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve customers: {str(e)}")
 
 @app.get("/api/customers/stats")
-async def get_stats():
+async def get_stats(request: Request, response: Response):
     """Get customer statistics"""
     try:
-        stats = get_customer_stats()
+        not_modified = await conditional_get(request, response, STATS)
+        if not_modified:
+            return not_modified
+
+        stats = await get_customer_stats()
         return {
             "success": True,
             "stats": stats
@@ -249,6 +400,47 @@ async def get_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve stats: {str(e)}")
 
+@app.get("/api/admin/dashboard")
+async def get_dashboard(
+    request: Request,
+    response: Response,
+    lead_limit: Optional[int] = None,
+    before_id: Optional[int] = None,
+    priority_limit: int = 100,
+    fields: Optional[str] = None
+):
+    """
+    Stats, a page of leads and the top priority leads in one response
+    - lead_limit + before_id: keyset pages of leads (pass back next_cursor); no limit returns all
+    - fields: comma-separated lead columns to include (e.g. skip admin_notes)
+    """
+    try:
+        validate_page_size(lead_limit)
+        validate_page_size(priority_limit)
+        not_modified = await conditional_get(request, response, CUSTOMERS, STATS)
+        if not_modified:
+            return not_modified
+
+        field_list = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+        try:
+            dashboard = await get_admin_dashboard(
+                lead_limit=lead_limit,
+                before_id=before_id,
+                priority_limit=priority_limit,
+                fields=field_list
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return {
+            "success": True,
+            **dashboard
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve dashboard: {str(e)}")
+
 @app.put("/api/customers/{customer_id}/status")
 async def update_status(customer_id: int, status: str):
     """Update customer status"""
@@ -257,7 +449,7 @@ async def update_status(customer_id: int, status: str):
         if status not in valid_statuses:
             raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {valid_statuses}")
         
-        update_customer_status(customer_id, status)
+        await update_customer_status(customer_id, status)
         return {
             "success": True,
             "message": f"Customer status updated to {status}"
@@ -271,7 +463,7 @@ async def update_status(customer_id: int, status: str):
 async def update_notes(customer_id: int, notes: str):
     """Update customer admin notes"""
     try:
-        update_customer_notes(customer_id, notes)
+        await update_customer_notes(customer_id, notes)
         return {
             "success": True,
             "message": "Notes saved successfully"
@@ -280,10 +472,14 @@ async def update_notes(customer_id: int, notes: str):
         raise HTTPException(status_code=500, detail=f"Failed to update notes: {str(e)}")
 
 @app.get("/api/customers/{customer_id}/notes")
-async def get_notes(customer_id: int):
+async def get_notes(customer_id: int, request: Request, response: Response):
     """Get customer admin notes"""
     try:
-        notes = get_customer_notes(customer_id)
+        not_modified = await conditional_get(request, response, customer_notes(customer_id))
+        if not_modified:
+            return not_modified
+
+        notes = await get_customer_notes(customer_id)
         return {
             "success": True,
             "notes": notes
@@ -292,15 +488,23 @@ async def get_notes(customer_id: int):
         raise HTTPException(status_code=500, detail=f"Failed to retrieve notes: {str(e)}")
 
 @app.get("/api/customers/priority-queue")
-async def get_priority_leads():
-    """Get leads sorted by priority score"""
+async def get_priority_leads(limit: int = 50, offset: int = 0):
+    """Get the top `limit` leads by priority score, starting at `offset`"""
     try:
-        priority_leads = get_priority_queue()
+        validate_page_size(limit)
+        if offset < 0:
+            raise HTTPException(status_code=400, detail="offset must be >= 0")
+        
+        priority_leads = await get_priority_queue(limit=limit, offset=offset)
         return {
             "success": True,
             "count": len(priority_leads),
+            "limit": limit,
+            "offset": offset,
             "leads": priority_leads
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve priority queue: {str(e)}")
 
@@ -308,7 +512,7 @@ async def get_priority_leads():
 async def delete_lead(customer_id: int):
     """Delete a customer/lead and all associated data"""
     try:
-        success = delete_customer(customer_id)
+        success = await delete_customer(customer_id)
         if success:
             return {
                 "success": True,
@@ -322,10 +526,16 @@ async def delete_lead(customer_id: int):
         raise HTTPException(status_code=500, detail=f"Failed to delete customer: {str(e)}")
 
 @app.get("/api/agent/queue")
-async def get_agent_queue_endpoint():
+async def get_agent_queue_endpoint(request: Request, response: Response):
     """Get queue of customers waiting for agent support"""
     try:
-        queue = get_agent_queue()
+        # Expired requests change the queue without a write
+        await expire_agent_requests()
+        not_modified = await conditional_get(request, response, AGENT_QUEUE)
+        if not_modified:
+            return not_modified
+
+        queue = await get_agent_queue()
         return {
             "success": True,
             "count": len(queue),
@@ -335,27 +545,142 @@ async def get_agent_queue_endpoint():
         raise HTTPException(status_code=500, detail=f"Failed to retrieve agent queue: {str(e)}")
 
 @app.get("/api/customers/{customer_id}/messages")
-async def get_customer_messages(customer_id: int):
-    """Get all chat messages for a specific customer"""
+async def get_customer_messages(
+    customer_id: int,
+    request: Request,
+    response: Response,
+    since_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: Optional[int] = None
+):
+    """
+    Get chat messages for a specific customer (chronological)
+    - since_id: only messages newer than the last one the client has seen
+    - before_id + limit: scroll back through older messages
+    - no parameters: the full transcript
+    Messages not written yet (MESSAGE_WRITE_MODE) come last with a null id
+    """
     try:
-        messages = get_customer_chat_messages(customer_id)
+        validate_page_size(limit)
+        not_modified = await conditional_get(request, response, customer_messages(customer_id))
+        if not_modified:
+            return not_modified
+
+        messages = await get_customer_chat_messages(
+            customer_id,
+            since_id=since_id,
+            before_id=before_id,
+            limit=limit
+        )
+        
+        # Cursor for the next since_id poll: the newest written message
+        # (buffered ones have no id yet); unchanged when nothing is new
+        last_id = next((m["id"] for m in reversed(messages) if m["id"] is not None), since_id)
+        
         return {
             "success": True,
             "count": len(messages),
-            "messages": messages
+            "messages": messages,
+            "last_id": last_id,
+            "has_more": limit is not None and len(messages) == limit
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve messages: {str(e)}")
 
+@app.get("/api/customers/{customer_id}/events")
+async def customer_events(customer_id: int, request: Request, since_id: Optional[int] = None):
+    """
+    Server-Sent Events stream of a customer's chat messages as they are saved
+    - since_id: first replay the messages after this id (omit to only get new ones)
+    - on reconnect the browser's Last-Event-ID header takes precedence over since_id
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since_id = int(last_event_id)
+
+    async def stream():
+        # Subscribe before reading the backlog so nothing falls in between
+        subscription = event_hub.subscribe(customer_channel(customer_id))
+        try:
+            yield "retry: 3000\n\n"
+
+            replayed = set()
+            if since_id is not None:
+                # Buffered messages arrive as live events once written
+                for message in await get_customer_chat_messages(customer_id, since_id=since_id, include_pending=False):
+                    replayed.add(message["id"])
+                    yield sse_event(message, message["id"])
+
+            while not subscription.closed:
+                message = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if message is None:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                elif message["id"] not in replayed:
+                    yield sse_event(message, message["id"])
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return sse_response(stream())
+
+@app.get("/api/admin/events")
+async def admin_event_stream(request: Request, last_event_id: Optional[str] = None):
+    """
+    Server-Sent Events stream of lead and agent queue changes for the consoles
+    - event types: lead_created, status_changed, notes_changed, lead_deleted,
+      agent_requested, queue_entered, queue_left
+    - resume with last_event_id (or the browser's Last-Event-ID header); when
+      the missed events are no longer available a `reset` event is sent and
+      the client should reload its data
+    """
+    resume_id = request.headers.get("last-event-id") or last_event_id
+
+    async def stream():
+        subscription = event_hub.subscribe(ADMIN_CHANNEL)
+        try:
+            yield "retry: 3000\n\n"
+
+            # Events up to this sequence were replayed (or predate the client)
+            replayed_up_to = None
+            if resume_id:
+                backlog = admin_events.since(resume_id)
+                if backlog is None:
+                    last_id = admin_events.last_id()
+                    yield sse_event({"id": last_id, "type": "reset", "data": None}, last_id)
+                    replayed_up_to = int(last_id.rsplit("-", 1)[1])
+                else:
+                    replayed_up_to = int(resume_id.rsplit("-", 1)[1])
+                    for event in backlog:
+                        replayed_up_to = event["sequence"]
+                        yield sse_event(event, event["id"])
+
+            while not subscription.closed:
+                event = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if event is None:
+                    if await request.is_disconnected():
+                        break
+                    # Requests past their TTL leave the queue lazily; make it visible
+                    await expire_agent_requests()
+                    yield ": keep-alive\n\n"
+                elif replayed_up_to is None or event["sequence"] > replayed_up_to:
+                    yield sse_event(event, event["id"])
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return sse_response(stream())
+
 @app.post("/api/agent/send-message")
 async def send_agent_message(customer_id: int, message: str):
     """Send a message from agent to customer (handles session automatically)"""
     try:
         # Get or create session
-        session_id = get_latest_session(customer_id)
+        session_id = await get_latest_session(customer_id)
         
         # Save message
-        save_chat_message(customer_id, session_id, message, 'agent')
+        await save_chat_message(customer_id, session_id, message, 'agent')
         
         return {
             "success": True,
@@ -369,7 +694,7 @@ async def send_agent_message(customer_id: int, message: str):
 async def request_agent(customer_id: int, session_id: Optional[int] = None):
     """Mark that a customer has requested an agent"""
     try:
-        result = mark_agent_requested(customer_id, session_id)
+        result = await mark_agent_requested(customer_id, session_id)
         if result:
             return {
                 "success": True,
@@ -382,5 +707,57 @@ async def request_agent(customer_id: int, session_id: Optional[int] = None):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to mark agent request: {str(e)}")
 
+def validate_export_params(export_format, start, end):
+    """Reject unknown export formats and unparseable date filters"""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {list(EXPORT_FORMATS)}")
+    for name, value in (("start", start), ("end", end)):
+        if value is not None:
+            try:
+                parse_export_time(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"{name} must be a date (YYYY-MM-DD) or ISO 8601 date-time")
+
+def export_response(kind, export_format, **filters):
+    """Stream an export batch by batch without loading it into memory"""
+    iterate, columns = EXPORTS[kind]
+    formatter = ExportFormatter(export_format, columns)
+
+    async def body():
+        yield formatter.header()
+        async for rows in iterate_batches(iterate(**filters)):
+            yield formatter.format(rows)
+
+    filename = f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/export/leads")
+async def export_leads(
+    format: str = "ndjson",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    status: Optional[str] = None,
+    source: Optional[str] = None
+):
+    """Export leads as NDJSON or CSV (start/end filter on created_at, end exclusive)"""
+    validate_export_params(format, start, end)
+    return export_response("leads", format, start=start, end=end, status=status, source=source)
+
+@app.get("/api/export/transcripts")
+async def export_transcripts(
+    format: str = "ndjson",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    status: Optional[str] = None,
+    source: Optional[str] = None
+):
+    """Export chat messages as NDJSON or CSV (start/end filter on the message timestamp)"""
+    validate_export_params(format, start, end)
+    return export_response("transcripts", format, start=start, end=end, status=status, source=source)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=5005)
@@ -0,0 +1,249 @@
+"""
+Versioned schema migrations for the customer database.
+
+Each migration has a version number and is applied exactly once, inside its
+own transaction; applied versions are recorded in the schema_migrations table.
+To change the schema, append a new migration to MIGRATIONS - never edit one
+that has already shipped.
+"""
+from datetime import datetime
+
+from customer_stats import create_stats_schema, drop_stats_schema, rebuild_stats
+from revisions import create_revisions_schema, drop_orphaned_revisions
+
+def _column_names(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [column[1] for column in cursor.fetchall()]
+
+def _create_base_tables(cursor):
+    # Create customers table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            contact TEXT NOT NULL,
+            source TEXT NOT NULL,
+            ip_address TEXT,
+            device_type TEXT,
+            browser TEXT,
+            operating_system TEXT,
+            time_spent_seconds INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'new',
+            admin_notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create chat_sessions table to track interactions
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER,
+            session_start TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            session_end TIMESTAMP,
+            total_messages INTEGER DEFAULT 0,
+            agent_requested BOOLEAN DEFAULT 0,
+            agent_requested_at TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers (id)
+        )
+    ''')
+
+    # Create chat_messages table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER,
+            session_id INTEGER,
+            message_text TEXT,
+            sender TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers (id),
+            FOREIGN KEY (session_id) REFERENCES chat_sessions (id)
+        )
+    ''')
+
+def _add_agent_requested_at(cursor):
+    # Databases created before agent requests were timestamped
+    if 'agent_requested_at' not in _column_names(cursor, 'chat_sessions'):
+        cursor.execute('ALTER TABLE chat_sessions ADD COLUMN agent_requested_at TIMESTAMP')
+
+def _add_status_and_notes(cursor):
+    # Databases created before the admin dashboard (formerly migrate_database.py)
+    columns = _column_names(cursor, 'customers')
+    if 'status' not in columns:
+        cursor.execute("ALTER TABLE customers ADD COLUMN status TEXT DEFAULT 'new'")
+    if 'admin_notes' not in columns:
+        cursor.execute('ALTER TABLE customers ADD COLUMN admin_notes TEXT')
+    cursor.execute("UPDATE customers SET status = 'new' WHERE status IS NULL")
+
+def _add_hot_path_indexes(cursor):
+    # get_customer_chat_messages: WHERE customer_id = ? ORDER BY timestamp
+    # (also serves the EXISTS probe in get_agent_queue)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_customer_timestamp
+        ON chat_messages (customer_id, timestamp)
+    ''')
+
+    # get_latest_session: covering, the rowid (session id) is part of every index
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_sessions_customer_open
+        ON chat_sessions (customer_id, session_end, session_start)
+    ''')
+
+    # get_agent_queue: only open sessions with a pending agent request
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_sessions_agent_queue
+        ON chat_sessions (agent_requested_at, customer_id)
+        WHERE agent_requested = 1 AND session_end IS NULL
+    ''')
+
+    # get_all_customers: ORDER BY created_at DESC
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_customers_created_at
+        ON customers (created_at)
+    ''')
+
+    # get_priority_queue: WHERE status != 'closed' ORDER BY created_at DESC
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_customers_open_created_at
+        ON customers (created_at)
+        WHERE status != 'closed'
+    ''')
+
+def _add_priority_score(cursor):
+    # Persisted lead score, kept current by the database.py write paths.
+    # calc_priority_score() is registered on every pooled connection.
+    if 'priority_score' not in _column_names(cursor, 'customers'):
+        cursor.execute('ALTER TABLE customers ADD COLUMN priority_score REAL NOT NULL DEFAULT 0')
+    cursor.execute('UPDATE customers SET priority_score = calc_priority_score(time_spent_seconds, source)')
+
+    # Top-K priority queue straight from the index, ties newest first
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_customers_open_priority
+        ON customers (priority_score DESC, created_at DESC)
+        WHERE status != 'closed'
+    ''')
+    cursor.execute('DROP INDEX IF EXISTS idx_customers_open_created_at')
+
+def _add_keyset_indexes(cursor):
+    # Messages are now read in id order with keyset cursors
+    # (WHERE customer_id = ? AND id > ?), which the timestamp index cannot serve
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_customer_id
+        ON chat_messages (customer_id, id)
+    ''')
+    cursor.execute('DROP INDEX IF EXISTS idx_chat_messages_customer_timestamp')
+
+    # Customer listings page on the rowid, the created_at index is unused
+    cursor.execute('DROP INDEX IF EXISTS idx_customers_created_at')
+
+def _add_customer_stats(cursor):
+    # Trigger-maintained dashboard counters, seeded from the existing rows
+    create_stats_schema(cursor)
+    rebuild_stats(cursor)
+
+def _add_data_revisions(cursor):
+    # ETag revisions shared by every server worker and the CLI tools
+    create_revisions_schema(cursor)
+
+def _settle_hot_path_indexes(cursor):
+    # Converge on the final index set whatever mix of the index migrations a
+    # database went through (versions 4-7 were briefly renumbered, so some
+    # databases skipped the keyset index); a no-op on the others
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_customer_id
+        ON chat_messages (customer_id, id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_sessions_customer_open
+        ON chat_sessions (customer_id, session_end, session_start)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_sessions_agent_queue
+        ON chat_sessions (agent_requested_at, customer_id)
+        WHERE agent_requested = 1 AND session_end IS NULL
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_customers_open_priority
+        ON customers (priority_score DESC, created_at DESC)
+        WHERE status != 'closed'
+    ''')
+    for index in ('idx_chat_messages_customer_timestamp', 'idx_customers_created_at',
+                  'idx_customers_open_created_at'):
+        cursor.execute(f'DROP INDEX IF EXISTS {index}')
+
+def _add_stats_null_key(cursor):
+    # Counters tables created before NULL and '' breakdown values were
+    # counted apart: recreate them (and their triggers) and recount
+    if 'is_null' not in _column_names(cursor, 'customer_stats'):
+        drop_stats_schema(cursor)
+        create_stats_schema(cursor)
+        rebuild_stats(cursor)
+
+def _drop_orphaned_revisions(cursor):
+    # Revisions left behind by customers deleted before delete_customer forgot them
+    drop_orphaned_revisions(cursor)
+
+# (version, description, function taking a cursor) - append only
+MIGRATIONS = [
+    (1, "Create base tables", _create_base_tables),
+    (2, "Add chat_sessions.agent_requested_at", _add_agent_requested_at),
+    (3, "Add customers.status and customers.admin_notes", _add_status_and_notes),
+    (4, "Add indexes for hot query paths", _add_hot_path_indexes),
+    (5, "Add indexed customers.priority_score", _add_priority_score),
+    (6, "Index chat messages for keyset pagination", _add_keyset_indexes),
+    (7, "Add trigger-maintained customer_stats counters", _add_customer_stats),
+    (8, "Add data_revisions for conditional GET", _add_data_revisions),
+    (9, "Settle the hot-path indexes", _settle_hot_path_indexes),
+    (10, "Count NULL customer_stats breakdown values apart from ''", _add_stats_null_key),
+    (11, "Drop revisions of deleted customers", _drop_orphaned_revisions),
+]
+
+def _ensure_migrations_table(conn):
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP NOT NULL
+            )
+        ''')
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for a fresh database)"""
+    _ensure_migrations_table(conn)
+    row = conn.execute('SELECT MAX(version) FROM schema_migrations').fetchone()
+    return row[0] or 0
+
+def run_migrations(conn, verbose=True):
+    """Apply all pending migrations in order; returns the list of applied versions"""
+    _ensure_migrations_table(conn)
+    applied = []
+
+    for version, description, migrate in MIGRATIONS:
+        # BEGIN IMMEDIATE takes the write lock up front, so two processes
+        # starting at once cannot both apply the same migration
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,))
+            if cursor.fetchone():
+                conn.rollback()
+                continue
+
+            migrate(cursor)
+            cursor.execute('''
+                INSERT INTO schema_migrations (version, description, applied_at)
+                VALUES (?, ?, ?)
+            ''', (version, description, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        applied.append(version)
+        if verbose:
+            print(f"Applied migration {version}: {description}")
+
+    return applied
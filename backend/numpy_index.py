@@ -0,0 +1,245 @@
+"""
+In-process NumPy vector index (VECTOR_DB_BACKEND=numpy).
+
+The knowledge base is a few dozen chunks, small enough that brute force beats
+an ANN index: all normalized chunk embeddings live in one contiguous float32
+matrix and a search is one matrix-vector product plus argpartition (a batch
+of searches is one matrix-matrix product). NumpyCollection implements the
+subset of the Chroma collection API that VectorDatabase uses, so either
+backend can sit behind it.
+
+Distances are squared L2 between unit vectors (2 - 2 * cosine), the same
+numbers Chroma's default "l2" space returns for the normalized default
+embeddings, so both backends rank and score results alike.
+
+Each collection is saved to a single <name>.npz file, written to a temporary
+file and renamed into place. Writes are kept in memory until flush() (or
+modify()), so bulk loading costs one save rather than one per batch. Rows
+are appended into a matrix with spare capacity and readers hold a snapshot
+of the first rows, so searches never see a half-updated index.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+# Rows allocated the first time a collection grows
+INITIAL_CAPACITY = 64
+
+class _Snapshot:
+    """
+    Index contents as seen by readers: the first count entries of ids,
+    documents and metadatas, and the rows of embeddings. Writers only append
+    past count or replace the lists, so a snapshot never changes under a reader
+    """
+
+    def __init__(self, ids, embeddings, documents, metadatas, positions):
+        self.count = len(embeddings)
+        self.ids = ids
+        self.embeddings = embeddings
+        self.documents = documents
+        self.metadatas = metadatas
+        self.positions = positions
+
+    def position(self, doc_id):
+        i = self.positions.get(doc_id)
+        return i if i is not None and i < self.count else None
+
+def _normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return np.ascontiguousarray(vectors / norms)
+
+class NumpyCollection:
+    def __init__(self, name, persist_directory, embedding_function, metadata=None):
+        self.name = name
+        self.embedding_function = embedding_function
+        self.path = self.path_for(name, persist_directory) if persist_directory else None
+        self.metadata = metadata
+        self._write_lock = threading.Lock()
+        self._reset([], np.zeros((0, 0), dtype=np.float32), [], [])
+        self._dirty = False
+
+        if self.path and os.path.exists(self.path):
+            self._load()
+
+    @staticmethod
+    def path_for(name, persist_directory):
+        """File a collection is saved to"""
+        return os.path.join(persist_directory, f'{name}.npz')
+
+    def _reset(self, ids, matrix, documents, metadatas):
+        """Replace the contents (the lists are owned by the collection from now on)"""
+        self._ids = ids
+        self._matrix = matrix
+        self._documents = documents
+        self._metadatas = metadatas
+        self._positions = {doc_id: i for i, doc_id in enumerate(ids)}
+        self._count = len(ids)
+        self._publish()
+
+    def _publish(self):
+        self._snapshot = _Snapshot(self._ids, self._matrix[:self._count], self._documents,
+                                   self._metadatas, self._positions)
+
+    def _load(self):
+        with np.load(self.path, allow_pickle=False) as data:
+            state = json.loads(str(data['state']))
+            embeddings = np.ascontiguousarray(data['embeddings'], dtype=np.float32)
+        self.metadata = state['metadata'] or self.metadata
+        self._reset(state['ids'], embeddings, state['documents'], state['metadatas'])
+
+    def _save(self, snapshot):
+        if not self.path:
+            return
+        state = json.dumps({
+            'metadata': self.metadata,
+            'ids': snapshot.ids[:snapshot.count],
+            'documents': snapshot.documents[:snapshot.count],
+            'metadatas': snapshot.metadatas[:snapshot.count]
+        })
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, embeddings=snapshot.embeddings, state=np.array(state))
+        os.replace(temp_path, self.path)
+
+    def flush(self):
+        """Save writes made since the last save"""
+        with self._write_lock:
+            if self._dirty:
+                self._save(self._snapshot)
+                self._dirty = False
+
+    def _reserve(self, rows, dim):
+        """Make room for rows more rows, growing the matrix geometrically"""
+        needed = self._count + rows
+        if self._matrix.shape[1] != dim and self._count == 0:
+            self._matrix = np.zeros((0, dim), dtype=np.float32)
+        if needed <= len(self._matrix):
+            return
+        grown = np.empty((max(needed, 2 * len(self._matrix), INITIAL_CAPACITY), dim), dtype=np.float32)
+        grown[:self._count] = self._matrix[:self._count]
+        self._matrix = grown
+
+    def count(self):
+        return self._snapshot.count
+
+    def get(self, ids=None, include=('documents', 'metadatas')):
+        """Stored entries (all, or those in ids) as a Chroma-style result"""
+        snapshot = self._snapshot
+        if ids is None:
+            rows = range(snapshot.count)
+        else:
+            rows = [i for i in map(snapshot.position, ids) if i is not None]
+        result = {'ids': [snapshot.ids[i] for i in rows]}
+        if 'documents' in include:
+            result['documents'] = [snapshot.documents[i] for i in rows]
+        if 'metadatas' in include:
+            result['metadatas'] = [snapshot.metadatas[i] for i in rows]
+        if 'embeddings' in include:
+            result['embeddings'] = [snapshot.embeddings[i].tolist() for i in rows]
+        return result
+
+    def upsert(self, ids, documents, metadatas=None, embeddings=None):
+        """Add entries, replacing any with the same id (saved on flush)"""
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        vectors = _normalize_rows(embeddings)
+        metadatas = metadatas or [{} for _ in ids]
+
+        with self._write_lock:
+            appended = []
+            replaced = []
+            for doc_id, document, metadata, vector in zip(ids, documents, metadatas, vectors):
+                i = self._positions.get(doc_id)
+                if i is None:
+                    self._positions[doc_id] = self._count + len(appended)
+                    appended.append((doc_id, document, metadata, vector))
+                elif i >= self._count:
+                    appended[i - self._count] = (doc_id, document, metadata, vector)
+                else:
+                    replaced.append((i, document, metadata, vector))
+
+            if replaced:
+                # Published rows are shared with readers: copy before changing them
+                self._documents = list(self._documents)
+                self._metadatas = list(self._metadatas)
+                self._matrix = self._matrix.copy()
+                for i, document, metadata, vector in replaced:
+                    self._documents[i], self._metadatas[i], self._matrix[i] = document, metadata, vector
+
+            if appended:
+                self._reserve(len(appended), vectors.shape[1])
+                start = self._count
+                for j, (doc_id, document, metadata, vector) in enumerate(appended):
+                    self._ids.append(doc_id)
+                    self._documents.append(document)
+                    self._metadatas.append(metadata)
+                    self._matrix[start + j] = vector
+                self._count += len(appended)
+
+            self._dirty = True
+            self._publish()
+
+    add = upsert
+
+    def delete(self, ids):
+        with self._write_lock:
+            removed = set(ids)
+            keep = [i for i in range(self._count) if self._ids[i] not in removed]
+            self._reset(
+                [self._ids[i] for i in keep],
+                np.ascontiguousarray(self._matrix[keep]) if keep else np.zeros((0, 0), dtype=np.float32),
+                [self._documents[i] for i in keep],
+                [self._metadatas[i] for i in keep]
+            )
+            self._dirty = True
+
+    def modify(self, name=None, metadata=None):
+        """Rename the collection and/or replace its metadata; saves all writes"""
+        with self._write_lock:
+            if metadata is not None:
+                self.metadata = metadata
+            old_path = self.path
+            if name is not None and name != self.name:
+                self.name = name
+                self.path = self.path_for(name, os.path.dirname(old_path)) if old_path else None
+            self._save(self._snapshot)
+            self._dirty = False
+            if old_path and old_path != self.path and os.path.exists(old_path):
+                os.remove(old_path)
+
+    def query(self, query_embeddings=None, query_texts=None, n_results=10):
+        """
+        Top n_results entries for each query, nearest first, as a Chroma-style
+        result: lists of ids, documents, metadatas and distances per query
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        snapshot = self._snapshot
+        queries = _normalize_rows(query_embeddings)
+        k = min(n_results, snapshot.count)
+
+        result = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        if k == 0:
+            for key in result:
+                result[key] = [[] for _ in range(len(queries))]
+            return result
+
+        # One matrix product scores every query against every chunk
+        similarities = queries @ snapshot.embeddings.T
+        if k < similarities.shape[1]:
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(similarities.shape[1]), (len(queries), 1))
+        for q, candidates in enumerate(top):
+            order = candidates[np.argsort(-similarities[q, candidates], kind='stable')]
+            result['ids'].append([snapshot.ids[i] for i in order])
+            result['documents'].append([snapshot.documents[i] for i in order])
+            result['metadatas'].append([snapshot.metadatas[i] for i in order])
+            result['distances'].append([max(float(2 - 2 * similarities[q, i]), 0.0) for i in order])
+        return result
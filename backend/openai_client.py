@@ -0,0 +1,207 @@
+"""
+Non-blocking OpenAI chat completions client.
+
+Talks to the Chat Completions REST API over one shared aiohttp session, so
+keep-alive connections are reused across requests and the event loop is
+never blocked while waiting on the model. A semaphore caps the number of
+concurrent upstream requests; callers beyond the cap wait their turn.
+
+HTTP errors are raised as the matching openai.error exceptions, so callers
+handle them exactly as they did with openai.ChatCompletion.create.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+import aiohttp
+import openai
+
+OPENAI_API_BASE = os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
+
+# Concurrent requests to OpenAI from this process; extra callers queue
+OPENAI_MAX_CONCURRENCY = int(os.getenv('OPENAI_MAX_CONCURRENCY', '16'))
+# Kept-alive connections in the pool (defaults to the concurrency cap)
+OPENAI_POOL_SIZE = int(os.getenv('OPENAI_POOL_SIZE', str(OPENAI_MAX_CONCURRENCY)))
+# Whole-request and connect timeouts, in seconds
+OPENAI_TIMEOUT_SECONDS = float(os.getenv('OPENAI_TIMEOUT_SECONDS', '30'))
+OPENAI_CONNECT_TIMEOUT_SECONDS = float(os.getenv('OPENAI_CONNECT_TIMEOUT_SECONDS', '5'))
+
+# HTTP status -> openai.error exception
+ERRORS_BY_STATUS = {
+    400: openai.error.InvalidRequestError,
+    401: openai.error.AuthenticationError,
+    403: openai.error.PermissionError,
+    404: openai.error.InvalidRequestError,
+    409: openai.error.TryAgain,
+    429: openai.error.RateLimitError,
+    503: openai.error.ServiceUnavailableError,
+}
+
+def _raise_for_response(status, body, headers):
+    """Raise the openai.error exception matching an error response"""
+    try:
+        json_body = json.loads(body)
+        error = json_body.get('error') or {}
+    except ValueError:
+        json_body, error = None, {}
+    message = error.get('message') or f"OpenAI request failed with HTTP {status}"
+
+    error_class = ERRORS_BY_STATUS.get(status, openai.error.APIError)
+    if error_class is openai.error.InvalidRequestError:
+        raise error_class(message, error.get('param'), code=error.get('code'),
+                          http_body=body, http_status=status, json_body=json_body, headers=headers)
+    raise error_class(message, http_body=body, http_status=status, json_body=json_body,
+                      headers=headers, code=error.get('code'))
+
+class AsyncOpenAIClient:
+    def __init__(self, api_key, api_base=OPENAI_API_BASE, max_concurrency=OPENAI_MAX_CONCURRENCY,
+                 pool_size=OPENAI_POOL_SIZE, timeout=OPENAI_TIMEOUT_SECONDS,
+                 connect_timeout=OPENAI_CONNECT_TIMEOUT_SECONDS):
+        self.api_key = api_key
+        self.api_base = api_base.rstrip('/')
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+
+        # Created on first use, on the loop that serves requests
+        self._session = None
+        self._semaphore = None
+        self._loop = None
+
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.total_seconds = 0.0
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+                headers={'Authorization': f'Bearer {self.api_key}'},
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout)
+            )
+        return self._session
+
+    @contextlib.asynccontextmanager
+    async def _slot(self):
+        """Hold one of the max_concurrency request slots"""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            # Also when the caller is cancelled while still queued
+            self.waiting -= 1
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+    def _timeout(self, timeout):
+        if timeout is None:
+            return None
+        return aiohttp.ClientTimeout(total=timeout, connect=min(timeout, self.connect_timeout))
+
+    async def chat_completion(self, messages, model='gpt-3.5-turbo', timeout=None, **params):
+        """
+        Create a chat completion; returns the parsed JSON response
+        timeout overrides the client's whole-request timeout for this call
+        """
+        session = self._get_session()
+        payload = dict(params, model=model, messages=messages)
+
+        async with self._slot():
+            self.in_flight += 1
+            self.requests += 1
+            started = time.monotonic()
+            try:
+                async with session.post(f'{self.api_base}/chat/completions', json=payload,
+                                        timeout=self._timeout(timeout)) as response:
+                    body = await response.text()
+                    if response.status != 200:
+                        _raise_for_response(response.status, body, dict(response.headers))
+                    return json.loads(body)
+            except ValueError as e:
+                self.errors += 1
+                raise openai.error.APIError(f"Invalid response from OpenAI: {e}") from e
+            except asyncio.TimeoutError as e:
+                self.errors += 1
+                raise openai.error.Timeout("Request to OpenAI timed out") from e
+            except aiohttp.ClientError as e:
+                self.errors += 1
+                raise openai.error.APIConnectionError(f"Error communicating with OpenAI: {e}") from e
+            except openai.error.OpenAIError:
+                self.errors += 1
+                raise
+            finally:
+                self.in_flight -= 1
+                self.total_seconds += time.monotonic() - started
+
+    async def stream_chat_completion(self, messages, model='gpt-3.5-turbo', timeout=None, **params):
+        """
+        Create a streamed chat completion; yields the parsed chunks as they arrive
+        timeout bounds the wait for each chunk rather than the whole stream
+        """
+        session = self._get_session()
+        payload = dict(params, model=model, messages=messages, stream=True)
+        read_timeout = self.timeout if timeout is None else timeout
+
+        async with self._slot():
+            self.in_flight += 1
+            self.requests += 1
+            started = time.monotonic()
+            try:
+                async with session.post(
+                    f'{self.api_base}/chat/completions',
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(total=None, connect=self.connect_timeout, sock_read=read_timeout)
+                ) as response:
+                    if response.status != 200:
+                        _raise_for_response(response.status, await response.text(), dict(response.headers))
+
+                    # Server-sent events: "data: {chunk}" lines, ending with "data: [DONE]"
+                    async for line in response.content:
+                        line = line.decode('utf-8').strip()
+                        if not line.startswith('data:'):
+                            continue
+                        data = line[len('data:'):].strip()
+                        if data == '[DONE]':
+                            return
+                        yield json.loads(data)
+            except ValueError as e:
+                self.errors += 1
+                raise openai.error.APIError(f"Invalid response from OpenAI: {e}") from e
+            except asyncio.TimeoutError as e:
+                self.errors += 1
+                raise openai.error.Timeout("Request to OpenAI timed out") from e
+            except aiohttp.ClientError as e:
+                self.errors += 1
+                raise openai.error.APIConnectionError(f"Error communicating with OpenAI: {e}") from e
+            except openai.error.OpenAIError:
+                self.errors += 1
+                raise
+            finally:
+                self.in_flight -= 1
+                self.total_seconds += time.monotonic() - started
+
+    async def close(self):
+        """Close the pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def stats(self):
+        """Return client statistics"""
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "avg_latency_seconds": round(self.total_seconds / self.requests, 3) if self.requests else 0
+        }
@@ -1,14 +1,22 @@
+import asyncio
+import hashlib
 import os
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator
 from dotenv import load_dotenv
 from pathlib import Path
-import openai
 
 # Load environment variables from .env file
 backend_dir = Path(__file__).parent
 env_path = backend_dir / '.env'
 load_dotenv(env_path)
 
+from llm_providers import (create_router, FakeProvider, LLM_PROVIDERS,
+                           ProviderTimeout, ProviderRateLimited, ProviderAuthError)
+from response_cache import response_cache, make_key, normalize_query
+from semantic_cache import semantic_cache
+from singleflight import SingleFlight
+from retrieval import RetrievalService
+
 # Import vector database (lazy import to avoid circular dependencies)
 try:
     from vector_db import vector_db
@@ -18,42 +26,20 @@ except Exception as e:
     VECTOR_DB_AVAILABLE = False
     vector_db = None
 
-class OpenAIService:
-    def __init__(self):
-        """Initialize OpenAI service with API key"""
-        self.api_key = os.getenv('OPENAI_API_KEY')
-        
-        if not self.api_key or self.api_key == 'your_openai_api_key_here':
-            print("Warning: OpenAI API key not found or not set in environment variables")
-            print("Please set OPENAI_API_KEY in the .env file")
-        else:
-            openai.api_key = self.api_key
-    
-    async def get_chatbot_response(self, query: str, use_rag: bool = True) -> Dict[str, Any]:
-        """
-        Generate a response using OpenAI GPT model with RAG (Retrieval-Augmented Generation)
-        """
-        try:
-            # Step 1: Search for relevant context from vector database
-            context_parts = []
-            kb_results_count = 0
-            
-            if use_rag and VECTOR_DB_AVAILABLE and vector_db:
-                try:
-                    search_results = vector_db.search(query, n_results=3)
-                    kb_results_count = len(search_results)
-                    
-                    if search_results:
-                        for result in search_results:
-                            context_parts.append(result['content'])
-                except Exception as e:
-                    print(f"Warning: Vector DB search failed: {e}")
-            
-            # Step 2: Build context string
-            context = "\n\n".join(context_parts) if context_parts else ""
-            
-            # Step 3: System message defining the AI agent's role
-            system_message = """You are the DASA Hospitality AI agent - a helpful AI assistant for DASA Hospitality.
+# Embeddings and searches run batched on their own worker pool
+retrieval = RetrievalService(vector_db) if vector_db is not None else None
+
+# Cached answers depend on the knowledge base: drop them when it is reloaded
+if response_cache is not None and vector_db is not None:
+    vector_db.add_reload_listener(response_cache.clear)
+if semantic_cache is not None and vector_db is not None:
+    vector_db.add_reload_listener(semantic_cache.clear)
+
+# Chat model (you can change to "gpt-4" if you have access)
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+
+# System message defining the AI agent's role
+SYSTEM_MESSAGE = """You are the DASA Hospitality AI agent - a helpful AI assistant for DASA Hospitality.
 
 IMPORTANT RULES:
 - You represent DASA Hospitality Pvt. Ltd., a leading hotel revenue management and marketing company
@@ -76,70 +62,266 @@ RESPONSE RULES:
 - Be direct and informative
 - Use context provided to give accurate answers
 - Professional and conversational tone"""
-            
-            # Step 4: Build user message with context
-            if context:
-                user_message = f"""Based on the following information about DASA Hospitality:
+
+# Generation settings; part of PROMPT_VERSION so changing them invalidates cached answers
+MAX_TOKENS = 200
+TEMPERATURE = 0.7
+# Answers cached with one set of providers are not served after switching to another
+PROMPT_VERSION = OPENAI_MODEL + ':' + hashlib.sha256(
+    f"{SYSTEM_MESSAGE}|{MAX_TOKENS}|{TEMPERATURE}|{LLM_PROVIDERS.replace(' ', '').lower()}".encode('utf-8')
+).hexdigest()[:12]
+
+# How long one visitor waits for an answer (for a streamed answer: for each event)
+CHATBOT_TIMEOUT_SECONDS = float(os.getenv('CHATBOT_TIMEOUT_SECONDS', '45'))
+
+# Identical questions asked at the same time share one search / one completion
+retrieval_flights = SingleFlight('retrieval')
+generation_flights = SingleFlight('generation')
+
+class OpenAIService:
+    """
+    The chatbot flow: retrieve knowledge base context, then generate an answer
+    with the LLM providers configured in LLM_PROVIDERS (see llm_providers.py)
+    """
+    
+    def __init__(self):
+        """Initialize the LLM providers"""
+        self.router = create_router(model=OPENAI_MODEL)
+
+    async def close(self):
+        """Close the providers' pooled HTTP connections and the retrieval workers"""
+        await self.router.close()
+        if retrieval is not None:
+            retrieval.close()
+    
+    async def _semantic_lookup(self, query: str, use_rag: bool = True):
+        """
+        Embed the query and look for a paraphrase answered before
+        Returns (query embedding or None, cached result or None)
+        """
+        if not (use_rag and VECTOR_DB_AVAILABLE and retrieval):
+            return None, None
+        try:
+            # Embedding the query is CPU work, batched off the event loop
+            embedding = await retrieval.embed(query)
+        except Exception as e:
+            print(f"Warning: Query embedding failed: {e}")
+            return None, None
+        
+        if semantic_cache is None:
+            return embedding, None
+        cached, similarity = semantic_cache.get(embedding, PROMPT_VERSION)
+        if cached:
+            print(f"🧠 Semantic cache hit (similarity {similarity:.3f})")
+        return embedding, cached
+    
+    @staticmethod
+    def _cacheable(result: Dict[str, Any]) -> bool:
+        """Only real answers are cached: never errors or fake provider (load test) replies"""
+        return result.get("success") and result.get("provider") != FakeProvider.name
+    
+    def _store_semantic(self, embedding, result: Dict[str, Any]):
+        if semantic_cache is None or embedding is None or not self._cacheable(result):
+            return
+        semantic_cache.set(embedding, PROMPT_VERSION, result)
+    
+    async def _build_messages(self, query: str, use_rag: bool = True, query_embedding=None, timeout=None):
+        """
+        Build the chat messages for a query, with knowledge base context when available
+        query_embedding (from _semantic_lookup) saves embedding the query twice
+        Returns (messages, context, knowledge_base_results)
+        """
+        # Step 1: Search for relevant context from vector database
+        context_parts = []
+        kb_results_count = 0
+        
+        if use_rag and VECTOR_DB_AVAILABLE and retrieval:
+            try:
+                search_results = await retrieval_flights.do(
+                    normalize_query(query),
+                    lambda: retrieval.search(query, n_results=3, query_embedding=query_embedding),
+                    timeout
+                )
+                kb_results_count = len(search_results)
+                
+                if search_results:
+                    for result in search_results:
+                        context_parts.append(result['content'])
+            except Exception as e:
+                print(f"Warning: Vector DB search failed: {e}")
+        
+        # Step 2: Build context string
+        context = "\n\n".join(context_parts) if context_parts else ""
+        
+        # Step 3: Build user message with context
+        if context:
+            user_message = f"""Based on the following information about DASA Hospitality:
 
 {context}
 
 User Question: {query}
 
 Please provide a helpful and accurate response based on the context above."""
-            else:
-                user_message = query
+        else:
+            user_message = query
+        
+        messages = [
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": user_message}
+        ]
+        return messages, context, kb_results_count
+    
+    @staticmethod
+    def _error_result(error: Exception) -> Dict[str, Any]:
+        """The response returned to the visitor when generation fails"""
+        if isinstance(error, (asyncio.TimeoutError, ProviderTimeout)):
+            print("Chatbot response timed out")
+            response, detail = "I apologize, but this is taking longer than expected. Please try again in a moment.", "Timed out"
+        elif isinstance(error, ProviderAuthError):
+            print("LLM Authentication Error: Invalid credentials")
+            response, detail = "I apologize, but the AI service is not properly configured. Please contact support.", "Authentication failed"
+        elif isinstance(error, ProviderRateLimited):
+            print("LLM Rate Limit Error: Too many requests")
+            response, detail = "I apologize, but the service is currently experiencing high demand. Please try again in a moment.", "Rate limit exceeded"
+        else:
+            print(f"Error generating response: {error}")
+            response, detail = "I apologize, but I'm having trouble processing your request right now. Please try again later.", str(error)
+        
+        return {
+            "success": False,
+            "response": response,
+            "error": detail,
+            "context_used": False,
+            "knowledge_base_results": 0,
+            "model_used": "unknown"
+        }
+    
+    async def _cached_response(self, cache_key: str):
+        """Return the cached result for a key from make_key, or None"""
+        if response_cache is None:
+            return None
+        # The persistent tier is SQLite, keep it off the event loop
+        return await asyncio.to_thread(response_cache.get, cache_key)
+    
+    async def _store_response(self, cache_key: str, result: Dict[str, Any]):
+        if response_cache is None or not self._cacheable(result):
+            return
+        try:
+            await asyncio.to_thread(response_cache.set, cache_key, result)
+        except Exception as e:
+            print(f"Warning: Failed to cache response: {e}")
+    
+    async def _generate(self, messages, context: str, kb_results_count: int, cache_key: str, embedding) -> Dict[str, Any]:
+        """One completion request; the result is cached for every caller sharing it"""
+        response = await self.router.complete(messages, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+        
+        result = {
+            "success": True,
+            "response": response["text"],
+            "context_used": bool(context),
+            "knowledge_base_results": kb_results_count,
+            "model_used": response["model"],
+            "provider": response["provider"]
+        }
+        await self._store_response(cache_key, result)
+        self._store_semantic(embedding, result)
+        return result
+    
+    async def _generate_stream(self, messages, context: str, kb_results_count: int, cache_key: str, embedding):
+        """One streamed completion request; yields token events, then the done event"""
+        parts = []
+        model_used = OPENAI_MODEL
+        provider = None
+        async for chunk in self.router.stream(messages, max_tokens=MAX_TOKENS, temperature=TEMPERATURE):
+            model_used = chunk["model"]
+            provider = chunk["provider"]
+            parts.append(chunk["text"])
+            yield {"type": "token", "text": chunk["text"]}
+        
+        result = {
+            "success": True,
+            "response": "".join(parts).strip(),
+            "context_used": bool(context),
+            "knowledge_base_results": kb_results_count,
+            "model_used": model_used,
+            "provider": provider
+        }
+        await self._store_response(cache_key, result)
+        self._store_semantic(embedding, result)
+        yield dict(result, type="done", cached=False, cache_tier=None)
+    
+    async def get_chatbot_response(self, query: str, use_rag: bool = True,
+                                   timeout: float = CHATBOT_TIMEOUT_SECONDS) -> Dict[str, Any]:
+        """
+        Generate a response with RAG (Retrieval-Augmented Generation)
+        Paraphrases of answered questions are served from the semantic cache and
+        repeated questions with the same context from the response cache; identical
+        questions in flight at the same time share one search and one completion
+        cached says whether the answer was reused, cache_tier where it came from:
+        "exact" (response cache), "semantic" (semantic cache) or None
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            embedding, cached = await self._semantic_lookup(query, use_rag)
+            if cached:
+                return dict(cached, cached=True, cache_tier="semantic")
+            
+            messages, context, kb_results_count = await self._build_messages(
+                query, use_rag, embedding, timeout=max(deadline - loop.time(), 0)
+            )
             
-            # Step 5: Make API call to OpenAI
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",  # You can change to "gpt-4" if you have access
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ],
-                max_tokens=200,
-                temperature=0.7
+            cache_key = make_key(query, context, PROMPT_VERSION)
+            cached = await self._cached_response(cache_key)
+            if cached:
+                self._store_semantic(embedding, cached)
+                return dict(cached, cached=True, cache_tier="exact")
+            
+            result = await generation_flights.do(
+                cache_key,
+                lambda: self._generate(messages, context, kb_results_count, cache_key, embedding),
+                max(deadline - loop.time(), 0)
             )
+            return dict(result, cached=False, cache_tier=None)
+            
+        except Exception as e:
+            return self._error_result(e)
+    
+    async def stream_chatbot_response(self, query: str, use_rag: bool = True,
+                                      timeout: float = CHATBOT_TIMEOUT_SECONDS) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a response as it is generated
+        Yields {"type": "token", "text": ...} events, then one {"type": "done", ...}
+        event carrying the full response and the same fields as get_chatbot_response
+        (a cached answer arrives as a single token event). A visitor asking a
+        question that is already being answered joins that stream.
+        """
+        try:
+            embedding, cached = await self._semantic_lookup(query, use_rag)
+            if cached:
+                yield {"type": "token", "text": cached["response"]}
+                yield dict(cached, type="done", cached=True, cache_tier="semantic")
+                return
+            
+            messages, context, kb_results_count = await self._build_messages(query, use_rag, embedding, timeout)
             
-            generated_text = response.choices[0].message.content.strip()
+            cache_key = make_key(query, context, PROMPT_VERSION)
+            cached = await self._cached_response(cache_key)
+            if cached:
+                self._store_semantic(embedding, cached)
+                yield {"type": "token", "text": cached["response"]}
+                yield dict(cached, type="done", cached=True, cache_tier="exact")
+                return
             
-            return {
-                "success": True,
-                "response": generated_text,
-                "context_used": bool(context),
-                "knowledge_base_results": kb_results_count,
-                "model_used": response.model
-            }
+            async for event in generation_flights.stream(
+                cache_key,
+                lambda: self._generate_stream(messages, context, kb_results_count, cache_key, embedding),
+                timeout
+            ):
+                yield event
             
-        except openai.error.AuthenticationError:
-            print("OpenAI Authentication Error: Invalid API key")
-            return {
-                "success": False,
-                "response": "I apologize, but the AI service is not properly configured. Please contact support.",
-                "error": "Authentication failed",
-                "context_used": False,
-                "knowledge_base_results": 0,
-                "model_used": "unknown"
-            }
-        except openai.error.RateLimitError:
-            print("OpenAI Rate Limit Error: Too many requests")
-            return {
-                "success": False,
-                "response": "I apologize, but the service is currently experiencing high demand. Please try again in a moment.",
-                "error": "Rate limit exceeded",
-                "context_used": False,
-                "knowledge_base_results": 0,
-                "model_used": "unknown"
-            }
         except Exception as e:
-            print(f"Error generating response with OpenAI: {e}")
-            return {
-                "success": False,
-                "response": "I apologize, but I'm having trouble processing your request right now. Please try again later.",
-                "error": str(e),
-                "context_used": False,
-                "knowledge_base_results": 0,
-                "model_used": "unknown"
-            }
+            yield dict(self._error_result(e), type="done")
 
 # Global instance
 openai_service = OpenAIService()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Rebuild Customer Stats
+Recomputes the customer_stats counters from the customers table and reports
+any drift between the incrementally maintained values and a full recount
+"""
+import sys
+
+from database import init_database, rebuild_customer_stats
+
+def find_drift(counters, recount):
+    """Return the stats keys whose counter value differs from the recount"""
+    drift = []
+    for key, expected in recount.items():
+        actual = counters.get(key)
+        if key == 'avg_time_spent' and None not in (actual, expected):
+            if round(actual, 6) != round(expected, 6):
+                drift.append(key)
+        elif actual != expected:
+            drift.append(key)
+    return drift
+
+def main():
+    init_database()
+
+    counters, recount = rebuild_customer_stats()
+    drift = find_drift(counters, recount)
+
+    if drift:
+        print("WARNING: counters had drifted from a full recount:")
+        for key in drift:
+            print(f"  {key}: counters={counters.get(key)} recount={recount[key]}")
+        print("\nCounters rebuilt from scratch")
+        sys.exit(1)
+
+    print(f"OK: counters match a full recount ({recount['total_customers']} customers)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Exact-match cache for chatbot answers.
+
+Answers are keyed on the normalized question, a hash of the knowledge base
+context retrieved for it and the model/prompt version, so a changed prompt,
+model or knowledge base never serves a stale answer. Entries live in an
+in-memory LRU tier backed by a SQLite tier (its own database file) that
+survives restarts; both expire entries after a TTL.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from db_pool import ConnectionPool
+
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '1000'))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', str(24 * 3600)))
+# Empty disables the persistent tier
+RESPONSE_CACHE_DB = os.getenv(
+    'RESPONSE_CACHE_DB',
+    os.path.join(os.path.dirname(__file__), 'response_cache.db')
+)
+
+def normalize_query(query):
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a question"""
+    query = re.sub(r'\s+', ' ', query.strip().lower())
+    return query.rstrip(' ?!.')
+
+def make_key(query, context, model_version):
+    """Cache key for a question, the context retrieved for it and the model/prompt version"""
+    context_hash = hashlib.sha256(context.encode('utf-8')).hexdigest()
+    raw = '\x00'.join((normalize_query(query), context_hash, model_version))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS, db_path=RESPONSE_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+
+        # key -> (expires_at, value), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.pool = None
+        if db_path:
+            self.pool = ConnectionPool(db_path)
+            with self.pool.connection() as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS response_cache (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    ) WITHOUT ROWID
+                ''')
+
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _remember(self, key, expires_at, value):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key):
+        """Return the cached answer for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+
+        if self.pool:
+            row = self.pool.connection().execute(
+                'SELECT value, expires_at FROM response_cache WHERE key = ? AND expires_at > ?',
+                (key, now)
+            ).fetchone()
+            if row:
+                value = json.loads(row[0])
+                self._remember(key, row[1], value)
+                self.persistent_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """Cache an answer (a JSON-serializable dict)"""
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, value)
+        self.stores += 1
+
+        if self.pool:
+            with self.pool.connection() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(value), expires_at)
+                )
+                # Keep the file bounded: every so often drop what has expired
+                if self.stores % 100 == 0:
+                    conn.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time(),))
+
+    def clear(self, *_):
+        """Drop every cached answer (e.g. after a knowledge base reload)"""
+        with self._lock:
+            self._entries.clear()
+        if self.pool:
+            with self.pool.connection() as conn:
+                conn.execute('DELETE FROM response_cache')
+        self.invalidations += 1
+
+    def close(self):
+        if self.pool:
+            self.pool.close_all()
+
+    def stats(self):
+        """Return cache statistics"""
+        with self._lock:
+            memory_entries = len(self._entries)
+        persistent_entries = None
+        if self.pool:
+            persistent_entries = self.pool.connection().execute(
+                'SELECT COUNT(*) FROM response_cache'
+            ).fetchone()[0]
+
+        hits = self.memory_hits + self.persistent_hits
+        lookups = hits + self.misses
+        return {
+            "memory_entries": memory_entries,
+            "persistent_entries": persistent_entries,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+# Global cache instance (None when disabled)
+response_cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
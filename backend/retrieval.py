@@ -0,0 +1,135 @@
+"""
+Off-loop, micro-batched knowledge base retrieval.
+
+Embedding a query is CPU work (an ONNX model run) and the Chroma query is a
+blocking call, so neither may run on the event loop. Requests are collected
+for a few milliseconds (or until a batch is full) and handed to a dedicated
+worker pool as one batch: the model embeds the whole batch in one pass, which
+costs little more than embedding a single query, and one multi-query
+`collection.query` answers every search in it. Each caller gets its own
+results back.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads running embedding and search batches
+RETRIEVAL_WORKERS = int(os.getenv('RETRIEVAL_WORKERS', '2'))
+# How long a request waits for others to share its batch, and the largest batch
+RETRIEVAL_BATCH_WINDOW_MS = float(os.getenv('RETRIEVAL_BATCH_WINDOW_MS', '5'))
+RETRIEVAL_MAX_BATCH = int(os.getenv('RETRIEVAL_MAX_BATCH', '32'))
+
+class MicroBatcher:
+    """
+    Collects items submitted close together and runs function(items) on an
+    executor once per batch; function returns one result per item
+    """
+
+    def __init__(self, name, function, executor, window_seconds, max_batch):
+        self.name = name
+        self.function = function
+        self.executor = executor
+        self.window = window_seconds
+        self.max_batch = max_batch
+
+        # (item, future) waiting for the next batch
+        self._pending = []
+        self._timer = None
+
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def submit(self, item):
+        """Add an item to the next batch and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Callers that gave up (timeout, disconnect) are left out of the batch
+        batch = [(item, future) for item, future in self._pending if not future.done()]
+        self._pending = []
+        if not batch:
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        loop = asyncio.get_running_loop()
+        work = loop.run_in_executor(self.executor, self.function, [item for item, _ in batch])
+        work.add_done_callback(lambda done: self._resolve(batch, done))
+
+    @staticmethod
+    def _resolve(batch, done):
+        error = done.exception()
+        results = None if error else done.result()
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(results[i])
+
+    def stats(self):
+        """Return batching statistics"""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            "largest_batch": self.largest_batch,
+            "pending": len(self._pending)
+        }
+
+class RetrievalService:
+    def __init__(self, vector_db, workers=RETRIEVAL_WORKERS,
+                 window_ms=RETRIEVAL_BATCH_WINDOW_MS, max_batch=RETRIEVAL_MAX_BATCH):
+        self.vector_db = vector_db
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='retrieval')
+        self.embed_batcher = MicroBatcher('embed', vector_db.embed, self.executor,
+                                          window_ms / 1000, max_batch)
+        self.search_batcher = MicroBatcher('search', self._search_batch, self.executor,
+                                           window_ms / 1000, max_batch)
+
+    def _search_batch(self, requests):
+        """requests: (query, n_results, query_embedding or None) tuples"""
+        n_results = max(n for _, n, _ in requests)
+        results = self.vector_db.search_batch(
+            [query for query, _, _ in requests],
+            n_results,
+            [embedding for _, _, embedding in requests]
+        )
+        return [found[:n] for found, (_, n, _) in zip(results, requests)]
+
+    async def embed(self, query):
+        """Embedding of a query"""
+        return await self.embed_batcher.submit(query)
+
+    async def search(self, query, n_results=3, query_embedding=None):
+        """Knowledge base search results for a query (see VectorDatabase.search)"""
+        return await self.search_batcher.submit((query, n_results, query_embedding))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    def stats(self):
+        """Return batching statistics"""
+        embedding_cache = self.vector_db.embedding_cache
+        return {
+            "workers": self.workers,
+            "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+            "embed": self.embed_batcher.stats(),
+            "search": self.search_batcher.stats()
+        }
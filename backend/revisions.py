@@ -0,0 +1,117 @@
+"""
+Revision counters for conditional GET (ETag / Last-Modified).
+
+The database.py write paths bump the revision of every resource they change:
+one per collection (customer list, stats, agent queue) and one per customer
+(transcript, notes). Read endpoints turn the current revision into an ETag and
+can answer a matching If-None-Match with 304 before running their query.
+
+Revisions live in the data_revisions table and are bumped in the same
+transaction as the write they describe, so every server worker and the CLI
+tools (rebuild_stats.py, migrate_database.py) share them. ETags include the
+revision of the DATABASE scope, set once when the table is created, so a
+recreated database never reuses an old ETag.
+
+A deleted customer's revisions are forgotten with it. Customer ids are never
+reused, so revision 0 then only ever describes the (empty) deleted resources.
+"""
+import time
+import zlib
+from email.utils import formatdate
+
+CUSTOMERS = 'customers'
+STATS = 'stats'
+AGENT_QUEUE = 'agent_queue'
+DATABASE = 'database'
+
+def customer_messages(customer_id):
+    return f'messages:{customer_id}'
+
+def customer_notes(customer_id):
+    return f'notes:{customer_id}'
+
+def drop_orphaned_revisions(cursor):
+    """Drop per-customer revisions of customers that no longer exist"""
+    cursor.execute('''
+        DELETE FROM data_revisions
+        WHERE (scope LIKE 'messages:%' OR scope LIKE 'notes:%')
+          AND CAST(substr(scope, instr(scope, ':') + 1) AS INTEGER) NOT IN (SELECT id FROM customers)
+    ''')
+
+def create_revisions_schema(cursor):
+    """Create the revisions table and stamp the database with its creation time"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_revisions (
+            scope TEXT PRIMARY KEY,
+            revision INTEGER NOT NULL,
+            modified_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    now = time.time()
+    cursor.execute('''
+        INSERT OR IGNORE INTO data_revisions (scope, revision, modified_at)
+        VALUES (?, ?, ?)
+    ''', (DATABASE, int(now * 1000), now))
+
+class RevisionTracker:
+    def __init__(self, connection):
+        # Returns the calling thread's SQLite connection
+        self.connection = connection
+
+    def bump(self, *keys, conn=None):
+        """
+        Record a change to the given resources
+        Pass the writer's connection to bump inside its open transaction;
+        without one the bump is committed on its own
+        """
+        now = time.time()
+        params = [(key, now) for key in keys]
+        sql = '''
+            INSERT INTO data_revisions (scope, revision, modified_at)
+            VALUES (?, 1, ?)
+            ON CONFLICT (scope) DO UPDATE SET
+                revision = revision + 1,
+                modified_at = excluded.modified_at
+        '''
+        if conn is not None:
+            conn.executemany(sql, params)
+            return
+        conn = self.connection()
+        with conn:
+            conn.executemany(sql, params)
+
+    def forget(self, *keys, conn=None):
+        """Drop the revisions of resources that no longer exist (see bump for conn)"""
+        sql = 'DELETE FROM data_revisions WHERE scope = ?'
+        params = [(key,) for key in keys]
+        if conn is not None:
+            conn.executemany(sql, params)
+            return
+        conn = self.connection()
+        with conn:
+            conn.executemany(sql, params)
+
+    def get(self, *keys):
+        """{key: (revision, modified_at)}; revision 0 for resources never changed"""
+        placeholders = ', '.join('?' for _ in keys)
+        rows = self.connection().execute(
+            f'SELECT scope, revision, modified_at FROM data_revisions WHERE scope IN ({placeholders})',
+            keys
+        ).fetchall()
+        found = {scope: (revision, modified_at) for scope, revision, modified_at in rows}
+        created = found.get(DATABASE, (0, 0))[1]
+        return {key: found.get(key, (0, created)) for key in keys}
+
+    def validators(self, *keys, variant=''):
+        """
+        ETag and Last-Modified header values for a response built from keys
+        variant distinguishes representations of the same resources (e.g. the query string)
+        """
+        revisions = self.get(DATABASE, *keys)
+        epoch = format(revisions[DATABASE][0], 'x')
+        tag = '.'.join(str(revisions[key][0]) for key in keys)
+        if variant:
+            # crc32 rather than hash(): the tag must be the same in every worker
+            tag += f'-{format(zlib.crc32(variant.encode("utf-8")), "x")}'
+        modified_at = max(modified_at for _, modified_at in revisions.values())
+        return f'W/"{epoch}-{tag}"', formatdate(modified_at, usegmt=True)
@@ -0,0 +1,133 @@
+"""
+Semantic cache for chatbot answers.
+
+Paraphrased questions ("what do you offer" / "which services do you provide")
+miss the exact-match response cache. This cache keeps the embeddings of
+recently answered questions in a fixed-size matrix and serves a cached answer
+when a new question's embedding is close enough (cosine similarity at or
+above the threshold). Full at max_entries, it replaces the least recently
+used entry.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() == 'true'
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+SEMANTIC_CACHE_SIZE = int(os.getenv('SEMANTIC_CACHE_SIZE', '500'))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv('SEMANTIC_CACHE_TTL_SECONDS', str(24 * 3600)))
+
+class SemanticCache:
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_SIZE,
+                 ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+
+        # Unit-length embeddings, one row per slot (allocated on first store)
+        self._matrix = None
+        self._size = 0
+        # Per slot: value, code of the version it was generated under, expiry, last use
+        self._values = [None] * max_entries
+        self._versions = np.full(max_entries, -1)
+        self._version_codes = {}
+        self._expires_at = np.zeros(max_entries)
+        self._last_used = np.zeros(max_entries)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding, version):
+        """
+        Return (cached value, similarity) for the closest question answered
+        under the same version, or (None, best similarity) below the threshold
+        """
+        query = self._normalize(embedding)
+        now = time.time()
+
+        with self._lock:
+            if self._size == 0:
+                self.misses += 1
+                return None, 0.0
+
+            similarities = self._matrix[:self._size] @ query
+            # Expired entries and those from another prompt/model version never match
+            usable = (self._expires_at[:self._size] > now) & \
+                     (self._versions[:self._size] == self._version_codes.get(version, -2))
+            similarities = np.where(usable, similarities, -1.0)
+
+            slot = int(np.argmax(similarities))
+            similarity = float(similarities[slot])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None, max(similarity, 0.0)
+
+            self._last_used[slot] = now
+            self.hits += 1
+            return self._values[slot], similarity
+
+    def set(self, embedding, version, value):
+        """Remember the answer to a question, evicting the least recently used entry when full"""
+        vector = self._normalize(embedding)
+        now = time.time()
+
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                # Prefer an expired slot, otherwise the least recently used one
+                expired = np.flatnonzero(self._expires_at <= now)
+                slot = int(expired[0]) if len(expired) else int(np.argmin(self._last_used))
+                self.evictions += 1
+
+            self._matrix[slot] = vector
+            self._values[slot] = value
+            self._versions[slot] = self._version_codes.setdefault(version, len(self._version_codes))
+            self._expires_at[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self.stores += 1
+
+    def clear(self, *_):
+        """Drop every entry (e.g. after a knowledge base reload)"""
+        with self._lock:
+            self._size = 0
+            self._values = [None] * self.max_entries
+            self._versions[:] = -1
+            self._expires_at[:] = 0
+            self._last_used[:] = 0
+            self.invalidations += 1
+
+    def stats(self):
+        """Return cache statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._size,
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+# Global cache instance (None when disabled)
+semantic_cache = SemanticCache() if SEMANTIC_CACHE_ENABLED else None
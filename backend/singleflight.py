@@ -0,0 +1,119 @@
+"""
+In-flight request coalescing ("singleflight") for the chatbot pipeline.
+
+Concurrent callers asking for the same key share one upstream call: the first
+caller starts it as a task, later callers wait on that task instead of
+starting their own. Waiters are shielded from each other, so one caller timing
+out or disconnecting never cancels the call the others are waiting on; the
+shared call runs to completion (and fills the caches) even if every caller
+has gone.
+
+Streams are shared the same way: events are recorded as they arrive, and a
+caller joining mid-stream replays what it missed before following live.
+"""
+import asyncio
+
+class _SharedStream:
+    """Events of one shared stream, kept for callers that join late"""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Event()
+
+    def _notify(self):
+        # Wake current waiters; the next wait gets a fresh event
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def run(self, factory):
+        try:
+            async for event in factory():
+                self.events.append(event)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        # key -> asyncio.Task (calls) / (task, _SharedStream) (streams)
+        self._calls = {}
+        self._streams = {}
+
+        self.calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def _call_finished(self, key, task):
+        self._calls.pop(key, None)
+        # Retrieve the error so a call every caller gave up on is not
+        # logged as "Task exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, function, timeout=None):
+        """
+        Return the result of function() (a coroutine function), sharing it with
+        concurrent callers of the same key
+        timeout bounds this caller's wait only (asyncio.TimeoutError when exceeded)
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(function())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._call_finished(key, done))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    async def stream(self, key, factory, timeout=None):
+        """
+        Yield the events of factory() (an async generator function), sharing
+        them with concurrent callers of the same key
+        timeout bounds this caller's wait for each event (asyncio.TimeoutError when exceeded)
+        """
+        flight = self._streams.get(key)
+        if flight is None:
+            shared = _SharedStream()
+            task = asyncio.ensure_future(shared.run(factory))
+            self._streams[key] = (task, shared)
+            task.add_done_callback(lambda _: self._streams.pop(key, None))
+            self.calls += 1
+        else:
+            _, shared = flight
+            self.coalesced += 1
+
+        position = 0
+        while True:
+            while position < len(shared.events):
+                yield shared.events[position]
+                position += 1
+            if shared.done:
+                if shared.error is not None:
+                    raise shared.error
+                return
+            try:
+                await asyncio.wait_for(shared.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+
+    def stats(self):
+        """Return coalescing statistics"""
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts
+        }
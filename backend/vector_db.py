@@ -1,61 +1,173 @@
 import os
+import hashlib
+import json
+import threading
+import time
 import chromadb
 from chromadb.config import Settings
+from chromadb.utils import embedding_functions
+from embedding_cache import EmbeddingCache, EMBEDDING_CACHE_ENABLED, normalize_text
+from numpy_index import NumpyCollection
+from chunking import page_chunks
 from pathlib import Path
-from typing import List, Dict, Any
-import re
+from typing import Callable, Iterable, List, Dict, Any
+
+# "chroma" (ChromaDB PersistentClient) or "numpy" (in-process matrix, see numpy_index.py)
+VECTOR_DB_BACKEND = os.getenv('VECTOR_DB_BACKEND', 'chroma').lower()
+
+COLLECTION_NAME = "dasa_hospitality_kb"
+COLLECTION_METADATA = {"description": "DASA Hospitality Knowledge Base"}
+
+# Names the collection searches use; reindexing builds a new collection and swaps this
+ACTIVE_COLLECTION_FILE = "active_collection.json"
+# How often a running server checks whether another process swapped in a new index
+VECTOR_DB_CHECK_SECONDS = float(os.getenv('VECTOR_DB_CHECK_SECONDS', '2'))
+# Collection a build is written to before it is swapped in; an interrupted
+# build is resumed from it on the next run
+STAGING_COLLECTION = f"{COLLECTION_NAME}_staging"
+# Chunks embedded and written per call when building a collection
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '256'))
+# How often a build's staged chunks are saved (NumPy keeps writes in memory until then)
+INGEST_CHECKPOINT_SECONDS = float(os.getenv('INGEST_CHECKPOINT_SECONDS', '60'))
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _position(metadata):
+    """Where a chunk sits in its source: a new chunk in the place of a removed one is an update"""
+    return (metadata.get("source"), metadata.get("page"), metadata.get("chunk_id"))
 
 class VectorDatabase:
-    def __init__(self, persist_directory: str = "./chroma_db"):
-        """Initialize ChromaDB vector database"""
+    def __init__(self, persist_directory: str = "./chroma_db", backend: str = VECTOR_DB_BACKEND):
+        """Initialize the vector database with the ChromaDB or NumPy backend"""
+        if backend not in ('chroma', 'numpy'):
+            raise ValueError(f"Unknown vector database backend: {backend}")
         self.persist_directory = persist_directory
+        self.backend = backend
         
         # Create the directory if it doesn't exist
         Path(persist_directory).mkdir(parents=True, exist_ok=True)
         
+        # Chroma's default model, held explicitly so queries can be embedded once
+        # and the vectors reused (e.g. by the semantic answer cache)
+        self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        self.embedding_model_id = getattr(self.embedding_function, 'MODEL_NAME', type(self.embedding_function).__name__)
+        # Repeated queries reuse their embedding instead of running the model again
+        self.embedding_cache = EmbeddingCache() if EMBEDDING_CACHE_ENABLED else None
+        
         # Initialize ChromaDB client with persistence
-        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.client = chromadb.PersistentClient(path=persist_directory) if backend == 'chroma' else None
         
-        # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name="dasa_hospitality_kb",
-            metadata={"description": "DASA Hospitality Knowledge Base"}
-        )
+        # Open the active collection
+        self._pointer_path = os.path.join(persist_directory, ACTIVE_COLLECTION_FILE)
+        self._pointer_mtime = self._pointer_stat()
+        self._checked_at = time.monotonic()
+        self._swap_lock = threading.Lock()
+        self.collection_name = self._read_pointer()["active"]
+        self.collection = self._open_collection(self.collection_name)
+        
+        # Identifies the loaded knowledge base content; changes on every reload
+        self.version = (self.collection.metadata or {}).get("kb_version", "initial")
+        self._reload_listeners = []
+        # Counts from the last load_knowledge_base (add / update / remove / unchanged)
+        self.last_reindex = None
         
-        print(f"✅ Vector database initialized at: {persist_directory}")
+        print(f"✅ Vector database ({backend}) initialized at: {persist_directory}")
         print(f"📊 Current documents in collection: {self.collection.count()}")
     
-    def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-        """Split text into overlapping chunks"""
-        # Split by double newlines (paragraphs) first
-        paragraphs = text.split('\n\n')
-        
-        chunks = []
-        current_chunk = ""
-        
-        for para in paragraphs:
-            para = para.strip()
-            if not para:
-                continue
-            
-            # If adding this paragraph exceeds chunk size and current_chunk is not empty
-            if len(current_chunk) + len(para) > chunk_size and current_chunk:
-                chunks.append(current_chunk.strip())
-                # Start new chunk with overlap (last few words of previous chunk)
-                words = current_chunk.split()
-                overlap_text = ' '.join(words[-overlap:]) if len(words) > overlap else current_chunk
-                current_chunk = overlap_text + ' ' + para
-            else:
-                current_chunk += ('\n\n' if current_chunk else '') + para
-        
-        # Add the last chunk
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-        
-        return chunks
-    
-    def load_knowledge_base(self, file_path: str):
-        """Load and process knowledge base from text file"""
+    def add_reload_listener(self, listener):
+        """Call listener(version) after every successful knowledge base reload"""
+        self._reload_listeners.append(listener)
+    
+    def _open_collection(self, name: str, metadata: Dict[str, Any] = None):
+        """
+        Open (creating if needed) a collection on the configured backend
+        metadata is only given when creating; an existing collection keeps its own
+        """
+        if self.backend == 'numpy':
+            return NumpyCollection(name, self.persist_directory, self.embedding_function, metadata=metadata)
+        return self.client.get_or_create_collection(
+            name=name,
+            metadata=metadata,
+            embedding_function=self.embedding_function
+        )
+    
+    def _drop_collection(self, name: str):
+        if self.backend == 'numpy':
+            path = NumpyCollection.path_for(name, self.persist_directory)
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            try:
+                self.client.delete_collection(name)
+            except ValueError:
+                pass  # Already gone
+    
+    def _pointer_stat(self):
+        try:
+            return os.stat(self._pointer_path).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _read_pointer(self) -> Dict[str, Any]:
+        """{"active": collection searches use, "previous": the one it replaced}"""
+        try:
+            with open(self._pointer_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Databases built before reindexing was incremental
+            return {"active": COLLECTION_NAME, "previous": None}
+    
+    def _write_pointer(self, pointer: Dict[str, Any]):
+        temp_path = self._pointer_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(pointer, f)
+        os.replace(temp_path, self._pointer_path)
+    
+    def _activate(self, name: str, collection):
+        """Point searches at a collection and notify reload listeners if its version changed"""
+        self.collection_name = name
+        self.collection = collection
+        version = (collection.metadata or {}).get("kb_version", "initial")
+        if version == self.version:
+            return
+        self.version = version
+        for listener in self._reload_listeners:
+            try:
+                listener(self.version)
+            except Exception as e:
+                print(f"⚠️  Knowledge base reload listener failed: {e}")
+    
+    def _refresh_collection(self):
+        """Pick up a collection swapped in by another process (e.g. init_vector_db.py)"""
+        now = time.monotonic()
+        if now - self._checked_at < VECTOR_DB_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        mtime = self._pointer_stat()
+        if mtime == self._pointer_mtime:
+            return
+        with self._swap_lock:
+            if mtime == self._pointer_mtime:
+                return
+            self._pointer_mtime = mtime
+            name = self._read_pointer()["active"]
+            if name != self.collection_name:
+                print(f"🔄 Switching to reindexed knowledge base: {name}")
+                self._activate(name, self._open_collection(name))
+    
+    def load_knowledge_base(self, file_path: str, dry_run: bool = False):
+        """
+        Load and process knowledge base from text file
+        Only new or changed chunks are embedded (see reindex); dry_run just reports the changes
+        """
         print(f"\n📖 Loading knowledge base from: {file_path}")
         
         if not os.path.exists(file_path):
@@ -63,103 +175,249 @@ class VectorDatabase:
             return False
         
         try:
-            # Read the file
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            print(f"✅ Reading {os.path.getsize(file_path)} bytes")
             
-            print(f"✅ File loaded successfully. Total characters: {len(content)}")
-            
-            # Split content by pages
-            pages = re.split(r'Page: (.*?)\n', content)
-            
-            documents = []
-            metadatas = []
-            ids = []
-            
-            doc_id = 0
-            
-            # Process each page
-            i = 1  # Start from 1 to skip the header
-            while i < len(pages):
-                page_title = pages[i].strip() if i < len(pages) else "Unknown"
-                page_content = pages[i + 1].strip() if i + 1 < len(pages) else ""
-                
-                if page_content:
-                    # Chunk the page content
-                    chunks = self.chunk_text(page_content, chunk_size=600, overlap=100)
-                    
-                    for chunk_idx, chunk in enumerate(chunks):
-                        documents.append(chunk)
-                        metadatas.append({
-                            "page": page_title,
-                            "chunk_id": chunk_idx,
-                            "total_chunks": len(chunks),
-                            "source": "knowledge_base.txt"
-                        })
-                        ids.append(f"doc_{doc_id}")
-                        doc_id += 1
-                
-                i += 2  # Move to next page
-            
-            # Clear existing collection
-            existing_count = self.collection.count()
-            if existing_count > 0:
-                print(f"🗑️  Clearing {existing_count} existing documents...")
-                # Delete all existing documents
-                existing_ids = self.collection.get()['ids']
-                if existing_ids:
-                    self.collection.delete(ids=existing_ids)
-            
-            # Add documents to ChromaDB
-            if documents:
-                print(f"📝 Adding {len(documents)} document chunks to vector database...")
-                self.collection.add(
-                    documents=documents,
-                    metadatas=metadatas,
-                    ids=ids
-                )
-                print(f"✅ Successfully added {len(documents)} chunks to the database")
-                return True
-            else:
-                print("⚠️  No documents found to add")
-                return False
+            # Read the file a page at a time
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return self.reindex(page_chunks(f, os.path.basename(file_path)), dry_run)
                 
         except Exception as e:
             print(f"❌ Error loading knowledge base: {e}")
             return False
     
-    def search(self, query: str, n_results: int = 3) -> List[Dict[str, Any]]:
-        """Search for relevant documents"""
+    def _checkpoint(self, collection):
+        """Persist buffered writes; Chroma has already written every batch"""
+        if self.backend == 'numpy':
+            collection.flush()
+    
+    def _stage_batch(self, staging, batch: List[tuple]):
+        """
+        Write a batch of chunks to the staging collection, reusing the embedding of
+        any chunk already staged or in the active collection
+        Returns (chunks embedded, chunks reused)
+        """
+        ids = [doc_id for doc_id, _, _ in batch]
+        metadatas = {doc_id: metadata for doc_id, _, metadata in batch}
+        
+        # Staged by an interrupted run (metadata may have moved since)
+        staged = staging.get(ids=ids, include=["metadatas"])
+        done = {doc_id for doc_id, metadata in zip(staged["ids"], staged["metadatas"]) if metadata == metadatas[doc_id]}
+        pending = [chunk for chunk in batch if chunk[0] not in done]
+        if not pending:
+            return 0, len(batch)
+        
+        embeddings = {}
+        for collection in (staging, self.collection):
+            missing = [doc_id for doc_id, _, _ in pending if doc_id not in embeddings]
+            if missing:
+                found = collection.get(ids=missing, include=["embeddings"])
+                embeddings.update(zip(found["ids"], found["embeddings"]))
+        
+        # One model call for every chunk in the batch that is new
+        new = [chunk for chunk in pending if chunk[0] not in embeddings]
+        if new:
+            embeddings.update(zip(
+                [doc_id for doc_id, _, _ in new],
+                self.embedding_function([document for _, document, _ in new])
+            ))
+        
+        staging.upsert(
+            ids=[doc_id for doc_id, _, _ in pending],
+            documents=[document for _, document, _ in pending],
+            metadatas=[metadata for _, _, metadata in pending],
+            embeddings=[embeddings[doc_id] for doc_id, _, _ in pending]
+        )
+        return len(new), len(batch) - len(new)
+    
+    def reindex(self, chunks: Iterable[tuple], dry_run: bool = False,
+                batch_size: int = INGEST_BATCH_SIZE, progress: Callable[[Dict[str, Any]], None] = None):
+        """
+        Make the knowledge base hold exactly chunks ((id, document, metadata) with
+        content-hash ids), read lazily batch_size at a time. Unchanged chunks keep
+        their embeddings and only new or changed ones are embedded, into a staging
+        collection that replaces the active one in a single step, so searches see
+        either the old or the new index. A build that was interrupted resumes
+        from what it had staged. progress(stats) is called after every batch
+        """
+        self._checked_at = 0
+        self._refresh_collection()
+        current = self.collection.get(include=["metadatas"])
+        old = dict(zip(current["ids"], current["metadatas"]))
+        
+        staging = None
+        if not dry_run:
+            staging = self._open_collection(STAGING_COLLECTION, dict(COLLECTION_METADATA))
+            if staging.count():
+                print(f"⏩ Resuming an interrupted build: {staging.count()} chunks already staged")
+        
+        seen = set()
+        digests = []
+        added_positions = set()
+        added = moved = duplicates = 0
+        stats = {"chunks": 0, "embedded": 0, "reused": 0, "seconds": 0.0}
+        started = time.perf_counter()
+        
+        checkpointed = started
         try:
+            for batch in _batches(chunks, batch_size):
+                unique = []
+                for doc_id, document, metadata in batch:
+                    # The same page text in two sources is stored once
+                    if doc_id in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(doc_id)
+                    unique.append((doc_id, document, metadata))
+                    digests.append(hashlib.sha256(json.dumps([doc_id, metadata], sort_keys=True).encode('utf-8')).hexdigest())
+                    if doc_id not in old:
+                        added += 1
+                        added_positions.add(_position(metadata))
+                    elif old[doc_id] != metadata:
+                        moved += 1
+                
+                if staging is not None and unique:
+                    embedded, reused = self._stage_batch(staging, unique)
+                    stats["embedded"] += embedded
+                    stats["reused"] += reused
+                stats["chunks"] += len(unique)
+                stats["seconds"] = time.perf_counter() - started
+                if progress:
+                    progress(dict(stats))
+                if staging is not None and time.perf_counter() - checkpointed >= INGEST_CHECKPOINT_SECONDS:
+                    self._checkpoint(staging)
+                    checkpointed = time.perf_counter()
+        except BaseException:
+            # Keep what was staged so the next run resumes from it
+            if staging is not None:
+                self._checkpoint(staging)
+            raise
+        
+        if not seen:
+            print("⚠️  No documents found to add")
+            return False
+        
+        removed = [doc_id for doc_id in old if doc_id not in seen]
+        updated = len(added_positions & {_position(old[doc_id]) for doc_id in removed})
+        self.last_reindex = dict(stats, **{
+            "add": added - updated,
+            "update": updated,
+            "remove": len(removed) - updated,
+            "unchanged": len(seen) - added,
+            "duplicates": duplicates
+        })
+        print(f"🧮 Chunks: {self.last_reindex['add']} to add, {self.last_reindex['update']} to update, "
+              f"{self.last_reindex['remove']} to remove, {self.last_reindex['unchanged']} unchanged")
+        
+        if dry_run:
+            return True
+        
+        # Content-derived version: the same chunks always give the same collection
+        version = hashlib.sha256("\n".join(sorted(digests)).encode('utf-8')).hexdigest()[:16]
+        name = f"{COLLECTION_NAME}_{version}"
+        if (not added and not removed and not moved) or name == self.collection_name:
+            self._drop_collection(STAGING_COLLECTION)
+            print("✅ Knowledge base already up to date")
+            return True
+        
+        # Chunks staged by an interrupted run that are no longer in the sources
+        stale = [doc_id for doc_id in staging.get(include=[])["ids"] if doc_id not in seen]
+        if stale:
+            staging.delete(ids=stale)
+        
+        # Swap: searches move to the new collection in one step. The replaced
+        # one is kept until the next reindex, for servers still switching over
+        with self._swap_lock:
+            pointer = self._read_pointer()
+            if pointer.get("previous") not in (None, self.collection_name):
+                self._drop_collection(pointer["previous"])
+            self._drop_collection(name)  # An older generation with the same content
+            staging.modify(name=name, metadata=dict(COLLECTION_METADATA, kb_version=version))
+            self._write_pointer({"active": name, "previous": self.collection_name})
+            self._pointer_mtime = self._pointer_stat()
+            self._activate(name, staging)
+        
+        print(f"✅ Knowledge base now holds {staging.count()} chunks (version {version})")
+        return True
+    
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed query texts with the collection's embedding function, reusing cached embeddings"""
+        if self.embedding_cache is None:
+            return self.embedding_function(texts)
+        
+        embeddings = [self.embedding_cache.get(self.embedding_model_id, text) for text in texts]
+        # Embed each missing text once, even if it appears several times
+        missing = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(normalize_text(texts[i]), []).append(i)
+        if missing:
+            computed = self.embedding_function([texts[positions[0]] for positions in missing.values()])
+            for positions, embedding in zip(missing.values(), computed):
+                self.embedding_cache.set(self.embedding_model_id, texts[positions[0]], embedding)
+                for i in positions:
+                    embeddings[i] = embedding
+        return embeddings
+    
+    def search(self, query: str, n_results: int = 3, query_embedding: List[float] = None) -> List[Dict[str, Any]]:
+        """
+        Search for relevant documents
+        Pass query_embedding (from embed) to skip embedding the query again
+        """
+        return self.search_batch([query], n_results, [query_embedding])[0]
+    
+    def search_batch(self, queries: List[str], n_results: int = 3,
+                     query_embeddings: List[List[float]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries with one embedding pass and one collection query
+        query_embeddings may hold precomputed embeddings (None for queries still to embed)
+        Returns one result list per query
+        """
+        try:
+            self._refresh_collection()
+            embeddings = list(query_embeddings or [None] * len(queries))
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+            if missing:
+                for i, embedding in zip(missing, self.embed([queries[i] for i in missing])):
+                    embeddings[i] = embedding
+            
             results = self.collection.query(
-                query_texts=[query],
+                query_embeddings=embeddings,
                 n_results=n_results
             )
             
             # Format results
-            formatted_results = []
-            if results['documents'] and results['documents'][0]:
-                for i, doc in enumerate(results['documents'][0]):
-                    formatted_results.append({
-                        'content': doc,
-                        'metadata': results['metadatas'][0][i] if results['metadatas'] else {},
-                        'distance': results['distances'][0][i] if 'distances' in results else None
-                    })
+            batch_results = []
+            for q in range(len(queries)):
+                formatted_results = []
+                if results['documents'] and results['documents'][q]:
+                    for i, doc in enumerate(results['documents'][q]):
+                        formatted_results.append({
+                            'content': doc,
+                            'metadata': results['metadatas'][q][i] if results['metadatas'] else {},
+                            'distance': results['distances'][q][i] if results.get('distances') else None
+                        })
+                batch_results.append(formatted_results)
             
-            return formatted_results
+            return batch_results
             
         except Exception as e:
             print(f"❌ Error searching database: {e}")
-            return []
+            return [[] for _ in queries]
     
     def get_stats(self) -> Dict[str, Any]:
         """Get database statistics"""
         try:
+            self._refresh_collection()
             count = self.collection.count()
             return {
                 "total_documents": count,
                 "collection_name": self.collection.name,
-                "persist_directory": self.persist_directory
+                "kb_version": self.version,
+                "backend": self.backend,
+                "persist_directory": self.persist_directory,
+                "embedding_model": self.embedding_model_id,
+                "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None,
+                "last_reindex": self.last_reindex
             }
         except Exception as e:
             print(f"❌ Error getting stats: {e}")
@@ -0,0 +1,240 @@
+"""
+Write-behind buffers for high-volume database writes.
+
+Callers hand rows to a buffer and a background thread writes them in batches,
+one transaction (and one fsync) per batch instead of per row.
+"""
+import atexit
+import threading
+import time
+from concurrent.futures import Future
+
+class MessageWriteBuffer:
+    """
+    Queue rows in memory and flush them in batched transactions
+
+    flush_batch(items) writes a list of items in a single transaction and
+    returns one result per item. A flush happens when max_batch items are
+    waiting or flush_interval seconds after the oldest waiting item arrived,
+    whichever comes first. submit() returns a Future resolved with the item's
+    result once its batch has committed, so callers choose their durability:
+    wait on it (group commit) or fire and forget. pending() lets readers show
+    items that have not been written yet.
+    """
+
+    def __init__(self, flush_batch, max_batch=100, flush_interval=0.05, name='write-buffer'):
+        self.flush_batch = flush_batch
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+
+        self._pending = []
+        # Items taken by the current flush, until their batch has committed
+        self._inflight = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+
+        self.batches_written = 0
+        self.items_written = 0
+        self.items_failed = 0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, item):
+        """Queue an item; returns a Future resolved when its batch commits"""
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Write buffer is closed")
+            self._pending.append((item, future))
+            # Wake the flusher to start the interval, or to flush a full batch now
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._condition.notify()
+        return future
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._pending)
+
+    def pending(self, match=None):
+        """Items not yet committed (optionally only those match(item) accepts), oldest first"""
+        with self._condition:
+            items = [item for item, _ in self._inflight + self._pending]
+        return items if match is None else [item for item in items if match(item)]
+
+    def discard(self, match):
+        """
+        Drop the queued items match(item) accepts; their futures resolve to None
+        Waits for a flush in progress, so no accepted item is written after this returns
+        """
+        with self._flush_lock:
+            with self._condition:
+                dropped = [(item, future) for item, future in self._pending if match(item)]
+                self._pending = [(item, future) for item, future in self._pending if not match(item)]
+        for _, future in dropped:
+            future.set_result(None)
+        return len(dropped)
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        with self._flush_lock:
+            with self._condition:
+                batch, self._pending = self._pending, []
+                self._inflight = batch
+
+            for start in range(0, len(batch), self.max_batch):
+                self._write(batch[start:start + self.max_batch])
+                with self._condition:
+                    self._inflight = batch[start + self.max_batch:]
+
+    def _write(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = self.flush_batch(items)
+        except Exception as e:
+            print(f"Error flushing {len(batch)} buffered writes: {e}")
+            self.items_failed += len(batch)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches_written += 1
+        self.items_written += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed and not self._pending:
+                    return
+
+                # Give the batch time to fill, unless it is already full
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+            self.flush()
+
+    def close(self):
+        """Stop the flusher thread after writing everything still queued"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def stats(self):
+        """Return buffer statistics"""
+        return {
+            "pending": self.pending_count(),
+            "batches_written": self.batches_written,
+            "items_written": self.items_written,
+            "items_failed": self.items_failed,
+            "avg_batch_size": round(self.items_written / self.batches_written, 2) if self.batches_written else 0
+        }
+
+class HeartbeatAggregator:
+    """
+    Keep only the latest value per key and flush them in bulk
+
+    Periodic heartbeats (e.g. time on site) overwrite each other, so only the
+    newest value per key is kept in memory. Every flush_interval seconds the
+    pending values are handed to flush_batch(items) as a list of
+    (key, value, recorded_at) tuples, to be written in one transaction.
+    """
+
+    def __init__(self, flush_batch, flush_interval=5.0, name='heartbeat-aggregator'):
+        self.flush_batch = flush_batch
+        self.flush_interval = flush_interval
+
+        self._pending = {}
+        # Values being written by the current flush stay readable until committed
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self.heartbeats_received = 0
+        self.rows_written = 0
+        self.flushes = 0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, key, value, recorded_at):
+        """Remember the latest value for key (replacing any unflushed one)"""
+        with self._lock:
+            self._pending[key] = (value, recorded_at)
+            self.heartbeats_received += 1
+
+    def get(self, key):
+        """Return the unflushed (value, recorded_at) for key, or None"""
+        with self._lock:
+            return self._pending.get(key) or self._inflight.get(key)
+
+    def discard(self, key):
+        """Forget any unflushed value for key"""
+        with self._lock:
+            self._pending.pop(key, None)
+            self._inflight.pop(key, None)
+
+    def flush(self):
+        """Write every pending value from the calling thread"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._inflight = pending
+            if not pending:
+                return
+
+            items = [(key, value, recorded_at) for key, (value, recorded_at) in pending.items()]
+            try:
+                self.flush_batch(items)
+            except Exception as e:
+                print(f"Error flushing {len(items)} heartbeats: {e}")
+                # Put the values back unless a newer heartbeat already replaced them
+                with self._lock:
+                    for key, value in pending.items():
+                        self._pending.setdefault(key, value)
+                    self._inflight = {}
+                return
+
+            with self._lock:
+                self._inflight = {}
+
+            self.flushes += 1
+            self.rows_written += len(items)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stop the flusher thread and write any pending values"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    def stats(self):
+        """Return aggregator statistics"""
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "heartbeats_received": self.heartbeats_received,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes
+        }
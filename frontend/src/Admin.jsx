@@ -1,8 +1,10 @@
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import axios from 'axios'
 import './Admin.css'
 
 const API_BASE_URL = 'http://localhost:5005'
+const PRIORITY_QUEUE_SIZE = 100 // top leads shown in the priority view
+const DASHBOARD_FIELDS = 'id,name,contact,source,ip_address,device_type,time_spent_seconds,created_at,last_active,status,priority_score'
 
 // Stats Card Component
 function StatsCard({ icon, label, value, badge, color }) {
@@ -440,33 +442,82 @@ function Admin() {
   const [filterStatus, setFilterStatus] = useState('all')
   const [isLoading, setIsLoading] = useState(true)
 
+  const summaryRefreshRef = useRef(null)
+
   useEffect(() => {
     loadData()
-    // Auto-refresh every 30 seconds
-    const interval = setInterval(loadData, 30000)
-    return () => clearInterval(interval)
+
+    // Live updates instead of polling: lead list changes are applied in place,
+    // stats and the priority queue (both cheap to read) are re-fetched once things settle
+    const events = new EventSource(`${API_BASE_URL}/api/admin/events`)
+    events.onmessage = (message) => {
+      const event = JSON.parse(message.data)
+      const data = event.data || {}
+
+      switch (event.type) {
+        case 'reset':
+          // Missed events (server restart or too long offline): reload everything
+          loadData()
+          return
+        case 'lead_created':
+          setCustomers(prev => [data, ...prev.filter(c => c.id !== data.id)])
+          break
+        case 'status_changed':
+          setCustomers(prev => prev.map(c => c.id === data.customer_id ? { ...c, status: data.status } : c))
+          break
+        case 'notes_changed':
+          setCustomers(prev => prev.map(c => c.id === data.customer_id ? { ...c, admin_notes: data.admin_notes } : c))
+          break
+        case 'lead_deleted':
+          setCustomers(prev => prev.filter(c => c.id !== data.customer_id))
+          break
+        default:
+          return
+      }
+      scheduleSummaryRefresh()
+    }
+
+    return () => {
+      events.close()
+      clearTimeout(summaryRefreshRef.current)
+    }
   }, [])
 
-  const loadData = async () => {
+  const scheduleSummaryRefresh = () => {
+    clearTimeout(summaryRefreshRef.current)
+    summaryRefreshRef.current = setTimeout(loadSummary, 1000)
+  }
+
+  const loadSummary = async () => {
     try {
-      setIsLoading(true)
-      const [statsResponse, customersResponse, priorityResponse] = await Promise.all([
+      const [statsResponse, priorityResponse] = await Promise.all([
         axios.get(`${API_BASE_URL}/api/customers/stats`),
-        axios.get(`${API_BASE_URL}/api/customers/all`),
-        axios.get(`${API_BASE_URL}/api/customers/priority-queue`)
+        axios.get(`${API_BASE_URL}/api/customers/priority-queue`, { params: { limit: PRIORITY_QUEUE_SIZE } })
       ])
-
       if (statsResponse.data.success) {
         setStats(statsResponse.data.stats)
       }
-
-      if (customersResponse.data.success) {
-        setCustomers(customersResponse.data.customers)
-      }
-
       if (priorityResponse.data.success) {
         setPriorityLeads(priorityResponse.data.leads)
       }
+    } catch (error) {
+      console.error('Error refreshing summary:', error)
+    }
+  }
+
+  const loadData = async () => {
+    try {
+      setIsLoading(true)
+      // Stats, leads and priority list from one snapshot; notes are loaded per lead
+      const response = await axios.get(`${API_BASE_URL}/api/admin/dashboard`, {
+        params: { priority_limit: PRIORITY_QUEUE_SIZE, fields: DASHBOARD_FIELDS }
+      })
+
+      if (response.data.success) {
+        setStats(response.data.stats)
+        setCustomers(response.data.leads)
+        setPriorityLeads(response.data.priority_leads)
+      }
     } catch (error) {
       console.error('Error loading data:', error)
     } finally {
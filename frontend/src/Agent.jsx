@@ -78,30 +78,17 @@ function Agent() {
     }
   }, [])
 
-  // Fetch messages for selected customer
-  const fetchMessages = useCallback(async (customerId) => {
-    if (!customerId) return
-    
-    try {
-      const response = await axios.get(`${API_BASE_URL}/api/customers/${customerId}/messages`)
-      if (response.data.success) {
-        const formatted = response.data.messages.map(msg => ({
-          id: msg.id,
-          text: msg.text,
-          sender: msg.sender === 'user' ? 'customer' : msg.sender,
-          timestamp: new Date(msg.timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
-        }))
-        
-        // Only update if there are new messages
-        const lastId = formatted.length > 0 ? formatted[formatted.length - 1].id : 0
-        if (lastId !== lastMessageIdRef.current) {
-          setMessages(formatted)
-          lastMessageIdRef.current = lastId
-        }
-      }
-    } catch (error) {
-      console.error('Failed to fetch messages:', error)
+  // Add a message pushed by the server, replacing optimistic ones now confirmed
+  const appendMessage = useCallback((msg) => {
+    if (msg.id <= lastMessageIdRef.current) return
+    lastMessageIdRef.current = msg.id
+    const formatted = {
+      id: msg.id,
+      text: msg.text,
+      sender: msg.sender === 'user' ? 'customer' : msg.sender,
+      timestamp: new Date(msg.timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
     }
+    setMessages(prev => [...prev.filter(m => !m.pending), formatted])
   }, [])
 
   // Update customer status
@@ -140,6 +127,16 @@ function Agent() {
     setIsSending(true)
     const text = inputMessage.trim()
 
+    // Add optimistically; the pushed copy from the server replaces it
+    const newMessage = {
+      id: `pending-${Date.now()}`,
+      text,
+      sender: 'agent',
+      pending: true,
+      timestamp: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
+    }
+    setMessages(prev => [...prev, newMessage])
+
     try {
       await axios.post(`${API_BASE_URL}/api/agent/send-message`, null, {
         params: {
@@ -147,41 +144,43 @@ function Agent() {
           message: text
         }
       })
-
-      // Add optimistically
-      const newMessage = {
-        id: Date.now(),
-        text,
-        sender: 'agent',
-        timestamp: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
-      }
-      setMessages(prev => [...prev, newMessage])
       setInputMessage('')
-      
-      // Refresh after delay
-      setTimeout(() => fetchMessages(selectedCustomer.id), 500)
     } catch (error) {
       console.error('Failed to send:', error)
+      setMessages(prev => prev.filter(m => m.id !== newMessage.id))
       alert('Failed to send message')
     } finally {
       setIsSending(false)
     }
-  }, [inputMessage, selectedCustomer, isSending, fetchMessages])
+  }, [inputMessage, selectedCustomer, isSending])
 
   // Effects
   useEffect(() => {
     fetchQueue()
-    const interval = setInterval(fetchQueue, 10000) // 10 seconds
-    return () => clearInterval(interval)
+
+    // Queue changes are pushed; refetch on the ones that reorder or reset it
+    const events = new EventSource(`${API_BASE_URL}/api/admin/events`)
+    events.onmessage = (message) => {
+      const event = JSON.parse(message.data)
+      if (event.type === 'queue_left') {
+        setQueue(prev => prev.filter(c => c.id !== event.data.customer_id))
+      } else if (event.type === 'queue_entered' || event.type === 'reset') {
+        fetchQueue()
+      }
+    }
+    return () => events.close()
   }, [fetchQueue])
 
+  // Transcript of the selected customer: full replay, then live messages
+  const selectedCustomerId = selectedCustomer?.id
   useEffect(() => {
-    if (selectedCustomer) {
-      fetchMessages(selectedCustomer.id)
-      const interval = setInterval(() => fetchMessages(selectedCustomer.id), 5000)
-      return () => clearInterval(interval)
-    }
-  }, [selectedCustomer, fetchMessages])
+    if (!selectedCustomerId) return
+    const events = new EventSource(
+      `${API_BASE_URL}/api/customers/${selectedCustomerId}/events?since_id=${lastMessageIdRef.current}`
+    )
+    events.onmessage = (event) => appendMessage(JSON.parse(event.data))
+    return () => events.close()
+  }, [selectedCustomerId, appendMessage])
 
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
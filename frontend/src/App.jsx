@@ -183,6 +183,7 @@ function App() {
   const inputRef = useRef(null)
   const fileInputRef = useRef(null)
   const processedAgentMessageIdsRef = useRef(new Set())
+  const lastPolledMessageIdRef = useRef(0)
 
   // Detect device info
   const getDeviceInfo = () => {
@@ -254,40 +255,33 @@ function App() {
     return () => clearInterval(interval)
   }, [isAgentMode, messages])
 
-  // Poll backend for agent messages when in agent mode and reflect them in customer chat
+  // Stream agent messages from the backend when in agent mode and reflect them in customer chat
   useEffect(() => {
     if (!isAgentMode || !customerId) return
 
-    const pollAgentMessages = async () => {
+    // Replays anything after the last message we saw, then pushes new ones as they are saved
+    const events = new EventSource(
+      `${API_BASE_URL}/api/customers/${customerId}/events?since_id=${lastPolledMessageIdRef.current}`
+    )
+    events.onmessage = (event) => {
       try {
-        const resp = await axios.get(`${API_BASE_URL}/api/customers/${customerId}/messages`)
-        if (resp.data?.success && Array.isArray(resp.data.messages)) {
-          const agentMsgs = resp.data.messages.filter(m => m.sender === 'agent')
-          const newCustomerViewMessages = []
-          agentMsgs.forEach(m => {
-            if (!processedAgentMessageIdsRef.current.has(m.id)) {
-              processedAgentMessageIdsRef.current.add(m.id)
-              newCustomerViewMessages.push({
-                id: `agent-${m.id}`,
-                text: m.text,
-                sender: 'bot',
-                timestamp: new Date(m.timestamp).toLocaleTimeString()
-              })
-            }
-          })
-          if (newCustomerViewMessages.length > 0) {
-            setMessages(prev => [...prev, ...newCustomerViewMessages])
-          }
-        }
+        const m = JSON.parse(event.data)
+        lastPolledMessageIdRef.current = Math.max(lastPolledMessageIdRef.current, m.id)
+        if (m.sender !== 'agent' || processedAgentMessageIdsRef.current.has(m.id)) return
+        processedAgentMessageIdsRef.current.add(m.id)
+        setMessages(prev => [...prev, {
+          id: `agent-${m.id}`,
+          text: m.text,
+          sender: 'bot',
+          timestamp: new Date(m.timestamp).toLocaleTimeString()
+        }])
       } catch (e) {
         // silent fail to avoid UX noise
       }
     }
+    // EventSource reconnects on its own (resuming from the last event id)
 
-    // Initial fetch
-    pollAgentMessages()
-    const interval = setInterval(pollAgentMessages, 2000)
-    return () => clearInterval(interval)
+    return () => events.close()
   }, [isAgentMode, customerId])
 
   // Auto-focus input when chat opens or after bot responds
@@ -434,37 +428,73 @@ function App() {
       }
       setMessages(prev => [...prev, typingMessage])
       
+      const botMessageId = `bot-${Date.now()}`
       try {
-        // Call AWS Bedrock API
-        const response = await axios.post(`${API_BASE_URL}/api/chatbot/message`, {
-          message: inputMessage
+        // Stream the response so the first words render as soon as they are generated
+        const response = await fetch(`${API_BASE_URL}/api/chatbot/message/stream`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ message: inputMessage })
         })
-        
-        // Remove typing indicator and add real response
-        setMessages(prev => {
-          const withoutTyping = prev.filter(msg => !msg.isTyping)
-          const botResponse = {
-            id: withoutTyping.length + 1,
-            text: response.data.response,
-            sender: 'bot',
-            timestamp: new Date().toLocaleTimeString(),
-            metadata: {
-              contextUsed: response.data.context_used,
-              knowledgeBaseResults: response.data.knowledge_base_results,
-              modelUsed: response.data.model_used
+        if (!response.ok || !response.body) {
+          throw new Error(`Chat request failed: ${response.status}`)
+        }
+
+        let streamedText = ''
+        let result = null
+        const showBotMessage = (text, metadata) => {
+          setMessages(prev => {
+            const withoutTyping = prev.filter(msg => !msg.isTyping && msg.id !== botMessageId)
+            return [...withoutTyping, {
+              id: botMessageId,
+              text,
+              sender: 'bot',
+              timestamp: new Date().toLocaleTimeString(),
+              metadata
+            }]
+          })
+        }
+
+        // Server-Sent Events: "data: {json}" blocks separated by blank lines
+        const reader = response.body.getReader()
+        const decoder = new TextDecoder()
+        let buffer = ''
+        while (!result) {
+          const { value, done } = await reader.read()
+          if (done) break
+          buffer += decoder.decode(value, { stream: true })
+          const blocks = buffer.split('\n\n')
+          buffer = blocks.pop()
+          for (const block of blocks) {
+            const data = block.split('\n').find(line => line.startsWith('data: '))
+            if (!data) continue
+            const event = JSON.parse(data.slice(6))
+            if (event.type === 'token') {
+              streamedText += event.text
+              showBotMessage(streamedText)
+            } else if (event.type === 'done') {
+              result = event
             }
           }
-          // Save bot message to backend
-          saveChatMessageToBackend(response.data.response, 'bot')
-          return [...withoutTyping, botResponse]
+        }
+
+        if (!result || !result.success) {
+          throw new Error(result?.error || 'Chat stream ended unexpectedly')
+        }
+        showBotMessage(result.response, {
+          contextUsed: result.context_used,
+          knowledgeBaseResults: result.knowledge_base_results,
+          modelUsed: result.model_used
         })
+        // Save bot message to backend
+        saveChatMessageToBackend(result.response, 'bot')
         
       } catch (error) {
         console.error('Error calling chatbot API:', error)
         
         // Remove typing indicator and add error message
         setMessages(prev => {
-          const withoutTyping = prev.filter(msg => !msg.isTyping)
+          const withoutTyping = prev.filter(msg => !msg.isTyping && msg.id !== botMessageId)
           const errorResponse = {
             id: withoutTyping.length + 1,
             text: "I apologize, but I'm having trouble connecting to our AI service right now. Please try again in a moment.",